@@ -3,7 +3,13 @@ from pathlib import Path
 import os
 from dotenv import load_dotenv
 from src.main import run_diagnostic_pipeline, run_single_task
-from src.chat_system.chat_interface import handle_ai_chat, export_chat_to_text
+from src.pipeline.jobs import JobLimitError, get_job_queue
+from src.chat_system.chat_interface import handle_ai_chat
+from src.chat_system.transcript_export import FORMATS, transcript_bytes
+from src.emergency.hospital_index import find_hospitals, get_hospital_index, hospital_names
+from src.emergency.hotlines import EMERGENCY_NUMBERS
+from src.emergency.red_flags import detect_red_flags, emergency_guidance
+from src.pipeline.uploads import UPLOAD_DIR, UploadError, ingest_upload, preparse_results, analysis_path
 import uuid
 from datetime import datetime
 import json
@@ -36,8 +42,10 @@ if 'emergency_contacts' not in st.session_state:
     st.session_state.emergency_contacts = []
 if 'user_input' not in st.session_state:
     st.session_state.user_input = ""
+if 'analysis_job' not in st.session_state:
+    st.session_state.analysis_job = None
 
-Path("uploads").mkdir(exist_ok=True)
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 Path("reports").mkdir(exist_ok=True)
 
 # Sidebar
@@ -71,9 +79,101 @@ with st.sidebar:
             st.session_state.chat_history = []
             st.session_state.uploaded_image = None
             st.session_state.uploaded_lab = None
+            st.session_state.analysis_job = None
             st.session_state.user_input = ""
             st.rerun()
 
+    if st.session_state.patient_name:
+        st.divider()
+        st.subheader("📎 Medical Files")
+
+        upload_slots = [
+            ("uploaded_image", "image", "Scan (DICOM, NIfTI, PNG/JPG or DICOM .zip)",
+             ["dcm", "nii", "gz", "png", "jpg", "jpeg", "zip"]),
+            ("uploaded_lab", "lab", "Lab report (PDF, TXT or photo)", ["pdf", "txt", "png", "jpg", "jpeg"])
+        ]
+        for slot, kind, label, extensions in upload_slots:
+            uploaded_file = st.file_uploader(label, type=extensions, key=f"{slot}_file")
+            current = st.session_state[slot]
+            # Streamlit reruns the script on every interaction; only ingest a file once
+            if uploaded_file is not None and (current is None or current.get("file_id") != uploaded_file.file_id):
+                try:
+                    upload = ingest_upload(uploaded_file, kind, uploaded_file.name)
+                    upload["file_id"] = uploaded_file.file_id
+                    st.session_state[slot] = upload
+                except UploadError as e:
+                    st.error(f"⚠️ {uploaded_file.name}: {e}")
+
+            upload = st.session_state[slot]
+            if upload:
+                preparsed = preparse_results(upload)
+                if preparsed.get("thumbnail"):
+                    st.image(preparsed["thumbnail"], caption=upload["original_name"])
+                status = "✅ Ready" if preparsed else "⏳ Pre-processing..."
+                st.caption(f"{status} — {upload['type'].upper()}, {upload['size'] / 2**20:.1f} MB"
+                           + (" (already on file)" if upload["deduplicated"] else ""))
+
+        if st.session_state.uploaded_image or st.session_state.uploaded_lab:
+            if st.button("🔬 Analyze Files", type="primary", use_container_width=True):
+                image, lab = st.session_state.uploaded_image, st.session_state.uploaded_lab
+                symptoms = "\n".join(m["content"] for m in st.session_state.chat_history if m["role"] == "user")
+                if image and image["type"] == "zip" and not preparse_results(image):
+                    st.info("⏳ Still unpacking the study, try again in a moment")
+                else:
+                    try:
+                        st.session_state.analysis_job = get_job_queue().submit(
+                            st.session_state.case_id,
+                            patient_input=symptoms or None,
+                            image_path=analysis_path(image) if image else None,
+                            lab_report_path=lab["path"] if lab else None
+                        )
+                    except JobLimitError as e:
+                        st.warning(f"⏳ {e}")
+
+TASK_STATUS_ICONS = {
+    "pending": "⏸️", "running": "⏳", "done": "✅", "reused": "♻️", "skipped": "⏭️", "cancelled": "🚫"
+}
+
+
+# Re-runs on its own every 2 s, so progress updates without blocking the rest of the page
+@st.fragment(run_every=2)
+def show_analysis_job(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return
+    with st.expander("🔬 Diagnostic Analysis of Uploaded Files", expanded=True):
+        planned = [t for t in job["tasks"] if t["status"] != "skipped"]
+        done = sum(t["status"] in ("done", "reused") for t in planned)
+        if job["status"] in ("queued", "running"):
+            st.progress(done / len(planned) if planned else 0.0,
+                        text="⏳ Waiting for a free worker..." if job["status"] == "queued"
+                        else f"Running... {done}/{len(planned)} steps complete")
+            if st.button("⏹️ Cancel Analysis", key=f"cancel_{job_id}", disabled=job["cancel_requested"]):
+                get_job_queue().cancel(job_id)
+        elif job["status"] == "succeeded":
+            st.markdown(job["result"])
+        else:
+            if job["status"] == "cancelled":
+                st.warning("🚫 Analysis cancelled")
+            else:
+                st.error(job["error"] if job["error"].startswith("❌") else f"❌ {job['error']}")
+            # Completed steps are checkpointed, so this only re-runs the unfinished ones
+            if st.button("🔁 Resume Analysis", key=f"retry_{job_id}"):
+                try:
+                    get_job_queue().retry(job_id)
+                except JobLimitError as e:
+                    st.warning(f"⏳ {e}")
+
+        for task in planned:
+            label = f"{TASK_STATUS_ICONS.get(task['status'], '')} {task['name'].title()}"
+            if task["status"] in ("done", "reused") and job["status"] != "succeeded":
+                # Partial results while the rest of the crew is still working
+                with st.popover(label):
+                    st.markdown(task["detail"])
+            else:
+                st.caption(label)
+
+
 # Main header
 st.title("🏥 AI Medical Assistant")
 st.caption("Comprehensive Medical Triage with Evidence-Based Recommendations")
@@ -93,6 +193,9 @@ tab1, tab2, tab3 = st.tabs([
 with tab1:
     st.header("💬 Dr.AI Assistant")
 
+    if st.session_state.analysis_job:
+        show_analysis_job(st.session_state.analysis_job)
+
     # Set patient info if available
     if st.session_state.patient_name and st.session_state.patient_age:
         from src.chat_system.chat_interface import set_patient_info
@@ -139,8 +242,15 @@ with tab1:
         with col3:
             export_button = st.form_submit_button("💾 Export", use_container_width=True, key="export_chat_btn")
 
+        export_format = st.selectbox("Export format", list(FORMATS), key="export_format")
+
     # Handle Send Message
     if send_button and user_input.strip():
+        # Emergency guidance goes up before the LLM is called, not after its reply
+        red_flags = detect_red_flags(user_input)
+        guidance = emergency_guidance(red_flags) if red_flags else None
+        if guidance:
+            st.error(guidance)
         with st.spinner("🤔 Dr. Chen is thinking..."):
             try:
                 response = handle_ai_chat(user_input, st.session_state.case_id)
@@ -151,6 +261,12 @@ with tab1:
                     'content': user_input,
                     'timestamp': datetime.now().isoformat()
                 })
+                if guidance:
+                    st.session_state.chat_history.append({
+                        'role': 'assistant',
+                        'content': guidance,
+                        'timestamp': datetime.now().isoformat()
+                    })
                 st.session_state.chat_history.append({
                     'role': 'assistant',
                     'content': response_text,
@@ -187,8 +303,17 @@ with tab1:
 
     # Handle Export
     if export_button and st.session_state.get("chat_history"):
-        result = export_chat_to_text(st.session_state.case_id)
-        st.success(result)
+        try:
+            _, extension, mime = FORMATS[export_format]
+            st.download_button(
+                "⬇️ Download transcript",
+                data=transcript_bytes(st.session_state.case_id, export_format),
+                file_name=f"chat_export_{st.session_state.case_id}{extension}",
+                mime=mime,
+                key="download_transcript_btn"
+            )
+        except Exception as e:
+            st.error(f"❌ Error exporting chat: {str(e)}")
 # TAB 2: Emergency Support
 with tab2:
     st.header("🚨 Emergency Support Center")
@@ -199,18 +324,7 @@ with tab2:
     # 📞 Emergency Hotlines
     with col1:
         st.subheader("📞 Emergency Hotlines")
-        emergency_numbers = {
-            "Emergency Services": "112",
-            "Ambulance": "102 / 108",
-            "Police": "100",
-            "Fire Brigade": "101",
-            "Women Helpline": "1091",
-            "Child Helpline": "1098",
-            "Medical Emergency": "104",
-            "Poison Control": "1800-425-2255"
-        }
-
-        for service, number in emergency_numbers.items():
+        for service, number in EMERGENCY_NUMBERS.items():
             st.info(f"**{service}:** {number}")
 
         st.divider()
@@ -222,7 +336,17 @@ with tab2:
         search_radius = st.slider("Search Radius (km)", 1, 50, 10)
 
         if st.button("🔍 Search Hospitals", use_container_width=True):
-            st.success(f"Searching for {hospital_type} hospitals within {search_radius}km of {user_city}")
+            place, hospitals = find_hospitals(user_city, hospital_type, search_radius)
+            if place is None:
+                st.warning(f"Couldn't find '{user_city}'. Try a city name or 'latitude, longitude'.")
+            elif not hospitals:
+                st.warning(f"No {hospital_type.lower()} hospitals within {search_radius} km of {place[0]}. Try a larger radius.")
+            else:
+                st.success(f"{len(hospitals)} {hospital_type.lower()} hospital(s) within {search_radius} km of {place[0]}")
+                for h in hospitals:
+                    maps_url = f"https://www.google.com/maps/search/?api=1&query={h['lat']},{h['lon']}"
+                    st.info(f"**{h['name']}** ({h['city']}) — {h['distance_km']:.1f} km · "
+                            f"{', '.join(t.title() for t in h['types'])} · [Directions]({maps_url})")
 
     # 🚑 Ambulance Request
     with col2:
@@ -244,11 +368,15 @@ with tab2:
 
         # 🛏️ Bed Availability
         st.subheader("🛏️ Check Bed Availability")
-        hospital = st.selectbox("Hospital", ["AIIMS", "Apollo", "Capital", "Sum", "Kalinga"])
+        # Nearest to the city entered in the hospital finder first
+        hospital = st.selectbox("Hospital", hospital_names(user_city))
         bed_type = st.selectbox("Bed Type", ["General", "ICU", "Emergency", "Maternity"])
 
         if st.button("🛏️ Check Beds", use_container_width=True):
-            st.success(f"{bed_type} beds available at {hospital}")
+            if bed_type.lower() in get_hospital_index().get(hospital)["beds"]:
+                st.success(f"{hospital} has {bed_type} beds. Call ahead to confirm one is free.")
+            else:
+                st.warning(f"{hospital} has no {bed_type} beds listed. Try a nearby hospital.")
 
 # TAB 3: Doctor Collaboration
 with tab3:
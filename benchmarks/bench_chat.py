@@ -0,0 +1,86 @@
+import random
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.chat_system import chat_interface
+from src.chat_system.session_store import MemoryBackend, SessionStore, SQLiteBackend
+
+
+def test_set_patient_info_history_load(benchmark, bench_cwd, chat_history_file):
+    shutil.copy(chat_history_file, bench_cwd / "chat_history.json")
+
+    benchmark(chat_interface.set_patient_info, "case0007", "Bench Patient", 42)
+
+    history = chat_interface.get_session_store().get("case0007")["conversation_history"]
+    assert len(history) == 100
+
+
+def test_chat_turn(benchmark, bench_cwd, chat_history_file, stub_llm):
+    shutil.copy(chat_history_file, bench_cwd / "chat_history.json")
+    chat_interface.set_patient_info("case0003", "Bench Patient", 42)
+
+    response = benchmark.pedantic(
+        chat_interface.handle_ai_chat,
+        args=("The headache is worse today", "case0003"),
+        rounds=5,
+    )
+    assert "Urgency Level" in response, response
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_session_store_churn(benchmark, bench_cwd, backend):
+    """8 threads, 5000 turns over 2000 cases, through a store capped at 500 sessions"""
+    rounds = iter(range(100))
+
+    def make_store():
+        path = bench_cwd / f"sessions{next(rounds)}.db"
+        store = SessionStore(MemoryBackend() if backend == "memory" else SQLiteBackend(path), max_sessions=500)
+        return (store,), {}
+
+    # Skewed like real traffic: a few active cases get most of the turns
+    rng = random.Random(3)
+    weights = [1 / (rank + 1) ** 0.8 for rank in range(2000)]
+    cases = [f"case{c:04d}" for c in rng.choices(range(2000), weights=weights, k=5000)]
+
+    def churn(store):
+        def turn(i):
+            case_id = cases[i]
+            if store.get(case_id) is None:
+                store.put(case_id, {"name": "Bench", "age": 42, "conversation_history": []})
+            store.update(case_id, lambda s: s["conversation_history"].append({"user": "hi", "assistant": "hello"}))
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(turn, range(5000)))
+        return store.get_stats()
+
+    stats = benchmark.pedantic(churn, setup=make_store, rounds=3)
+    assert stats["resident_sessions"] <= 500, stats
+    benchmark.extra_info.update(stats)
+
+
+# ---------------------- CHAT ANALYTICS ----------------------
+
+def test_chat_analytics_record(benchmark, bench_cwd):
+    from datetime import datetime
+
+    analytics = chat_interface.get_chat_analytics()
+    turns = iter(range(10**6))
+    benchmark(lambda: analytics.record(f"case{next(turns) % 2000:04d}", datetime.now(), latency_s=4.2))
+    assert analytics.latency_stats()["p50_s"] == pytest.approx(4.2, rel=0.1)
+
+
+def test_chat_analytics_overview(benchmark, bench_cwd, chat_history_file):
+    """Dashboard numbers for a backfilled log, read from the aggregates only"""
+    shutil.copy(chat_history_file, bench_cwd / "chat_history.json")
+    analytics = chat_interface.get_chat_analytics()
+    assert analytics.backfilled == 5000
+
+    overview = benchmark(analytics.overview, 10**4)
+    assert overview["cases"] == 50 and overview["messages"] == 5000
+    assert sum(day["messages"] for day in overview["messages_per_day"]) == 5000
+    assert all(day["active_cases"] == 50 for day in overview["messages_per_day"])
+    summary = chat_interface.get_chat_summary("case0007")
+    # 100 turns, 50 minutes apart: longer than the hour that diff.seconds used to wrap at
+    assert summary["total_messages"] == 100 and summary["session_duration"] == f"{99 * 50} minutes"
@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.tools import dense_index
+
+# DENSE_BENCH_SIZE=1000000 for the 1M-abstract numbers (~3 min to build, ~2 GB disk)
+CORPUS_SIZE = int(os.getenv("DENSE_BENCH_SIZE", "200000"))
+DIM = 384  # all-MiniLM-L6-v2
+TOPICS = 2000
+NLIST = max(64, int(4 * np.sqrt(CORPUS_SIZE)))
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture(scope="session")
+def topic_centres():
+    return _normalise(np.random.default_rng(3).standard_normal((TOPICS, DIM)).astype(np.float32))
+
+
+@pytest.fixture(scope="session")
+def synthetic_embeddings(tmp_path_factory, topic_centres):
+    """Clustered unit vectors (abstracts group by topic, like real embeddings), staged on disk"""
+    rng = np.random.default_rng(5)
+    path = tmp_path_factory.mktemp("dense") / "raw.npy"
+    raw = np.lib.format.open_memmap(path, mode="w+", dtype=np.float16, shape=(CORPUS_SIZE, DIM))
+    for start in range(0, CORPUS_SIZE, 100000):
+        n = min(100000, CORPUS_SIZE - start)
+        noise = rng.standard_normal((n, DIM)).astype(np.float32) * 0.06
+        raw[start:start + n] = _normalise(topic_centres[rng.integers(0, TOPICS, n)] + noise)
+    pmids = np.arange(30000000, 30000000 + CORPUS_SIZE)
+    years = rng.integers(2015, 2026, CORPUS_SIZE)
+    return pmids, years, raw
+
+
+@pytest.fixture(scope="session", params=["flat", "ivf"])
+def built_index(request, tmp_path_factory, synthetic_embeddings):
+    pmids, years, raw = synthetic_embeddings
+    nlist = NLIST if request.param == "ivf" else 0
+    path = dense_index.build_index(pmids, years, raw, tmp_path_factory.mktemp("dense") / request.param,
+                                   dtype="int8", nlist=nlist)
+    return request.param, dense_index.DenseIndex(path)
+
+
+@pytest.fixture(scope="session")
+def queries(topic_centres):
+    rng = np.random.default_rng(9)
+    noise = rng.standard_normal((50, DIM)).astype(np.float32) * 0.06
+    return _normalise(topic_centres[rng.integers(0, TOPICS, 50)] + noise)
+
+
+def _exact_top10(raw, query):
+    scores = np.concatenate([
+        np.asarray(raw[start:start + 100000], dtype=np.float32) @ query
+        for start in range(0, len(raw), 100000)
+    ])
+    return set(np.argsort(-scores)[:10] + 30000000)
+
+
+def test_dense_search(benchmark, built_index, queries, synthetic_embeddings):
+    kind, index = built_index
+    calls = iter(range(10**9))
+
+    def search():
+        return index.search(queries[next(calls) % len(queries)], k=10)
+
+    hits = benchmark.pedantic(search, rounds=20 if kind == "flat" else 200, warmup_rounds=2)
+    assert len(hits) == 10
+
+    _, _, raw = synthetic_embeddings
+    recall = np.mean([
+        len({pmid for pmid, _ in index.search(q, k=10)} & _exact_top10(raw, q)) / 10 for q in queries[:10]
+    ])
+    assert recall >= 0.9, recall
+    benchmark.extra_info.update({
+        "corpus_size": CORPUS_SIZE,
+        "nlist": index.meta["nlist"],
+        "nprobe": dense_index.DENSE_NPROBE,
+        "recall_at_10": float(recall),
+        "index_mb": round(sum(f.stat().st_size for f in index.path.iterdir()) / 2**20, 1)
+    })
+
+
+def test_dense_rerank(benchmark, built_index, queries, synthetic_embeddings):
+    """Rerank 20 keyword hits (what Search PubMed hands over for 5 results)"""
+    _, index = built_index
+    pmids, _, _ = synthetic_embeddings
+    candidates = np.random.default_rng(1).choice(pmids, 20, replace=False)
+    ranked = benchmark(index.rerank, queries[0], candidates)
+    assert len(ranked) == 20
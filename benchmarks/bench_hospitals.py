@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from src.emergency import hospital_index
+from src.emergency.hospital_index import EARTH_RADIUS_KM, HOSPITAL_TYPES, HospitalIndex
+
+
+@pytest.fixture(scope="module")
+def national_index():
+    """100k hospitals scattered over India, each with one or two types"""
+    rng = np.random.default_rng(8)
+    lats, lons = rng.uniform(8, 35, 100_000), rng.uniform(68, 97, 100_000)
+    hospitals = [{
+        "name": f"Hospital {i}", "city": "", "lat": float(lat), "lon": float(lon),
+        "types": tuple(rng.choice(HOSPITAL_TYPES, size=2, replace=False)), "beds": ("general",)
+    } for i, (lat, lon) in enumerate(zip(lats, lons))]
+    return HospitalIndex(hospitals)
+
+
+def _haversine_km(lat, lon, lats, lons):
+    lat, lon, lats, lons = np.radians(lat), np.radians(lon), np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+@pytest.mark.parametrize("hospital_type", ["All", "Trauma"])
+def test_nearest_hospitals(benchmark, national_index, hospital_type):
+    found = benchmark(national_index.nearest, 20.2961, 85.8245, 5, 50, hospital_type)
+
+    # Same answer as a brute-force haversine scan
+    candidates = [h for h in national_index.hospitals if hospital_type == "All" or "trauma" in h["types"]]
+    distances = _haversine_km(20.2961, 85.8245, np.array([h["lat"] for h in candidates]),
+                              np.array([h["lon"] for h in candidates]))
+    expected = [candidates[i]["name"] for i in np.argsort(distances)[:5] if distances[i] <= 50]
+    assert [h["name"] for h in found] == expected
+    assert all(h["distance_km"] <= 50 for h in found)
+
+
+def test_find_hospitals_bundled(benchmark):
+    place, hospitals = benchmark(hospital_index.find_hospitals, "Bhubaneshwar", "Emergency", 10)
+    assert place[0] == "Bhubaneswar"
+    assert hospitals and all("emergency" in h["types"] for h in hospitals)
+    assert [h["distance_km"] for h in hospitals] == sorted(h["distance_km"] for h in hospitals)
@@ -0,0 +1,49 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from src.tools import image_prep
+
+
+@pytest.fixture
+def image_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_prep, "IMAGE_CACHE_DIR", tmp_path / "image_cache")
+    return tmp_path / "image_cache"
+
+
+@pytest.fixture(scope="session")
+def scan_png_16bit(bench_data):
+    """A 2048x2048 12-bit intensity ramp in 16-bit PNG, with hot pixels for the percentile window to ignore"""
+    from PIL import Image
+
+    path = bench_data / "scan16.png"
+    ramp = np.linspace(0, 4095, 2048)
+    pixels = (ramp[None, :] + np.random.default_rng(4).normal(0, 40, (2048, 2048))).clip(0, 4095).astype(np.uint16)
+    pixels[::97, ::89] = 65535
+    Image.fromarray(pixels).save(path)
+    return path
+
+
+@pytest.mark.parametrize("fixture_name", ["dicom_file", "nifti_file", "png_file", "scan_png_16bit"])
+def test_build_pyramid(benchmark, request, image_cache, fixture_name):
+    path = request.getfixturevalue(fixture_name)
+    manifest = benchmark.pedantic(
+        image_prep.preprocess_image, args=(path,),
+        setup=lambda: shutil.rmtree(image_cache, ignore_errors=True), rounds=5
+    )
+    assert list(manifest["levels"]) == [str(size) for size in image_prep.PYRAMID_SIZES]
+    if fixture_name == "dicom_file":
+        assert manifest["window"] == [40.0, 400.0]
+
+
+def test_vision_image_cached(benchmark, image_cache, scan_png_16bit):
+    from PIL import Image
+
+    image_prep.preprocess_image(scan_png_16bit)
+    low = benchmark(image_prep.vision_image, scan_png_16bit, "low")
+    high = image_prep.vision_image(scan_png_16bit, "high")
+    with Image.open(low) as small, Image.open(high) as large:
+        assert max(small.size) == 512 and max(large.size) == 1024
+        # Windowed rather than min-max scaled: the hot pixels don't crush the contrast
+        assert np.asarray(small).std() > 30
@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+from src.pipeline import jobs
+
+
+@pytest.fixture
+def job_queue(bench_cwd):
+    queue = jobs.JobQueue(bench_cwd / "jobs.db", workers=2)
+    yield queue
+    queue.shutdown()
+
+
+def _wait(queue, job_id, statuses, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def test_submit_does_not_block(benchmark, job_queue, stub_llm):
+    """What the Streamlit script pays per 'Analyze' click"""
+    cases = iter(range(10**6))
+
+    def submit():
+        job_id = job_queue.submit(f"case-{next(cases)}", "Fever and dry cough for three days")
+        job_queue.cancel(job_id)
+
+    benchmark.pedantic(submit, rounds=50)
+
+
+def test_job_progress(job_queue, stub_llm):
+    job_id = job_queue.submit("case-1", "Fever and dry cough for three days")
+    with pytest.raises(jobs.JobLimitError):
+        job_queue.submit("case-1", "Second click while the first run is going")
+
+    job = _wait(job_queue, job_id, jobs.FINISHED)
+    assert job["status"] == "succeeded", job["error"]
+    done = [t for t in job["tasks"] if t["status"] == "done"]
+    assert done and all("Urgency Level" in t["detail"] for t in done)
+    assert {t["status"] for t in job["tasks"]} <= {"done", "skipped"}
+
+
+def test_job_cancel(job_queue, stub_llm, monkeypatch):
+    original = stub_llm.call
+
+    def slow_call(self, *args, **kwargs):
+        time.sleep(0.2)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(stub_llm, "call", slow_call)
+    job_id = job_queue.submit("case-2", "Fever and dry cough for three days")
+    _wait(job_queue, job_id, ("running",))
+    assert job_queue.cancel(job_id)
+    job = _wait(job_queue, job_id, jobs.FINISHED)
+    assert job["status"] == "cancelled"
+    assert any(t["status"] == "cancelled" for t in job["tasks"])
+
+
+def test_urgent_case_claimed_first(bench_cwd):
+    queue = jobs.JobQueue(bench_cwd / "priority.db", workers=0)
+    try:
+        job_ids = [queue.submit(f"case-{i}", "Follow-up") for i in range(3)]
+        queue.prioritize_case("case-2", "possible heart attack")
+        assert [queue._claim()[0] for _ in range(3)] == [job_ids[2], job_ids[0], job_ids[1]]
+    finally:
+        queue.shutdown()
+
+
+def test_prioritize_without_workers(bench_cwd, monkeypatch):
+    """A chat-only process flags a case without starting job workers of its own"""
+    monkeypatch.setattr(jobs, "JOBS_DB_PATH", bench_cwd / "chat-only.db")
+    monkeypatch.setattr(jobs, "_queue", None)
+    jobs.prioritize_case("case-9", "possible stroke")
+    assert jobs._queue is None
+
+    queue = jobs.JobQueue(bench_cwd / "chat-only.db", workers=0)
+    try:
+        job_ids = [queue.submit(f"case-{i}", "Follow-up") for i in (8, 9)]
+        assert queue._claim()[0] == job_ids[1]
+    finally:
+        queue.shutdown()
+
+
+def test_worker_survives_claim_errors(bench_cwd, monkeypatch):
+    import sqlite3
+
+    monkeypatch.setattr(jobs, "POLL_S", 0.01)
+    original = jobs.JobQueue._claim
+    failures = iter([True, True])
+
+    def flaky_claim(self):
+        if next(failures, False):
+            raise sqlite3.OperationalError("database is locked")
+        return original(self)
+
+    monkeypatch.setattr(jobs.JobQueue, "_claim", flaky_claim)
+    queue = jobs.JobQueue(bench_cwd / "flaky.db", workers=1, runner=lambda **kwargs: "done")
+    try:
+        job = _wait(queue, queue.submit("case-1", "Follow-up"), jobs.FINISHED, timeout=10)
+        assert job["status"] == "succeeded"
+    finally:
+        queue.shutdown()
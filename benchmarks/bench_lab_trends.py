@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import LAB_ANALYTES
+from src.pipeline import lab_trends
+
+YEARS = 10
+REPORTS_PER_YEAR = 12
+START = datetime(2016, 1, 1)
+
+
+def _report(month: int) -> str:
+    """One monthly panel; hemoglobin drifts down and leaves its range after ~5 years"""
+    lines = ["Test                 Result     Unit        Reference"]
+    for name, unit, low, high in LAB_ANALYTES:
+        value = (low + high) / 2 + ((month % 5) - 2) * (high - low) * 0.05
+        if name == "Hemoglobin":
+            value = 16.0 - month * 0.05
+        lines.append(f"{name:<20} {value:>8.2f}   {unit:<11} {low}-{high}")
+    return "\n".join(lines)
+
+
+@pytest.fixture
+def case_history(tmp_path, monkeypatch):
+    monkeypatch.setattr(lab_trends, "LAB_TRENDS_DIR", tmp_path / "lab_trends")
+    for month in range(YEARS * REPORTS_PER_YEAR):
+        lab_trends.add_report("case0001", _report(month), taken_at=START + timedelta(days=30.4 * month))
+    return "case0001"
+
+
+def test_add_report(benchmark, case_history):
+    months = iter(range(YEARS * REPORTS_PER_YEAR, 10**6))
+    start = datetime(2026, 1, 1)
+    added = benchmark(lambda: lab_trends.add_report(case_history, _report(next(months)) + "\n", start))
+    assert added == len(LAB_ANALYTES)
+
+
+def test_trend_summary(benchmark, case_history):
+    summary = benchmark(lab_trends.trend_summary, case_history)
+    assert summary.splitlines()[0] == f"Lab history: {YEARS * REPORTS_PER_YEAR} report(s) on file"
+    # The analyte out of range comes first, with its downward slope and the crossing
+    hemoglobin = summary.splitlines()[1]
+    assert hemoglobin.startswith("Hemoglobin:") and "(low," in hemoglobin and "moved to low" in hemoglobin
+    assert "trend -0.0493/30d" in hemoglobin
+
+
+def test_trend_window(benchmark, case_history):
+    last_year = START + timedelta(days=30.4 * (YEARS - 1) * REPORTS_PER_YEAR)
+    trends = benchmark(lab_trends.compute_trends, case_history, since=last_year)
+    assert {trend["results"] for trend in trends} == {REPORTS_PER_YEAR}
+
+
+def test_duplicate_report_ignored(case_history):
+    assert lab_trends.add_report(case_history, _report(0)) == 0
+
+
+def test_change_from_zero(tmp_path, monkeypatch):
+    monkeypatch.setattr(lab_trends, "LAB_TRENDS_DIR", tmp_path / "lab_trends")
+    for month, value in enumerate((0, 2)):
+        lab_trends.add_report("case0002", f"Eosinophils {value} % 1-6", taken_at=START + timedelta(days=30 * month))
+    summary = lab_trends.trend_summary("case0002")
+    assert "+2 vs previous" in summary and "nan" not in summary
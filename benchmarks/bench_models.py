@@ -0,0 +1,46 @@
+import os
+import resource
+
+import pytest
+
+pytestmark = pytest.mark.skipif(
+    os.getenv("BENCH_MODELS") != "1",
+    reason="downloads ClinicalBERT/BioGPT; set BENCH_MODELS=1 to run",
+)
+
+
+@pytest.fixture(params=["fp32", "mmap", "int8", "onnx"])
+def backend(request, monkeypatch):
+    from src.tools import model_backends
+
+    monkeypatch.setattr(model_backends, "MODEL_BACKEND", request.param)
+    monkeypatch.setattr(model_backends, "_loaded", {})
+    return request.param
+
+
+def _check_backend(kind, model_name, backend):
+    from src.tools import model_backends
+
+    _, _, loaded = model_backends.load_model(kind, model_name)
+    if loaded != backend:
+        pytest.skip(f"{backend} backend unavailable or failed the drift check")
+
+
+def test_clinical_bert(benchmark, backend):
+    from src.tools.data_tools import CLINICAL_BERT_MODEL, ClinicalBERTTool
+
+    _check_backend("sequence-classification", CLINICAL_BERT_MODEL, backend)
+    tool = ClinicalBERTTool()
+    result = benchmark(tool._run, "Fever of 39.5C with productive cough and shortness of breath.")
+    benchmark.extra_info["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    assert result.startswith("Predicted class"), result
+
+
+def test_biogpt(benchmark, backend):
+    from src.tools.data_tools import BIOGPT_MODEL, BioGPTTool
+
+    _check_backend("causal-lm", BIOGPT_MODEL, backend)
+    tool = BioGPTTool()
+    result = benchmark.pedantic(tool._run, args=("COVID-19 is",), rounds=3)
+    benchmark.extra_info["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    assert not result.startswith("Error"), result
@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from fake_entrez import FakeEntrezServer
+from src.tools import ncbi_client
+from src.tools.data_tools import SearchPubMedTool
+
+SERVER_RATE_LIMIT = 20
+CLIENT_RATE_LIMIT = 15
+POOL_SIZE = 4
+TOPICS = [f"topic {i}" for i in range(12)]
+
+
+@pytest.fixture(scope="module")
+def fake_entrez():
+    # 10% injected 503s and a little server latency, like a busy NCBI afternoon
+    with FakeEntrezServer(rate_limit=SERVER_RATE_LIMIT, error_rate=0.1, latency_s=0.02) as server:
+        yield server
+
+
+@pytest.fixture
+def ncbi(monkeypatch, fake_entrez):
+    client = ncbi_client.NCBIClient(
+        base_url=fake_entrez.url,
+        limiter=ncbi_client.TokenBucket(CLIENT_RATE_LIMIT),
+        pool_size=POOL_SIZE
+    )
+    monkeypatch.setattr(ncbi_client, "_client", client)
+    monkeypatch.setattr(ncbi_client, "BACKOFF_BASE_S", 0.05)
+    fake_entrez.reset_stats()
+    return client
+
+
+def test_search_pubmed_concurrent(benchmark, ncbi, fake_entrez):
+    """12 concurrent searches of 50 results each (esearch + 3 esummary batches per search)"""
+    tool = SearchPubMedTool()
+
+    def search_all():
+        with ThreadPoolExecutor(max_workers=len(TOPICS)) as pool:
+            return list(pool.map(lambda topic: tool._run(topic, max_results=50), TOPICS))
+
+    results = benchmark.pedantic(search_all, rounds=3)
+
+    assert all(r.startswith("1. Synthetic study") for r in results), results
+    assert all("50. Synthetic study" in r for r in results)
+    # The shared limiter keeps us under NCBI's limit and the pool reuses connections
+    assert fake_entrez.stats["rate_limited"] == 0, fake_entrez.stats
+    assert fake_entrez.stats["connections"] <= POOL_SIZE, fake_entrez.stats
+    benchmark.extra_info.update(fake_entrez.stats)
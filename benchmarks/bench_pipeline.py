@@ -0,0 +1,96 @@
+from src.main import run_diagnostic_pipeline
+
+
+def test_full_pipeline_text_only(benchmark, bench_cwd, stub_llm):
+    calls_before = stub_llm.calls
+    result = benchmark.pedantic(
+        run_diagnostic_pipeline,
+        kwargs={"patient_input": "Fever and dry cough for three days", "reuse": False},
+        rounds=3,
+    )
+    benchmark.extra_info["llm_calls_per_run"] = (stub_llm.calls - calls_before) / 3
+    assert not str(result).startswith("❌"), result
+
+
+def test_full_pipeline_with_files(benchmark, bench_cwd, stub_llm, png_file, lab_pdf_file):
+    calls_before = stub_llm.calls
+    result = benchmark.pedantic(
+        run_diagnostic_pipeline,
+        kwargs={
+            "patient_input": "Fever and dry cough for three days",
+            "image_path": str(png_file),
+            "lab_report_path": str(lab_pdf_file),
+            "reuse": False,
+        },
+        rounds=3,
+    )
+    benchmark.extra_info["llm_calls_per_run"] = (stub_llm.calls - calls_before) / 3
+    assert not str(result).startswith("❌"), result
+
+
+def test_resume_after_failure(benchmark, bench_cwd, stub_llm, monkeypatch):
+    """A run that dies part-way (after the agent's own retries) resumes without re-paying for finished tasks"""
+    from src.pipeline import checkpoints
+
+    original = stub_llm.call
+    prompts = []
+
+    def flaky_call(self, messages, *args, **kwargs):
+        prompts.append(str(messages))
+        if fail_on_call[0] and len(prompts) >= fail_on_call[0]:
+            raise RuntimeError("429 Too Many Requests")
+        return original(self, messages, *args, **kwargs)
+
+    monkeypatch.setattr(stub_llm, "call", flaky_call)
+    fail_on_call = [3]
+    failed = run_diagnostic_pipeline("Fever and dry cough for three days", run_id="flaky")
+    assert str(failed).startswith("❌"), failed
+    run = checkpoints.load_run("flaky")
+    assert run["status"] == "failed" and len(run["outputs"]) == 2
+
+    fail_on_call[0] = 0
+    prompts.clear()
+    result = benchmark.pedantic(run_diagnostic_pipeline, kwargs={"run_id": "flaky"}, rounds=1)
+    assert not str(result).startswith("❌"), result
+    run = checkpoints.load_run("flaky")
+    assert run["status"] == "completed" and len(run["outputs"]) == len(run["plan"]["tasks"])
+    # Only the unfinished tasks called the LLM, and the first of them saw the checkpointed context
+    assert len(prompts) == len(run["plan"]["tasks"]) - 2
+    assert "Stay hydrated" in prompts[0]
+    benchmark.extra_info["llm_calls_saved"] = 2
+
+
+def test_replay_from_task(bench_cwd, stub_llm):
+    from src.main import replay
+    from src.pipeline import checkpoints
+
+    run_diagnostic_pipeline("Fever and dry cough for three days", run_id="base")
+    names = checkpoints.load_run("base")["plan"]["tasks"]
+    calls_before = stub_llm.calls
+    result = replay("base", names[-2])
+    assert not str(result).startswith("❌"), result
+    assert stub_llm.calls - calls_before == 2
+    replayed = [r for r in checkpoints.list_runs() if r["run_id"] != "base"][0]
+    assert replayed["status"] == "completed" and replayed["done"] == len(names)
+    assert checkpoints.load_run(replayed["run_id"])["replayed_from"] == "base"
+
+
+def test_new_lab_report_recomputes_downstream_only(benchmark, bench_cwd, stub_llm, lab_txt_file):
+    """Uploading a new lab report re-runs the lab task and what builds on it, nothing else"""
+    from src.pipeline import checkpoints
+
+    symptoms = "Fever and dry cough for three days, worried about my diet"
+    run_diagnostic_pipeline(symptoms, lab_report_path=str(lab_txt_file), run_id="first")
+    new_labs = bench_cwd / "labs_followup.txt"
+    new_labs.write_text(lab_txt_file.read_text(encoding="utf-8").replace("Hemoglobin", "Hemoglobin (repeat)"),
+                        encoding="utf-8")
+
+    calls_before = stub_llm.calls
+    result = benchmark.pedantic(run_diagnostic_pipeline, args=(symptoms,),
+                                kwargs={"lab_report_path": str(new_labs), "run_id": "second"}, rounds=1)
+    assert not str(result).startswith("❌"), result
+    run = checkpoints.load_run("second")
+    assert "lab" in run["recomputed"] and "report" in run["recomputed"]
+    assert "triage" in run["reused"] and "symptom" in run["reused"]
+    assert stub_llm.calls - calls_before == len(run["recomputed"])
+    benchmark.extra_info.update({"reused": run["reused"], "recomputed": run["recomputed"]})
@@ -0,0 +1,108 @@
+import gzip
+import random
+from datetime import datetime
+
+import pytest
+
+from src.tools import ncbi_client, pubmed_index
+from src.tools.data_tools import SearchPubMedTool
+
+ARTICLES_PER_FILE = 10000
+BASELINE_FILES = 3
+TERMS = [
+    "pneumonia", "sepsis", "asthma", "diabetes", "hypertension", "migraine", "anemia",
+    "influenza", "stroke", "arrhythmia", "dermatitis", "nephropathy", "hepatitis", "obesity",
+    "antibiotic", "vaccine", "inflammation", "biomarker", "outcomes", "cohort", "randomized"
+]
+CURRENT_YEAR = datetime.now().year
+
+
+def _article_xml(pmid: int, rng: random.Random) -> str:
+    words = rng.sample(TERMS, 4)
+    year = rng.choice([CURRENT_YEAR, CURRENT_YEAR - 1, CURRENT_YEAR - 2])
+    return (
+        "<PubmedArticle><MedlineCitation><PMID>{pmid}</PMID><Article>"
+        "<Journal><Title>Journal of Synthetic Medicine</Title><JournalIssue><PubDate>"
+        "<Year>{year}</Year><Month>Mar</Month></PubDate></JournalIssue></Journal>"
+        "<ArticleTitle>{title} in adults: a <i>synthetic</i> study</ArticleTitle>"
+        "<Abstract><AbstractText>{abstract}</AbstractText></Abstract>"
+        "<AuthorList><Author><LastName>Doe</LastName><Initials>J</Initials></Author>"
+        "<Author><LastName>Roe</LastName><Initials>R</Initials></Author></AuthorList>"
+        "</Article></MedlineCitation></PubmedArticle>\n"
+    ).format(pmid=pmid, year=year, title=" and ".join(words[:2]).capitalize(),
+             abstract=" ".join(rng.choice(TERMS) for _ in range(60)))
+
+
+@pytest.fixture(scope="session")
+def pubmed_files(tmp_path_factory):
+    """Baseline files plus an update file that revises and deletes some citations"""
+    root = tmp_path_factory.mktemp("pubmed")
+    rng = random.Random(11)
+    paths = []
+    for n in range(BASELINE_FILES):
+        path = root / f"pubmed25n{n + 1:04d}.xml.gz"
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write("<PubmedArticleSet>\n")
+            for i in range(ARTICLES_PER_FILE):
+                f.write(_article_xml(n * ARTICLES_PER_FILE + i + 1, rng))
+            f.write("</PubmedArticleSet>\n")
+        paths.append(path)
+
+    update = root / "pubmed25n1001.xml.gz"
+    with gzip.open(update, "wt", encoding="utf-8") as f:
+        f.write("<PubmedArticleSet>\n")
+        for pmid in range(1, 101):
+            f.write(_article_xml(pmid, rng))
+        f.write("<DeleteCitation>" + "".join(f"<PMID>{pmid}</PMID>" for pmid in range(101, 201)))
+        f.write("</DeleteCitation>\n</PubmedArticleSet>\n")
+    paths.append(update)
+    return paths
+
+
+@pytest.fixture(scope="session")
+def pubmed_db(tmp_path_factory, pubmed_files):
+    path = tmp_path_factory.mktemp("pubmed_db") / "pubmed_index.db"
+    for file in pubmed_files:
+        pubmed_index.ingest_file(file, path)
+    return path
+
+
+def test_ingest_baseline_file(benchmark, tmp_path, pubmed_files):
+    paths = iter(tmp_path / f"index{i}.db" for i in range(100))
+
+    def fresh_index():
+        return (pubmed_files[0], next(paths)), {}
+
+    result = benchmark.pedantic(pubmed_index.ingest_file, setup=fresh_index, rounds=3)
+    assert result["articles"] == ARTICLES_PER_FILE
+    benchmark.extra_info["articles_per_file"] = ARTICLES_PER_FILE
+
+
+def test_ingest_is_incremental(pubmed_db, pubmed_files):
+    assert all(pubmed_index.ingest_file(f, pubmed_db)["skipped"] for f in pubmed_files)
+
+    # The update file's deletions and revisions were applied
+    deleted = pubmed_index.search_index("synthetic", limit=10**6, index_path=pubmed_db)
+    pmids = {int(a["pmid"]) for a in deleted}
+    assert len(pmids) == BASELINE_FILES * ARTICLES_PER_FILE - 100
+    assert not pmids & set(range(101, 201))
+
+
+@pytest.mark.parametrize("topic", ["pneumonia", "sepsis antibiotic outcomes"])
+def test_search_index(benchmark, pubmed_db, topic):
+    pubmed_index.search_index(topic, CURRENT_YEAR, index_path=pubmed_db)  # warm the connection
+    results = benchmark(pubmed_index.search_index, topic, CURRENT_YEAR, 5, pubmed_db)
+    assert len(results) == 5
+    assert all(str(CURRENT_YEAR) in r["pub_date"] for r in results)
+
+
+def test_search_pubmed_tool_offline(benchmark, monkeypatch, pubmed_db):
+    monkeypatch.setattr(pubmed_index, "PUBMED_INDEX_PATH", pubmed_db)
+
+    def no_network():
+        raise AssertionError("index hit should not reach NCBI")
+
+    monkeypatch.setattr(ncbi_client, "get_ncbi_client", no_network)
+    tool = SearchPubMedTool()
+    result = benchmark(tool._run, "asthma inflammation")
+    assert result.startswith("1. ") and "Doe J, Roe R" in result, result
@@ -0,0 +1,43 @@
+import pytest
+
+from src.emergency.red_flags import detect_red_flags, emergency_guidance
+
+MESSAGES = {
+    "I have crushing chest pain spreading to my left arm": ["cardiac"],
+    "No chest pain, but I can't breathe properly": ["breathing"],
+    "I don't have chest pain or fever": [],
+    "Mere seene mein dard ho raha hai": ["cardiac"],
+    "seene mein dard nahi hai, sirf khansi": [],
+    "मुझे सीने में दर्द है और सांस नहीं आ रही": ["cardiac", "breathing"],
+    "My father passed out and won’t wake up": ["unresponsive"],
+    "Denies shortness of breath": [],
+    "No puedo respirar": ["breathing"],
+    "The headache is worse today": [],
+    "he is not breathing": ["breathing"],
+    "he stopped breathing": ["breathing"],
+    "she is not waking up": ["unresponsive"],
+    "baby not breathing, lips are blue": ["breathing"],
+    "My husband collapsed and has no pulse": ["unresponsive"],
+    "denies chest pain or shortness of breath": [],
+    "I don't have fever, cough, or shortness of breath": [],
+    "No fever and I have chest pain": ["cardiac"],
+    "chest pain is not present": [],
+    "The chest pain is not going away": ["cardiac"],
+}
+
+
+@pytest.mark.parametrize("message, categories", MESSAGES.items())
+def test_red_flag_lexicon(message, categories):
+    assert [flag["category"] for flag in detect_red_flags(message)] == categories
+
+
+def test_detect_red_flags(benchmark):
+    """The check every chat turn pays before the LLM call"""
+    message = ("The headache is worse today and I feel a bit dizzy after lunch. "
+               "I also had some nausea last night but no vomiting, and my fever is 99.5F.")
+    assert benchmark(detect_red_flags, message) == []
+
+
+def test_emergency_guidance():
+    guidance = emergency_guidance(detect_red_flags("I took too many pills"))
+    assert "112" in guidance and "1800-425-2255" in guidance
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.tools import image_prep, saliency
+
+
+@pytest.fixture
+def lesion_input(tmp_path, monkeypatch, lesion_png_file, stub_classifier):
+    """The lesion scan as the classifier sees it: the cached pyramid level, resized to its input"""
+    monkeypatch.setattr(image_prep, "IMAGE_CACHE_DIR", tmp_path / "image_cache")
+    size = stub_classifier.input_size
+    with Image.open(image_prep.pyramid_level(lesion_png_file, size)) as level:
+        return np.asarray(level.convert("L").resize((size, size), Image.BILINEAR), dtype=np.float32) / 255
+
+
+@pytest.mark.parametrize("mode", ["full", "coarse-to-fine"])
+def test_occlusion_saliency(benchmark, lesion_input, stub_classifier, mode):
+    heatmap, info = benchmark(saliency.occlusion_saliency, lesion_input, stub_classifier, 32, 16, mode)
+    assert info["target"] == 0
+    y, x = np.unravel_index(np.argmax(heatmap), heatmap.shape)
+    # The blob sits at 30% down, 70% across
+    assert abs(y / heatmap.shape[0] - 0.3) < 0.08 and abs(x / heatmap.shape[1] - 0.7) < 0.08
+
+
+def test_coarse_to_fine_saves_evaluations(lesion_input, stub_classifier):
+    _, full = saliency.occlusion_saliency(lesion_input, stub_classifier, 32, 16, "full")
+    _, refined = saliency.occlusion_saliency(lesion_input, stub_classifier, 32, 16, "coarse-to-fine")
+    assert refined["evaluations"] < full["evaluations"] / 2
@@ -0,0 +1,53 @@
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from src.tools.shared_weights import map_safetensors, memory_usage
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads /proc/<pid>/smaps")
+
+# Maps the weights, reads every page (as a forward pass would), then waits to be told to exit
+CHILD = """
+import sys
+from src.tools.shared_weights import map_safetensors
+total = sum(float(view.sum()) for view, _ in map_safetensors(sys.argv[1]).values())
+print("ready", flush=True)
+sys.stdin.readline()
+"""
+
+
+@pytest.fixture(scope="module")
+def weights_file(tmp_path_factory):
+    """64 MB of fp32 'layers' in a safetensors file"""
+    from safetensors.numpy import save_file
+
+    path = tmp_path_factory.mktemp("weights") / "model.safetensors"
+    rng = np.random.default_rng(50)
+    save_file({f"layer.{i}.weight": rng.standard_normal((1024, 1024), dtype=np.float32) for i in range(16)},
+              str(path))
+    return path
+
+
+def test_map_weights(benchmark, weights_file):
+    tensors = benchmark(map_safetensors, weights_file)
+    assert len(tensors) == 16
+    view, dtype = tensors["layer.0.weight"]
+    assert dtype == "F32" and view.shape == (1024, 1024)
+
+
+def test_weights_shared_between_processes(weights_file):
+    children = [subprocess.Popen([sys.executable, "-c", CHILD, str(weights_file)],
+                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True) for _ in range(2)]
+    try:
+        for child in children:
+            assert child.stdout.readline().strip() == "ready"
+        for child in children:
+            usage = memory_usage(child.pid, weights_file.parent)
+            # Each process has all 64 MB of weights resident, and none of it is a private copy
+            assert usage["files_rss"] >= 60, usage
+            assert usage["files_shared"] >= 0.95 * usage["files_rss"], usage
+    finally:
+        for child in children:
+            child.communicate("\n", timeout=30)
@@ -0,0 +1,139 @@
+import shutil
+
+import pytest
+
+from src.tools.data_tools import ExtractLabTextTool, ParseMedicalImageTool
+from src.tools.output_tools import GeneratePDFTool, GenerateXAIHeatmapTool
+
+
+# ---------------------- MEDICAL IMAGE TOOL ----------------------
+
+@pytest.mark.parametrize("fixture_name", ["dicom_file", "nifti_file", "png_file"])
+def test_parse_medical_image(benchmark, request, fixture_name):
+    path = request.getfixturevalue(fixture_name)
+    tool = ParseMedicalImageTool()
+    result = benchmark(tool._run, str(path))
+    assert "loaded" in result, result
+
+
+# ---------------------- LAB REPORT TOOL ----------------------
+
+@pytest.mark.parametrize("fixture_name", ["lab_txt_file", "lab_pdf_file"])
+def test_extract_lab_text(benchmark, request, fixture_name):
+    path = request.getfixturevalue(fixture_name)
+    tool = ExtractLabTextTool()
+    result = benchmark(tool._run, str(path))
+    assert "Hemoglobin" in result, result
+
+
+@pytest.mark.skipif(shutil.which("tesseract") is None, reason="tesseract binary not installed")
+def test_extract_lab_text_ocr(benchmark, lab_png_file):
+    tool = ExtractLabTextTool()
+    result = benchmark.pedantic(tool._run, args=(str(lab_png_file),), rounds=3)
+    assert not result.startswith("Error"), result
+
+
+@pytest.fixture
+def stub_digest(tmp_path, monkeypatch):
+    """Fixed-length chunk summaries from a stub LLM and an empty digest cache"""
+    from src.tools import digest
+
+    class StubLLM:
+        model = "stub"
+        calls = 0
+
+        def call(self, messages):
+            StubLLM.calls += 1
+            return "\n".join(f"Panel {i}: results within the listed ranges" for i in range(10))
+
+    monkeypatch.setattr(digest, "_llm", StubLLM())
+    monkeypatch.setattr(digest, "_cache", digest.DigestCache(tmp_path / "digest_cache.db"))
+    return StubLLM
+
+
+def test_extract_lab_text_long_packet(benchmark, stub_digest, lab_packet_file):
+    """A 60-page packet goes to the agent as a digest that keeps every flagged result"""
+    from src.tasks.prompt_budget import count_tokens
+    from src.tools.digest import abnormal_lines
+
+    raw = lab_packet_file.read_text(encoding="utf-8")
+    tool = ExtractLabTextTool()
+    result = benchmark(tool._run, str(lab_packet_file))
+    assert result.startswith("[Digest of a"), result[:200]
+    assert all(line in result for line in abnormal_lines(raw))
+    assert count_tokens(result) < count_tokens(raw) / 2
+    if benchmark.stats:  # None under --benchmark-disable
+        benchmark.extra_info["raw_tokens"] = count_tokens(raw)
+        benchmark.extra_info["digest_tokens"] = count_tokens(result)
+
+
+ABNORMAL_LINES = {
+    "Hemoglobin            10.21 L  g/dL        12-16": True,
+    "Potassium              6.10 H  mmol/L      3.5-5.1": True,
+    "Troponin I 2.4* ng/mL 0-0.04": True,
+    "Glucose 310 HIGH mg/dL": True,
+    "Sodium 128 mmol/L 135-145": True,
+    "HIV 1/2 antibody Reactive 4.2": True,
+    "LDL (Low Density Lipoprotein) 95 mg/dL 0-100": False,
+    "HBsAg Non reactive 0.3": False,
+    "Urine volume 1.5 L": False,
+    "* Tests marked with an asterisk are outsourced, see page 2": False,
+    "*1 Sample received haemolysed": False,
+}
+
+
+@pytest.mark.parametrize("line, abnormal", ABNORMAL_LINES.items())
+def test_abnormal_lines(line, abnormal):
+    from src.tools.digest import is_abnormal
+
+    assert is_abnormal(line) == abnormal
+
+
+# ---------------------- OUTPUT TOOLS ----------------------
+
+def test_generate_pdf(benchmark, bench_cwd, lab_txt_file):
+    findings = lab_txt_file.read_text(encoding="utf-8")
+    citations = "\n".join(f"Study {i}. Journal of Benchmarks. 2025." for i in range(20))
+    tool = GeneratePDFTool()
+    result = benchmark(tool._run, findings, citations)
+    assert "successfully" in result, result
+
+
+def test_generate_xai_heatmap(benchmark, bench_cwd, stub_classifier, lesion_png_file):
+    tool = GenerateXAIHeatmapTool()
+    result = benchmark.pedantic(tool._run, args=(str(lesion_png_file),), rounds=5)
+    assert "successfully" in result, result
+    assert "Predicted class: lesion" in result
+
+
+def test_xai_heatmap_hides_non_clinical_labels(bench_cwd, stub_classifier, lesion_png_file):
+    from src.tools import saliency
+
+    saliency.register_classifier("bench-blob", type(stub_classifier))
+    result = GenerateXAIHeatmapTool()._run(str(lesion_png_file), 48, 24)
+    assert "successfully" in result, result
+    assert "Predicted class" not in result and "not a clinical model" in result
+
+
+# ---------------------- RUN-SCOPED MEMO ----------------------
+
+def test_duplicate_calls_in_run(benchmark, lab_txt_file):
+    """Agents reading the same report in one run, concurrently and by different paths"""
+    from concurrent.futures import ThreadPoolExecutor
+    from contextvars import copy_context
+    from src.tools.tool_memo import tool_memo
+
+    tool = ExtractLabTextTool()
+    paths = [str(lab_txt_file), str(lab_txt_file.parent / "." / lab_txt_file.name)] * 4
+
+    def run():
+        with tool_memo() as memo:
+            with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+                # A thread started inside a run shares its memo only if it carries the run's context
+                futures = [pool.submit(copy_context().run, tool._run, path) for path in paths]
+                results = [future.result() for future in futures]
+        return memo, results
+
+    memo, results = benchmark(run)
+    assert memo.executions == 1 and memo.saved == len(paths) - 1
+    assert len(set(results)) == 1 and "Hemoglobin" in results[0]
@@ -0,0 +1,28 @@
+import json
+import shutil
+
+import pytest
+
+from src.chat_system import transcript_export
+
+
+@pytest.mark.parametrize("fmt", ["text", "jsonl", "markdown", "pdf"])
+def test_transcript_bytes(benchmark, bench_cwd, chat_history_file, fmt):
+    shutil.copy(chat_history_file, bench_cwd / "chat_history.json")
+    data = benchmark(transcript_export.transcript_bytes, "case0007", fmt)
+    if fmt == "jsonl":
+        entries = [json.loads(line) for line in data.decode("utf-8").splitlines()]
+        assert len(entries) == 100 and {entry["case_id"] for entry in entries} == {"case0007"}
+    elif fmt == "pdf":
+        assert data.startswith(b"%PDF")
+    else:
+        assert data.decode("utf-8").count("headache") == 100
+
+
+def test_export_all_transcripts(benchmark, bench_cwd, chat_history_file):
+    """Every case of the log in one pass"""
+    shutil.copy(chat_history_file, bench_cwd / "chat_history.json")
+    out_dir = bench_cwd / "exports"
+    paths = benchmark(transcript_export.export_all_transcripts, out_dir, "jsonl")
+    assert len(paths) == 50
+    assert all(len(path.read_text(encoding="utf-8").splitlines()) == 100 for path in paths.values())
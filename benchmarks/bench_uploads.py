@@ -0,0 +1,69 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+from src.pipeline import uploads
+
+STUDY_SLICES = 200
+SLICE_BYTES = 512 * 512 * 2  # one 512x512 16-bit CT slice
+
+
+@pytest.fixture(scope="session")
+def study_zip(bench_data):
+    """A ~100 MB zipped series; pixel data is random so it doesn't compress away"""
+    path = bench_data / "study.zip"
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+        for i in range(STUDY_SLICES):
+            archive.writestr(f"series/IM{i:05d}", b"\0" * 128 + b"DICM" + os.urandom(SLICE_BYTES))
+    return path
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", tmp_path / "uploads")
+    # Measure ingestion alone; pre-parsing runs in the background in the app
+    monkeypatch.setattr(uploads, "schedule_preparse", lambda upload: None)
+    return tmp_path / "uploads"
+
+
+def test_ingest_study_zip(benchmark, upload_dir, study_zip):
+    def ingest():
+        with open(study_zip, "rb") as f:
+            return uploads.ingest_upload(f, "image", study_zip.name)
+
+    def fresh_store():
+        for obj in (upload_dir / "objects").rglob("*.zip"):
+            obj.unlink()
+
+    result = benchmark.pedantic(ingest, setup=fresh_store, rounds=5)
+    assert result["type"] == "zip" and not result["deduplicated"]
+    assert result["size"] == study_zip.stat().st_size
+    if benchmark.stats:  # None under --benchmark-disable
+        benchmark.extra_info["mb_per_s"] = round(result["size"] / 2**20 / benchmark.stats.stats.mean, 1)
+
+
+def test_ingest_duplicate(benchmark, upload_dir, study_zip):
+    with open(study_zip, "rb") as f:
+        first = uploads.ingest_upload(f, "image")
+
+    def ingest():
+        with open(study_zip, "rb") as f:
+            return uploads.ingest_upload(f, "image")
+
+    result = benchmark.pedantic(ingest, rounds=5)
+    assert result["deduplicated"] and result["path"] == first["path"]
+    assert len(list((upload_dir / "objects").rglob("*.zip"))) == 1
+    assert not list((upload_dir / "tmp").iterdir())
+
+
+@pytest.mark.parametrize("content, kind", [
+    (b"MZ\x90\x00" + b"\0" * 1024, "image"),        # executable renamed to .dcm
+    (b"%PDF-1.7\n" + b"\0" * 1024, "image"),       # PDF in the scan slot
+    (b"PK\x03\x04" + b"\0" * 1024, "image"),       # corrupt ZIP
+])
+def test_rejects_by_content(upload_dir, content, kind):
+    with pytest.raises(uploads.UploadError):
+        uploads.ingest_upload(io.BytesIO(content), kind, "scan.dcm")
+    assert not list((upload_dir / "tmp").iterdir())
@@ -0,0 +1,270 @@
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# The agents build their LLM clients at import time, so make sure nothing
+# reaches for real credentials or telemetry while benchmarking.
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark-stub")
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+HISTORY_CASES = 50
+HISTORY_LINES = 5000
+LAB_ANALYTES = [
+    ("Hemoglobin", "g/dL", 13.5, 17.5),
+    ("WBC", "x10^3/uL", 4.0, 11.0),
+    ("Platelets", "x10^3/uL", 150, 400),
+    ("Glucose (Fasting)", "mg/dL", 70, 100),
+    ("Creatinine", "mg/dL", 0.7, 1.3),
+    ("Sodium", "mmol/L", 135, 145),
+    ("Potassium", "mmol/L", 3.5, 5.1),
+    ("ALT", "U/L", 7, 56),
+    ("TSH", "mIU/L", 0.4, 4.0),
+    ("HbA1c", "%", 4.0, 5.6),
+]
+
+
+# ---------------------- SYNTHETIC FIXTURES ----------------------
+
+def _lab_report_lines(pages: int = 1) -> list:
+    """Build a plausible lab report, one analyte table per page"""
+    import numpy as np
+
+    rng = np.random.default_rng(7)
+    lines = []
+    for page in range(pages):
+        lines.append(f"CITY DIAGNOSTICS - LABORATORY REPORT (page {page + 1})")
+        lines.append("Test                 Result     Unit        Reference")
+        for name, unit, low, high in LAB_ANALYTES:
+            value = rng.uniform(low * 0.8, high * 1.2)
+            flag = " H" if value > high else (" L" if value < low else "")
+            lines.append(f"{name:<20} {value:>8.2f}{flag:<2} {unit:<11} {low}-{high}")
+        lines.append("")
+    return lines
+
+
+@pytest.fixture(scope="session")
+def bench_data(tmp_path_factory):
+    return tmp_path_factory.mktemp("bench_data")
+
+
+@pytest.fixture(scope="session")
+def dicom_file(bench_data):
+    import numpy as np
+    import pydicom
+    from pydicom.dataset import FileDataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.1"
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    path = bench_data / "chest.dcm"
+    ds = FileDataset(str(path), {}, file_meta=meta, preamble=b"\0" * 128)
+    ds.PatientID = "BENCH-001"
+    ds.Modality = "CR"
+    ds.Rows, ds.Columns = 2048, 2048
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated = 16
+    ds.BitsStored = 12
+    ds.HighBit = 11
+    ds.PixelRepresentation = 0
+    ds.RescaleSlope = 1
+    ds.RescaleIntercept = -1024
+    ds.WindowCenter = 40
+    ds.WindowWidth = 400
+    pixels = np.random.default_rng(1).integers(0, 4096, (2048, 2048), dtype=np.uint16)
+    ds.PixelData = pixels.tobytes()
+    ds.is_little_endian = True
+    ds.is_implicit_VR = False
+    pydicom.dcmwrite(str(path), ds)
+    return path
+
+
+@pytest.fixture(scope="session")
+def nifti_file(bench_data):
+    import nibabel as nib
+    import numpy as np
+
+    path = bench_data / "brain.nii"
+    volume = np.random.default_rng(2).random((256, 256, 128), dtype=np.float32)
+    nib.save(nib.Nifti1Image(volume, affine=np.eye(4)), str(path))
+    return path
+
+
+@pytest.fixture(scope="session")
+def png_file(bench_data):
+    import cv2
+    import numpy as np
+
+    path = bench_data / "xray.png"
+    image = np.random.default_rng(3).integers(0, 256, (1024, 1024), dtype=np.uint8)
+    cv2.imwrite(str(path), image)
+    return path
+
+
+@pytest.fixture(scope="session")
+def lab_txt_file(bench_data):
+    path = bench_data / "labs.txt"
+    path.write_text("\n".join(_lab_report_lines(pages=5)), encoding="utf-8")
+    return path
+
+
+@pytest.fixture(scope="session")
+def lab_packet_file(bench_data):
+    path = bench_data / "lab_packet.txt"
+    path.write_text("\n".join(_lab_report_lines(pages=60)), encoding="utf-8")
+    return path
+
+
+@pytest.fixture(scope="session")
+def lab_pdf_file(bench_data):
+    from fpdf import FPDF
+
+    path = bench_data / "labs.pdf"
+    pdf = FPDF()
+    pdf.set_font("Courier", size=9)
+    for line in _lab_report_lines(pages=20):
+        if line.startswith("CITY DIAGNOSTICS"):
+            pdf.add_page()
+        pdf.cell(0, 5, line, ln=True)
+    pdf.output(str(path))
+    return path
+
+
+@pytest.fixture(scope="session")
+def lab_png_file(bench_data):
+    from PIL import Image, ImageDraw
+
+    path = bench_data / "labs_scan.png"
+    image = Image.new("L", (1240, 900), color=255)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(_lab_report_lines(pages=1)):
+        draw.text((40, 40 + i * 28), line, fill=0)
+    image.save(path)
+    return path
+
+
+@pytest.fixture(scope="session")
+def chat_history_file(bench_data):
+    """A multi-thousand-line chat_history.json spread over many cases"""
+    path = bench_data / "chat_history.json"
+    start = datetime(2025, 1, 1, 9, 0, 0)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(HISTORY_LINES):
+            entry = {
+                "case_id": f"case{i % HISTORY_CASES:04d}",
+                "timestamp": (start + timedelta(minutes=i)).isoformat(),
+                "patient_input": f"I still have a headache and mild fever, day {i // HISTORY_CASES}.",
+                "agent_response": "I'm sorry you're still unwell. **Urgency Level:** MODERATE\n\n" * 4,
+            }
+            f.write(json.dumps(entry) + "\n")
+    return path
+
+
+@pytest.fixture(scope="session")
+def lesion_png_file(bench_data):
+    """A 1024x1024 noisy scan with one bright blob at 30% down, 70% across"""
+    import numpy as np
+    from PIL import Image
+
+    path = bench_data / "lesion.png"
+    rows, cols = np.mgrid[0:1024, 0:1024]
+    blob = np.exp(-((rows - 307) ** 2 + (cols - 717) ** 2) / (2 * 50.0 ** 2))
+    noise = np.random.default_rng(5).normal(0, 8, (1024, 1024))
+    Image.fromarray((40 + 180 * blob + noise).clip(0, 255).astype(np.uint8)).save(path)
+    return path
+
+
+@pytest.fixture
+def stub_classifier(monkeypatch):
+    """A two-class numpy 'model' whose score is the brightness under a blob-shaped template"""
+    import numpy as np
+    from src.tools import saliency
+
+    class BlobClassifier:
+        input_size = 224
+        labels = ["lesion", "normal"]
+
+        def __init__(self):
+            rows, cols = np.mgrid[0:self.input_size, 0:self.input_size]
+            centre = (0.3 * self.input_size, 0.7 * self.input_size)
+            template = np.exp(-((rows - centre[0]) ** 2 + (cols - centre[1]) ** 2) / (2 * 11.0 ** 2))
+            self.template = (template / template.sum()).astype(np.float32)
+
+        def __call__(self, batch):
+            score = np.tensordot(batch, self.template, axes=2) * 8
+            logits = np.stack([score, -score], axis=1)
+            exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+            return exp / exp.sum(axis=1, keepdims=True)
+
+    saliency.register_classifier("bench-blob", BlobClassifier, clinical=True)
+    monkeypatch.setattr(saliency, "SALIENCY_MODEL", "bench-blob")
+    return saliency.get_classifier("bench-blob")
+
+
+@pytest.fixture
+def bench_cwd(tmp_path, monkeypatch):
+    """Run in a scratch directory so reports/ and logs never touch the repo"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture(autouse=True)
+def fresh_task_cache(tmp_path, monkeypatch):
+    """Every benchmark starts with an empty task cache, so pipeline runs really run"""
+    from src.pipeline import task_cache
+
+    cache = task_cache.TaskCache(tmp_path / "task_cache.db")
+    monkeypatch.setattr(task_cache, "_cache", cache)
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def fresh_chat_analytics(monkeypatch):
+    """Chat analytics are opened (and backfilled) in each benchmark's own working directory"""
+    from src.chat_system import chat_analytics
+
+    monkeypatch.setattr(chat_analytics, "_analytics", None)
+
+
+# ---------------------- STUB LLM ----------------------
+
+@pytest.fixture
+def stub_llm(monkeypatch):
+    """Swap every agent's LLM for a canned, zero-latency responder"""
+    from crewai.llms.base_llm import BaseLLM
+    from src.agents import crew_agents
+
+    class StubLLM(BaseLLM):
+        calls: int = 0
+
+        def call(self, messages, *args, **kwargs):
+            StubLLM.calls += 1
+            return (
+                "Thought: I now know the final answer\n"
+                "Final Answer: **Urgency Level:** MODERATE\n\n"
+                "Stay hydrated, rest, and see a doctor within 24-48 hours if symptoms persist."
+            )
+
+        def supports_function_calling(self) -> bool:
+            return False
+
+        def get_context_window_size(self) -> int:
+            return 8192
+
+    stub = StubLLM(model="stub")
+    for name in dir(crew_agents):
+        agent = getattr(crew_agents, name)
+        if name.endswith("_agent"):
+            monkeypatch.setattr(agent, "llm", stub)
+    return StubLLM
@@ -0,0 +1,109 @@
+"""
+Local stand-in for the NCBI E-utilities endpoints used by SearchPubMedTool.
+
+It enforces a requests-per-second limit (answering 429 like NCBI does), can
+inject random 5xx errors and records how many requests and TCP connections it
+served, so the client's throttling, retries and keep-alive can be checked
+without touching the real service.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from collections import deque
+import threading
+import random
+import json
+import time
+
+
+class FakeEntrezServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, rate_limit: float = 3.0, error_rate: float = 0.0, latency_s: float = 0.0):
+        super().__init__(("127.0.0.1", 0), _EntrezHandler)
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.latency_s = latency_s
+        self.lock = threading.Lock()
+        self.recent = deque()
+        self.stats = {"requests": 0, "rate_limited": 0, "errors_injected": 0, "connections": 0}
+        self._rng = random.Random(7)
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = dict.fromkeys(self.stats, 0)
+
+    def admit(self) -> int:
+        """HTTP status for the next request: 429 over the rate limit, sometimes 503, else 200"""
+        with self.lock:
+            self.stats["requests"] += 1
+            now = time.monotonic()
+            while self.recent and now - self.recent[0] >= 1.0:
+                self.recent.popleft()
+            if len(self.recent) >= self.rate_limit:
+                self.stats["rate_limited"] += 1
+                return 429
+            self.recent.append(now)
+            if self._rng.random() < self.error_rate:
+                self.stats["errors_injected"] += 1
+                return 503
+            return 200
+
+
+class _EntrezHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.stats["connections"] += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if self.server.latency_s:
+            time.sleep(self.server.latency_s)
+
+        status = self.server.admit()
+        if status == 429:
+            body = {"error": "API rate limit exceeded"}
+        elif status != 200:
+            body = {"error": "Service unavailable"}
+        elif url.path.endswith("/esearch.fcgi"):
+            retmax = int(params.get("retmax", 20))
+            body = {"esearchresult": {"idlist": [str(40000000 + i) for i in range(retmax)]}}
+        elif url.path.endswith("/esummary.fcgi"):
+            ids = params.get("id", "").split(",")
+            result = {"uids": ids}
+            for pmid in ids:
+                result[pmid] = {
+                    "uid": pmid,
+                    "title": f"Synthetic study {pmid}",
+                    "authors": [{"name": "Doe J"}, {"name": "Roe R"}],
+                    "pubdate": "2025 Jan"
+                }
+            body = {"result": result}
+        else:
+            status, body = 404, {"error": "Unknown endpoint"}
+
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
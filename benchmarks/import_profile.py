@@ -0,0 +1,102 @@
+"""
+Import-time profile for the Streamlit app and CLI entry points (``python -X importtime``).
+
+    python benchmarks/import_profile.py                 # profile what app.py imports
+    python benchmarks/import_profile.py src.main --top 40
+    python benchmarks/import_profile.py --budget 1.5    # override the cold-start budget (seconds)
+
+Exits non-zero if the cold start exceeds the budget or if any heavy dependency
+that should only load on first tool use is imported eagerly.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Everything app.py pulls in before it can render the first page.
+APP_IMPORTS = ["streamlit", "dotenv", "src.main", "src.chat_system.chat_interface"]
+
+# Target cold-start for app.py imports on a warm disk cache. crewai + streamlit
+# alone account for most of it; the model/imaging stacks must not be in here.
+COLD_START_BUDGET_S = float(os.getenv("COLD_START_BUDGET_S", "3.0"))
+
+# Packages that must only be imported on first use inside a tool.
+DEFERRED_PACKAGES = [
+    "torch", "transformers", "cv2", "pydicom", "nibabel",
+    "pytesseract", "pdfplumber", "fpdf", "matplotlib",
+]
+
+
+def profile(modules: list) -> tuple:
+    """Import the modules in a fresh interpreter; return (wall seconds, importtime rows)"""
+    code = "; ".join(f"import {m}" for m in modules)
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    env.setdefault("OPENAI_API_KEY", "sk-import-profile")
+
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+
+    if proc.returncode != 0:
+        tail = "\n".join(proc.stderr.splitlines()[-15:])
+        raise RuntimeError(f"Import failed:\n{tail}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return wall, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import profile")
+    parser.add_argument("modules", nargs="*", default=APP_IMPORTS)
+    parser.add_argument("--top", type=int, default=25, help="Number of top-level packages to show")
+    parser.add_argument("--budget", type=float, default=COLD_START_BUDGET_S)
+    args = parser.parse_args()
+
+    try:
+        wall, rows = profile(args.modules)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(2)
+
+    # Top-level packages only (no leading indent) carry the cumulative cost of their subtree
+    top_level = {}
+    for self_us, cumulative_us, name in rows:
+        if not name.startswith("  "):
+            package = name.strip().split(".")[0]
+            top_level[package] = top_level.get(package, 0) + cumulative_us
+
+    print(f"⏱️  Cold start for: {', '.join(args.modules)}")
+    print(f"   Wall time: {wall:.2f}s (budget {args.budget:.2f}s), modules imported: {len(rows)}\n")
+    print(f"{'package':<32} {'cumulative (ms)':>16}")
+    for package, cumulative_us in sorted(top_level.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"{package:<32} {cumulative_us / 1000:>16.1f}")
+
+    imported = {name.strip().split(".")[0] for _, _, name in rows}
+    eager = [pkg for pkg in DEFERRED_PACKAGES if pkg in imported]
+
+    failed = False
+    if eager:
+        print(f"\n❌ Heavy dependencies imported eagerly: {', '.join(eager)}")
+        failed = True
+    if wall > args.budget:
+        print(f"\n❌ Cold start {wall:.2f}s exceeds budget of {args.budget:.2f}s")
+        failed = True
+    if not failed:
+        print("\n✅ Within cold-start budget")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Run the benchmark suite and save results as JSON, or compare two saved runs.
+
+    python benchmarks/run.py                      # saves benchmarks/results/<commit>.json
+    python benchmarks/run.py -k pipeline          # extra args are passed to pytest
+    python benchmarks/run.py --compare OLD.json NEW.json [--threshold 0.10]
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+RESULTS_DIR = BENCH_DIR / "results"
+
+
+def current_commit() -> str:
+    """Short commit hash, suffixed with -dirty when the tree has local changes"""
+    try:
+        sha = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, text=True
+        ).strip()
+        dirty = subprocess.run(
+            ["git", "diff", "--quiet", "HEAD"], cwd=BENCH_DIR
+        ).returncode != 0
+        return f"{sha}-dirty" if dirty else sha
+    except (OSError, subprocess.CalledProcessError):
+        return "nogit"
+
+
+def run(pytest_args: list) -> int:
+    import pytest
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output = RESULTS_DIR / f"{current_commit()}.json"
+    args = [
+        str(BENCH_DIR),
+        "-o", "python_files=bench_*.py",
+        "-p", "no:cacheprovider",
+        f"--benchmark-json={output}",
+        *pytest_args,
+    ]
+    code = pytest.main(args)
+    if output.exists():
+        print(f"\n📊 Benchmark results saved to: {output}")
+    return code
+
+
+def _means(path: Path) -> dict:
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return {b["fullname"]: b["stats"]["mean"] for b in data.get("benchmarks", [])}
+
+
+def compare(old_path: Path, new_path: Path, threshold: float) -> int:
+    """Print per-benchmark mean ratios; non-zero exit if any regressed past threshold"""
+    old, new = _means(old_path), _means(new_path)
+    regressions = 0
+
+    print(f"{'benchmark':<70} {'old (ms)':>10} {'new (ms)':>10} {'ratio':>7}")
+    for name in sorted(old.keys() | new.keys()):
+        if name not in old or name not in new:
+            status = "added" if name in new else "removed"
+            print(f"{name:<70} {status:>29}")
+            continue
+
+        ratio = new[name] / old[name] if old[name] else float("inf")
+        marker = ""
+        if ratio > 1 + threshold:
+            marker = "  ⚠️ regression"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            marker = "  ✅ faster"
+        print(f"{name:<70} {old[name] * 1000:>10.2f} {new[name] * 1000:>10.2f} {ratio:>7.2f}{marker}")
+
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agentic Doctor benchmark runner")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), type=Path)
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown that counts as a regression (default: 0.10)")
+    args, pytest_args = parser.parse_known_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+    sys.exit(run(pytest_args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,10 @@
 from crewai import Agent
-from crewai.llm import LLM
-llm = LLM(model="gpt-4o-mini", temperature=0.7)
+from src.agents.model_tiers import agent_llm
 from src.tools.data_tools import (
     extract_lab_text,
     parse_medical_image,
     search_pubmed,
+    semantic_pubmed,
     bio_gpt,
     clinical_bert
 )
@@ -89,7 +89,7 @@ chat_agent = Agent(
     tools=[],  # Remove tools from default usage - only use when explicitly needed
     verbose=True,
     allow_delegation=False,
-    llm=llm
+    llm=agent_llm("chat_agent")
 )
 
 collab_agent = Agent(
@@ -102,7 +102,7 @@ collab_agent = Agent(
     tools=[],
     verbose=True,
     allow_delegation=True,
-    llm=llm
+    llm=agent_llm("collab_agent")
 )
 
 vision_agent = Agent(
@@ -115,7 +115,7 @@ vision_agent = Agent(
     tools=[parse_medical_image],
     verbose=False,
     allow_delegation=False,
-    llm=llm
+    llm=agent_llm("vision_agent")
 )
 
 lab_agent = Agent(
@@ -125,7 +125,7 @@ lab_agent = Agent(
     tools=[extract_lab_text],
     verbose=False,
     allow_delegation=False,
-    llm=llm
+    llm=agent_llm("lab_agent")
 )
 
 image_agent = Agent(
@@ -135,17 +135,17 @@ image_agent = Agent(
     tools=[parse_medical_image],
     verbose=False,
     allow_delegation=False,
-    llm=llm
+    llm=agent_llm("image_agent")
 )
 
 research_agent = Agent(
     role="Medical Research Synthesizer",
     goal="Find and summarize recent PubMed studies relevant to the patient's symptoms.",
     backstory="You are a biomedical researcher who helps clinicians stay updated with the latest evidence.",
-    tools=[search_pubmed, bio_gpt],
+    tools=[search_pubmed, semantic_pubmed, bio_gpt],
     verbose=False,
     allow_delegation=False,
-    llm=llm
+    llm=agent_llm("research_agent")
 )
 
 symptom_agent = Agent(
@@ -155,7 +155,7 @@ symptom_agent = Agent(
     tools=[clinical_bert],
     verbose=False,
     allow_delegation=False,
-    llm=llm
+    llm=agent_llm("symptom_agent")
 )
 
 report_agent = Agent(
@@ -165,7 +165,7 @@ report_agent = Agent(
     tools=[],
     verbose=False,
     allow_delegation=False,
-    llm=llm
+    llm=agent_llm("report_agent")
 )
 
 wellness_agent = Agent(
@@ -175,7 +175,7 @@ wellness_agent = Agent(
     tools=[],
     verbose=False,
     allow_delegation=False,
-    llm=llm
+    llm=agent_llm("wellness_agent")
 )
 
 followup_agent = Agent(
@@ -185,7 +185,7 @@ followup_agent = Agent(
     tools=[],
     verbose=False,
     allow_delegation=False,
-    llm=llm
+    llm=agent_llm("followup_agent")
 )
 
 diet_agent = Agent(
@@ -203,5 +203,5 @@ diet_agent = Agent(
     tools=[],
     verbose=False,
     allow_delegation=False,
-    llm=llm
+    llm=agent_llm("diet_agent")
 )
\ No newline at end of file
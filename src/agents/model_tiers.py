@@ -0,0 +1,263 @@
+from crewai.llm import LLM
+from crewai.llms.base_llm import BaseLLM
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+import threading
+import json
+import time
+import os
+import re
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ---------------------- TIER CONFIGURATION ----------------------
+
+# "fast" can point at a smaller hosted model or a local one (e.g. "ollama/llama3.2").
+MODEL_TIERS = {
+    "fast": {"model": os.getenv("FAST_MODEL", "gpt-4.1-nano"), "temperature": 0.7},
+    "strong": {"model": os.getenv("STRONG_MODEL", "gpt-4o-mini"), "temperature": 0.7}
+}
+
+# USD per 1M tokens (input, output) - used for cost tracking only
+MODEL_PRICES = {
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4o": (2.50, 10.00)
+}
+
+# "fast", "strong", or "cascade" (start on fast, escalate to strong when needed)
+AGENT_TIERS = {
+    "chat_agent": "cascade",
+    "collab_agent": "strong",
+    "vision_agent": "strong",
+    "lab_agent": "strong",
+    "image_agent": "strong",
+    "research_agent": "strong",
+    "symptom_agent": "strong",
+    "report_agent": "strong",
+    "wellness_agent": "cascade",
+    "followup_agent": "strong",
+    "diet_agent": "cascade",
+    "digest": "fast"  # chunk summaries of long lab reports (src/tools/digest.py)
+}
+
+# Set CASCADE_MODE=off to send everything to the strong tier
+CASCADE_ENABLED = os.getenv("CASCADE_MODE", "on").lower() != "off"
+
+# ---------------------- ROUTING SIGNALS ----------------------
+
+SIMPLE_TURN_PATTERN = re.compile(
+    r"^\W*(hi|hello|hey|hiya|good (morning|afternoon|evening)|namaste|thanks?( you)?( so much)?|"
+    r"thank u|ok(ay)?|k|sure|great|got it|cool|bye|goodbye|see you|yes|no|alright|"
+    r"sounds good|will do|hello dr\.? chen|hi dr\.? chen)\W*$",
+    re.IGNORECASE
+)
+
+# Upstream outputs that flag a serious case push low-stakes tasks to the strong tier
+COMPLEX_CASE_PATTERN = re.compile(
+    r"urgency level:?\**\s*(moderate to high|high|emergency)|call 112|seek emergency",
+    re.IGNORECASE
+)
+
+# Fast-tier answers that hedge, refuse, or break the ReAct format are retried on strong
+LOW_CONFIDENCE_PATTERN = re.compile(
+    r"not sure|i cannot|i can'?t (help|determine|answer)|unable to|"
+    r"as an ai|i don'?t know|not enough information",
+    re.IGNORECASE
+)
+ESCALATION_MIN_CHARS = int(os.getenv("ESCALATION_MIN_CHARS", "20"))
+
+_tier_hint = ContextVar("tier_hint", default=None)
+
+
+def classify_turn(message: str) -> str:
+    """Return 'fast' for greetings and acknowledgements, 'strong' for anything else"""
+    return "fast" if SIMPLE_TURN_PATTERN.match(message.strip()) else "strong"
+
+
+@contextmanager
+def prefer_tier(tier: str):
+    """Route cascade LLM calls made inside this block to the given tier first"""
+    token = _tier_hint.set(tier)
+    try:
+        yield
+    finally:
+        _tier_hint.reset(token)
+
+
+def _user_text(messages) -> str:
+    if isinstance(messages, str):
+        return messages
+    return "\n".join(str(m.get("content", "")) for m in messages if m.get("role") == "user")
+
+
+def _needs_escalation(response) -> bool:
+    if not isinstance(response, str):
+        return False
+    text = response.strip()
+    if "Final Answer:" not in text:
+        # Neither an answer nor a tool call means the fast model broke the ReAct format
+        return "Action:" not in text
+    answer = text.split("Final Answer:", 1)[1].strip()
+    if len(answer) < ESCALATION_MIN_CHARS:
+        return True
+    return bool(LOW_CONFIDENCE_PATTERN.search(answer) or COMPLEX_CASE_PATTERN.search(answer))
+
+
+# ---------------------- USAGE TRACKING ----------------------
+
+_stats_lock = threading.Lock()
+tier_stats = {}
+USAGE_LOG_PATH = Path(os.getenv("MODEL_USAGE_LOG", "model_usage.json"))
+# The log is rotated to <name>.1 (one generation kept) once it reaches this size
+USAGE_LOG_MAX_MB = float(os.getenv("MODEL_USAGE_LOG_MAX_MB", "10"))
+_log_lock = threading.Lock()
+
+
+def _tier_totals(tier: str) -> dict:
+    return tier_stats.setdefault(tier, {
+        "calls": 0, "escalations": 0, "total_latency_s": 0.0,
+        "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0
+    })
+
+
+def _record_call(agent_name: str, tier: str, llm, latency: float, prompt_tokens: int,
+                 completion_tokens: int, escalated: bool):
+    """Accumulate per-tier latency/token/cost totals and append the call to the usage log"""
+    input_price, output_price = MODEL_PRICES.get(llm.model, (0.0, 0.0))
+    cost = (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+    with _stats_lock:
+        stats = _tier_totals(tier)
+        stats["calls"] += 1
+        if escalated:
+            # Escalations are charged to the tier that failed to answer
+            _tier_totals("fast")["escalations"] += 1
+        stats["total_latency_s"] += latency
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+        stats["cost_usd"] += cost
+
+    entry = {
+        "timestamp": datetime.now().isoformat(),
+        "agent": agent_name,
+        "tier": tier,
+        "model": llm.model,
+        "latency_s": round(latency, 3),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cost_usd": round(cost, 6),
+        "escalated": escalated
+    }
+    try:
+        with _log_lock:
+            if USAGE_LOG_PATH.exists() and USAGE_LOG_PATH.stat().st_size >= USAGE_LOG_MAX_MB * 1024 * 1024:
+                os.replace(USAGE_LOG_PATH, USAGE_LOG_PATH.with_name(USAGE_LOG_PATH.name + ".1"))
+            with open(USAGE_LOG_PATH, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+    except OSError:
+        pass
+
+
+def get_tier_stats() -> dict:
+    """Per-tier call counts, escalation rate (fast tier), mean latency, tokens and cost since startup"""
+    with _stats_lock:
+        summary = {}
+        for tier, stats in tier_stats.items():
+            calls = stats["calls"] or 1
+            summary[tier] = {
+                **stats,
+                "mean_latency_s": stats["total_latency_s"] / calls,
+                "escalation_rate": stats["escalations"] / calls
+            }
+        return summary
+
+
+# ---------------------- TIERED LLM ----------------------
+
+class TieredLLM(BaseLLM):
+    """
+    Per-agent LLM that sends each call to the agent's tier and records latency and cost.
+
+    In 'cascade' mode calls start on the fast tier and are retried on the strong
+    tier when the turn is complex or the fast answer looks low-confidence.
+    """
+
+    def __init__(self, agent_name: str, mode: str):
+        # Separate clients per agent: the agent executor mutates stop words on its LLM
+        self.tiers = {"fast": LLM(**MODEL_TIERS["fast"]), "strong": LLM(**MODEL_TIERS["strong"])}
+        self.agent_name = agent_name
+        self.mode = mode
+        super().__init__(model=f"{mode}:{agent_name}", temperature=MODEL_TIERS["strong"]["temperature"])
+
+    @property
+    def stop(self) -> list:
+        return self.tiers["strong"].stop
+
+    @stop.setter
+    def stop(self, value: list):
+        if hasattr(self, "tiers"):
+            for llm in self.tiers.values():
+                llm.stop = value
+
+    def _choose_tier(self, messages) -> str:
+        if self.mode != "cascade":
+            return self.mode
+        hint = _tier_hint.get()
+        if hint:
+            return hint
+        return "strong" if COMPLEX_CASE_PATTERN.search(_user_text(messages)) else "fast"
+
+    def _call_tier(self, tier: str, messages, escalated: bool, **kwargs):
+        llm = self.tiers[tier]
+        before = llm.get_token_usage_summary()
+        start = time.perf_counter()
+        response = llm.call(messages, **kwargs)
+        latency = time.perf_counter() - start
+        after = llm.get_token_usage_summary()
+
+        prompt_tokens = after.prompt_tokens - before.prompt_tokens
+        completion_tokens = after.completion_tokens - before.completion_tokens
+        if not prompt_tokens:
+            # Provider didn't report usage - fall back to a ~4 chars/token estimate
+            prompt_tokens = len(str(messages)) // 4
+            completion_tokens = len(str(response)) // 4
+
+        _record_call(self.agent_name, tier, llm, latency, prompt_tokens, completion_tokens, escalated)
+        return response
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None,
+             from_task=None, from_agent=None, response_model=None):
+        kwargs = {
+            "tools": tools, "callbacks": callbacks, "available_functions": available_functions,
+            "from_task": from_task, "from_agent": from_agent, "response_model": response_model
+        }
+        tier = self._choose_tier(messages)
+        response = self._call_tier(tier, messages, escalated=False, **kwargs)
+        if self.mode == "cascade" and tier == "fast" and _needs_escalation(response):
+            response = self._call_tier("strong", messages, escalated=True, **kwargs)
+        return response
+
+    def get_token_usage_summary(self):
+        usage = self.tiers["fast"].get_token_usage_summary()
+        usage.add_usage_metrics(self.tiers["strong"].get_token_usage_summary())
+        return usage
+
+    def supports_function_calling(self) -> bool:
+        return all(llm.supports_function_calling() for llm in self.tiers.values())
+
+    def supports_stop_words(self) -> bool:
+        return all(llm.supports_stop_words() for llm in self.tiers.values())
+
+    def get_context_window_size(self) -> int:
+        return min(llm.get_context_window_size() for llm in self.tiers.values())
+
+
+def agent_llm(agent_name: str) -> TieredLLM:
+    """Build the LLM for an agent according to AGENT_TIERS"""
+    mode = AGENT_TIERS.get(agent_name, "strong") if CASCADE_ENABLED else "strong"
+    return TieredLLM(agent_name, mode)
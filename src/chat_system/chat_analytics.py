@@ -0,0 +1,255 @@
+"""
+Deployment-wide chat analytics, maintained as chat turns are logged.
+
+    python -m src.chat_system.chat_analytics            # overview of the whole deployment
+    python -m src.chat_system.chat_analytics --rebuild  # recompute from chat_history.json
+
+log_chat_entry() records every turn here as well: one small upsert each into
+per-day, per-hour, per-case and response-latency aggregates in SQLite. Dashboard
+queries (messages per day, active sessions, latency percentiles, busiest
+hours, a case's summary) read those aggregates and never touch the chat log, so
+they take milliseconds however long the history is. Latencies are kept as a
+histogram of quarter-octave buckets, which bounds percentile error to ~10%.
+A new analytics database is backfilled from the existing chat log once.
+"""
+from datetime import datetime, timedelta
+from pathlib import Path
+import threading
+import argparse
+import sqlite3
+import math
+import json
+import time
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHAT_ANALYTICS_PATH = Path(os.getenv("CHAT_ANALYTICS_PATH", "chat_analytics.db"))
+# A case with a turn in this window counts as an active session
+ACTIVE_SESSION_WINDOW_S = float(os.getenv("ACTIVE_SESSION_WINDOW_S", "1800"))
+
+# Latency bucket b covers [LATENCY_FLOOR_S * 2^(b/4), LATENCY_FLOOR_S * 2^((b+1)/4))
+LATENCY_FLOOR_S = 0.05
+LATENCY_BUCKETS_PER_OCTAVE = 4
+LATENCY_MAX_BUCKET = 63
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily (
+    day TEXT PRIMARY KEY, messages INTEGER NOT NULL, active_cases INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily_cases (
+    day TEXT NOT NULL, case_id TEXT NOT NULL, PRIMARY KEY (day, case_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS hourly (
+    hour INTEGER PRIMARY KEY, messages INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cases (
+    case_id TEXT PRIMARY KEY, first_ts REAL NOT NULL, last_ts REAL NOT NULL, messages INTEGER NOT NULL,
+    user_messages INTEGER NOT NULL, agent_messages INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cases_last_ts ON cases (last_ts);
+CREATE TABLE IF NOT EXISTS latency (
+    bucket INTEGER PRIMARY KEY, count INTEGER NOT NULL, total_s REAL NOT NULL
+);
+"""
+
+
+def _latency_bucket(latency_s: float) -> int:
+    if latency_s <= LATENCY_FLOOR_S:
+        return 0
+    bucket = int(math.log2(latency_s / LATENCY_FLOOR_S) * LATENCY_BUCKETS_PER_OCTAVE)
+    return min(bucket, LATENCY_MAX_BUCKET)
+
+
+def _bucket_midpoint(bucket: int) -> float:
+    # Geometric middle of the bucket's range
+    return LATENCY_FLOOR_S * 2 ** ((bucket + 0.5) / LATENCY_BUCKETS_PER_OCTAVE)
+
+
+def _parse_timestamp(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ChatAnalytics:
+    def __init__(self, path: Path = CHAT_ANALYTICS_PATH):
+        self.path = Path(path)
+        self._local = threading.local()
+        is_new = not self.path.exists()
+        self._conn().executescript(SCHEMA)
+        self.backfilled = 0
+        if is_new:
+            from src.chat_system.transcript_export import CHAT_LOG_PATH
+            if CHAT_LOG_PATH.exists():
+                self.backfilled = self.rebuild(CHAT_LOG_PATH)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ---------------------- RECORDING ----------------------
+
+    def _record(self, conn: sqlite3.Connection, case_id: str, at: datetime, user_message: bool,
+                agent_message: bool, latency_s: float = None):
+        day, ts = at.date().isoformat(), at.timestamp()
+        first_today = conn.execute(
+            "INSERT OR IGNORE INTO daily_cases (day, case_id) VALUES (?, ?)", (day, case_id)
+        ).rowcount
+        conn.execute(
+            "INSERT INTO daily (day, messages, active_cases) VALUES (?, 1, ?) "
+            "ON CONFLICT (day) DO UPDATE SET messages = messages + 1, active_cases = active_cases + excluded.active_cases",
+            (day, first_today)
+        )
+        conn.execute(
+            "INSERT INTO hourly (hour, messages) VALUES (?, 1) "
+            "ON CONFLICT (hour) DO UPDATE SET messages = messages + 1",
+            (at.hour,)
+        )
+        conn.execute(
+            "INSERT INTO cases (case_id, first_ts, last_ts, messages, user_messages, agent_messages) "
+            "VALUES (?, ?, ?, 1, ?, ?) ON CONFLICT (case_id) DO UPDATE SET "
+            "first_ts = MIN(first_ts, excluded.first_ts), last_ts = MAX(last_ts, excluded.last_ts), "
+            "messages = messages + 1, user_messages = user_messages + excluded.user_messages, "
+            "agent_messages = agent_messages + excluded.agent_messages",
+            (case_id, ts, ts, int(user_message), int(agent_message))
+        )
+        if latency_s is not None:
+            conn.execute(
+                "INSERT INTO latency (bucket, count, total_s) VALUES (?, 1, ?) "
+                "ON CONFLICT (bucket) DO UPDATE SET count = count + 1, total_s = total_s + excluded.total_s",
+                (_latency_bucket(latency_s), latency_s)
+            )
+
+    def record(self, case_id: str, at: datetime, user_message: bool = True, agent_message: bool = True,
+               latency_s: float = None):
+        """Add one logged chat turn to the aggregates"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._record(conn, case_id, at, user_message, agent_message, latency_s)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def rebuild(self, log_path: Path) -> int:
+        """Recompute every aggregate from a chat log in one pass; returns the number of turns counted"""
+        conn = self._conn()
+        turns = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ("daily", "daily_cases", "hourly", "cases", "latency"):
+                conn.execute(f"DELETE FROM {table}")
+            with open(log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    at = _parse_timestamp(entry.get('timestamp'))
+                    if not entry.get('case_id') or at is None:
+                        continue
+                    self._record(conn, entry['case_id'], at, bool(entry.get('patient_input')),
+                                 bool(entry.get('agent_response')), entry.get('response_latency_s'))
+                    turns += 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return turns
+
+    # ---------------------- QUERIES ----------------------
+
+    def messages_per_day(self, since: datetime = None, until: datetime = None) -> list:
+        """[{day, messages, active_cases}] in date order"""
+        low = since.date().isoformat() if since else ""
+        high = until.date().isoformat() if until else "9999"
+        rows = self._conn().execute(
+            "SELECT day, messages, active_cases FROM daily WHERE day >= ? AND day <= ? ORDER BY day", (low, high)
+        ).fetchall()
+        return [{"day": day, "messages": messages, "active_cases": cases} for day, messages, cases in rows]
+
+    def active_sessions(self, within_s: float = ACTIVE_SESSION_WINDOW_S, now: datetime = None) -> int:
+        """Cases with a turn in the last within_s seconds"""
+        cutoff = (now or datetime.now()).timestamp() - within_s
+        return self._conn().execute("SELECT COUNT(*) FROM cases WHERE last_ts >= ?", (cutoff,)).fetchone()[0]
+
+    def busiest_hours(self, top: int = 24) -> list:
+        """[(hour of day, messages)], busiest first"""
+        return self._conn().execute(
+            "SELECT hour, messages FROM hourly ORDER BY messages DESC, hour LIMIT ?", (top,)
+        ).fetchall()
+
+    def latency_stats(self) -> dict:
+        """Response latency count, mean and p50/p90/p99 in seconds"""
+        rows = self._conn().execute("SELECT bucket, count, total_s FROM latency ORDER BY bucket").fetchall()
+        count = sum(row[1] for row in rows)
+        if not count:
+            return {"count": 0}
+        stats = {"count": count, "mean_s": round(sum(row[2] for row in rows) / count, 3)}
+        for name, quantile in (("p50_s", 0.5), ("p90_s", 0.9), ("p99_s", 0.99)):
+            seen = 0
+            for bucket, bucket_count, _ in rows:
+                seen += bucket_count
+                if seen >= quantile * count:
+                    stats[name] = round(_bucket_midpoint(bucket), 3)
+                    break
+        return stats
+
+    def case_summary(self, case_id: str):
+        """(first_ts, last_ts, messages, user_messages, agent_messages) for a case, or None"""
+        return self._conn().execute(
+            "SELECT first_ts, last_ts, messages, user_messages, agent_messages FROM cases WHERE case_id = ?",
+            (case_id,)
+        ).fetchone()
+
+    def overview(self, days: int = 7) -> dict:
+        """Headline numbers for an operations dashboard"""
+        conn = self._conn()
+        cases, messages = conn.execute("SELECT COUNT(*), COALESCE(SUM(messages), 0) FROM cases").fetchone()
+        return {
+            "cases": cases,
+            "messages": messages,
+            "active_sessions": self.active_sessions(),
+            "messages_per_day": self.messages_per_day(since=datetime.now() - timedelta(days=days - 1)),
+            "busiest_hours": self.busiest_hours(3),
+            "latency": self.latency_stats()
+        }
+
+
+_analytics = None
+_analytics_lock = threading.Lock()
+
+
+def get_chat_analytics() -> ChatAnalytics:
+    global _analytics
+    with _analytics_lock:
+        if _analytics is None:
+            _analytics = ChatAnalytics(CHAT_ANALYTICS_PATH)
+        return _analytics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat analytics across all cases")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the aggregates from the chat log")
+    parser.add_argument("--days", type=int, default=7, help="Days of message counts to show")
+    args = parser.parse_args()
+
+    analytics = get_chat_analytics()
+    if args.rebuild:
+        from src.chat_system.transcript_export import CHAT_LOG_PATH
+        start = time.perf_counter()
+        turns = analytics.rebuild(CHAT_LOG_PATH)
+        print(f"✅ Rebuilt from {turns} turns in {time.perf_counter() - start:.1f}s")
+    print(json.dumps(analytics.overview(args.days), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,28 @@
 from crewai import Crew
 from src.agents.crew_agents import chat_agent
 from src.tasks.crew_tasks import triage_task
+from src.agents.model_tiers import classify_turn, prefer_tier
+from src.chat_system.session_store import get_session_store
+from src.chat_system.chat_analytics import get_chat_analytics
+from src.chat_system.transcript_export import CHAT_LOG_PATH, export_transcript
+from src.pipeline.lab_trends import known_analytes, trend_summary
+from src.emergency.red_flags import detect_red_flags
 from datetime import datetime
 from pathlib import Path
 import json
+import time
+import re
 
-patient_context = {}
+# Questions that should see the case's lab history alongside the conversation
+LAB_QUESTION_PATTERN = re.compile(
+    r"\b(labs?|blood (tests?|work)|test results?|results?|reports?|levels?|values?|counts?|"
+    r"trend\w*|went (up|down)|higher|lower|improv\w*|wors\w*)\b",
+    re.IGNORECASE
+)
 
-def set_patient_info(case_id: str, name: str, age: int):
-    """Store patient information for the session and load any existing conversation history"""
-    patient_context[case_id] = {
-        'name': name,
-        'age': age,
-        'started_at': datetime.now().isoformat(),
-        'conversation_history': []
-    }
-    
-    # Load existing conversation history for this case_id if it exists
+def _load_history(case_id: str) -> list:
+    """Rebuild a case's conversation history from the chat log"""
+    history = []
     chat_log_path = Path("chat_history.json")
     if chat_log_path.exists():
         try:
@@ -25,7 +31,7 @@ def set_patient_info(case_id: str, name: str, age: int):
                     try:
                         entry = json.loads(line.strip())
                         if entry.get('case_id') == case_id:
-                            patient_context[case_id]['conversation_history'].append({
+                            history.append({
                                 'user': entry.get('patient_input', ''),
                                 'assistant': entry.get('agent_response', ''),
                                 'timestamp': entry.get('timestamp', '')
@@ -34,20 +40,82 @@ def set_patient_info(case_id: str, name: str, age: int):
                         continue
         except Exception as e:
             print(f"Note: Could not load previous conversation history: {e}")
+    return history
+
+def _lab_history(case_id: str, user_message: str):
+    """The case's lab trend summary when the message is about lab results, else None"""
+    analytes = known_analytes(case_id)
+    if not analytes:
+        return None
+    message = user_message.lower()
+    if LAB_QUESTION_PATTERN.search(message) or any(
+            re.search(rf"\b{re.escape(name.lower())}\b", message) for name in analytes):
+        return trend_summary(case_id)
+    return None
+
+def _flag_urgent(case_id: str, red_flags: list):
+    """Move the case's diagnostic jobs to the front of the queue"""
+    try:
+        from src.pipeline.jobs import prioritize_case
+        prioritize_case(case_id, ", ".join(flag["label"] for flag in red_flags))
+    except Exception as e:
+        print(f"Note: Could not prioritize case {case_id}: {e}")
 
-def log_chat_entry(case_id: str, user_input: str, agent_response: str):
-    """Log chat interactions to file"""
+def set_patient_info(case_id: str, name: str, age: int):
+    """Store patient information for the session and load any existing conversation history"""
+    get_session_store().put(case_id, {
+        'name': name,
+        'age': age,
+        'started_at': datetime.now().isoformat(),
+        'conversation_history': _load_history(case_id)
+    })
+
+def get_patient_session(case_id: str) -> dict:
+    """Session for a case; evicted sessions (or ones opened by another worker) are rebuilt from the chat log"""
+    store = get_session_store()
+    session = store.get(case_id)
+    if session is None:
+        history = _load_history(case_id)
+        if not history:
+            return {}
+        session = {
+            'name': None,
+            'age': None,
+            'started_at': history[0]['timestamp'],
+            'conversation_history': history
+        }
+        store.put(case_id, session)
+    return session
+
+def log_chat_entry(case_id: str, user_input: str, agent_response: str, latency_s: float = None):
+    """Log chat interactions to file and add them to the deployment-wide analytics"""
     chat_log_path = Path("chat_history.json")
+    now = datetime.now()
     
     entry = {
         "case_id": case_id,
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": now.isoformat(),
         "patient_input": user_input,
         "agent_response": agent_response
     }
+    if latency_s is not None:
+        entry["response_latency_s"] = round(latency_s, 3)
+    
+    # Opened before the write: a new analytics database is backfilled from the log as it is now
+    try:
+        analytics = get_chat_analytics()
+    except Exception as e:
+        analytics = None
+        print(f"Note: Chat analytics unavailable: {e}")
     
     with open(chat_log_path, 'a', encoding='utf-8') as f:
         f.write(json.dumps(entry) + '\n')
+    
+    if analytics is not None:
+        try:
+            analytics.record(case_id, now, bool(user_input), bool(agent_response), latency_s)
+        except Exception as e:
+            print(f"Note: Could not update chat analytics: {e}")
 
 def handle_ai_chat(user_message: str, case_id: str) -> str:
     """
@@ -61,14 +129,19 @@ def handle_ai_chat(user_message: str, case_id: str) -> str:
         str: Dr. Chen's response
     """
     try:
+        # Emergency phrases are caught before any LLM call; the UI shows guidance from the same check
+        red_flags = detect_red_flags(user_message)
+        if red_flags:
+            _flag_urgent(case_id, red_flags)
+        
         # Get patient context
-        patient_info = patient_context.get(case_id, {})
+        patient_info = get_patient_session(case_id)
         
         # Build comprehensive context with patient info and FULL conversation history
         context_parts = []
         
         # Add patient info
-        if patient_info:
+        if patient_info.get('name'):
             context_parts.append(f"Patient: {patient_info.get('name', 'Unknown')}, Age: {patient_info.get('age', 'Unknown')}")
         
         # Add COMPLETE conversation history (not just last 3)
@@ -82,6 +155,20 @@ def handle_ai_chat(user_message: str, case_id: str) -> str:
                 context_parts.append("---")
             context_parts.append("=== END CONVERSATION HISTORY ===\n")
         
+        # Earlier lab values, so follow-up questions can be answered against them
+        lab_history = _lab_history(case_id, user_message)
+        if lab_history:
+            context_parts.append("=== LAB HISTORY ===")
+            context_parts.append(lab_history)
+            context_parts.append("=== END LAB HISTORY ===\n")
+        
+        if red_flags:
+            context_parts.append("=== RED FLAGS ===")
+            context_parts.append("The patient's message mentions: " + ", ".join(
+                f"{flag['phrase']} ({flag['label']})" for flag in red_flags))
+            context_parts.append("They have already been told to call emergency services. Treat this as an emergency.")
+            context_parts.append("=== END RED FLAGS ===\n")
+        
         # Combine full context with current message
         if context_parts:
             full_input = "\n".join(context_parts) + f"\n\nCURRENT MESSAGE FROM PATIENT: {user_message}"
@@ -100,7 +187,11 @@ def handle_ai_chat(user_message: str, case_id: str) -> str:
             "patient_input": full_input
         }
         
-        result = crew.kickoff(inputs=inputs)
+        # Greetings and acknowledgements go to the fast tier; everything else to the strong one
+        started = time.perf_counter()
+        with prefer_tier("strong" if red_flags else classify_turn(user_message)):
+            result = crew.kickoff(inputs=inputs)
+        latency_s = time.perf_counter() - started
         
         # Extract response text from result
         if hasattr(result, 'raw'):
@@ -118,16 +209,16 @@ def handle_ai_chat(user_message: str, case_id: str) -> str:
         lines = [line for line in response_text.split('\n') if not line.strip().startswith('"')]
         response_text = '\n'.join(lines).strip()
         
-        # Store this exchange in conversation history
-        if case_id in patient_context:
-            patient_context[case_id]['conversation_history'].append({
-                'user': user_message,
-                'assistant': response_text,
-                'timestamp': datetime.now().isoformat()
-            })
+        # Store this exchange in conversation history (atomic per case, so concurrent reruns don't race)
+        exchange = {
+            'user': user_message,
+            'assistant': response_text,
+            'timestamp': datetime.now().isoformat()
+        }
+        get_session_store().update(case_id, lambda session: session['conversation_history'].append(exchange))
         
         # Log the interaction
-        log_chat_entry(case_id, user_message, response_text)
+        log_chat_entry(case_id, user_message, response_text, latency_s)
         
         return response_text
         
@@ -140,73 +231,24 @@ def handle_ai_chat(user_message: str, case_id: str) -> str:
         error_msg += "Please try again or contact support if the issue persists."
         return error_msg
 
-def export_chat_to_text(case_id: str) -> str:
-    """Export chat history to a text file"""
+def export_chat_to_text(case_id: str, fmt: str = "text") -> str:
+    """Export chat history to a file in reports/ (text, jsonl, markdown or pdf)"""
     try:
-        reports_dir = Path("reports")
-        reports_dir.mkdir(exist_ok=True)
-        
-        chat_log_path = Path("chat_history.json")
-        
-        if not chat_log_path.exists():
+        if not CHAT_LOG_PATH.exists():
             return "No chat history found to export."
         
-        patient_info = patient_context.get(case_id, {})
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        export_path = reports_dir / f"chat_export_{case_id}_{timestamp}.txt"
-        
-        with open(export_path, 'w', encoding='utf-8') as f:
-            f.write("=" * 80 + "\n")
-            f.write("AI MEDICAL ASSISTANT - CHAT TRANSCRIPT\n")
-            f.write("=" * 80 + "\n\n")
-            
-            f.write(f"Case ID: {case_id}\n")
-            if patient_info:
-                f.write(f"Patient Name: {patient_info.get('name', 'Unknown')}\n")
-                f.write(f"Age: {patient_info.get('age', 'Unknown')}\n")
-                f.write(f"Session Started: {patient_info.get('started_at', 'Unknown')}\n")
-            f.write(f"Export Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write("\n" + "=" * 80 + "\n\n")
-            
-            with open(chat_log_path, 'r', encoding='utf-8') as log_file:
-                for line in log_file:
-                    try:
-                        entry = json.loads(line.strip())
-                        
-                        if entry.get('case_id') != case_id:
-                            continue
-                        
-                        timestamp_str = entry.get('timestamp', 'Unknown time')
-                        user_input = entry.get('patient_input', '')
-                        agent_response = entry.get('agent_response', '')
-                        
-                        f.write(f"[{timestamp_str}]\n")
-                        f.write(f"PATIENT: {user_input}\n\n")
-                        f.write(f"DR. CHEN: {agent_response}\n")
-                        f.write("\n" + "-" * 80 + "\n\n")
-                    
-                    except json.JSONDecodeError:
-                        continue
-            
-            f.write("\n" + "=" * 80 + "\n")
-            f.write("END OF TRANSCRIPT\n")
-            f.write("=" * 80 + "\n")
-            f.write("\nDISCLAIMER: This transcript is for informational purposes only.\n")
-            f.write("It does not replace professional medical advice, diagnosis, or treatment.\n")
-            f.write("Always consult with a qualified healthcare provider for medical concerns.\n")
-        
+        export_path = export_transcript(case_id, fmt)
         return f"✅ Chat transcript exported successfully to: {export_path}"
     
     except Exception as e:
         return f"Error exporting chat: {str(e)}"
 
 def get_chat_summary(case_id: str) -> dict:
-    """Get summary statistics for a chat session"""
+    """Get summary statistics for a chat session (from the analytics aggregates, without reading the log)"""
     try:
-        chat_log_path = Path("chat_history.json")
+        row = get_chat_analytics().case_summary(case_id)
         
-        if not chat_log_path.exists():
+        if row is None:
             return {
                 'total_messages': 0,
                 'user_messages': 0,
@@ -214,45 +256,10 @@ def get_chat_summary(case_id: str) -> dict:
                 'session_duration': 'Unknown'
             }
         
-        total_messages = 0
-        user_messages = 0
-        agent_messages = 0
-        first_timestamp = None
-        last_timestamp = None
-        
-        with open(chat_log_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    entry = json.loads(line.strip())
-                    
-                    if entry.get('case_id') != case_id:
-                        continue
-                    
-                    total_messages += 1
-                    
-                    if entry.get('patient_input'):
-                        user_messages += 1
-                    if entry.get('agent_response'):
-                        agent_messages += 1
-                    
-                    timestamp = entry.get('timestamp')
-                    if timestamp:
-                        if first_timestamp is None:
-                            first_timestamp = timestamp
-                        last_timestamp = timestamp
-                
-                except json.JSONDecodeError:
-                    continue
-        
-        duration = 'Unknown'
-        if first_timestamp and last_timestamp:
-            try:
-                start = datetime.fromisoformat(first_timestamp)
-                end = datetime.fromisoformat(last_timestamp)
-                diff = end - start
-                duration = f"{diff.seconds // 60} minutes"
-            except:
-                pass
+        first_ts, last_ts, total_messages, user_messages, agent_messages = row
+        first_timestamp = datetime.fromtimestamp(first_ts).isoformat()
+        last_timestamp = datetime.fromtimestamp(last_ts).isoformat()
+        duration = f"{int((last_ts - first_ts) // 60)} minutes"
         
         return {
             'total_messages': total_messages,
@@ -267,4 +274,4 @@ def get_chat_summary(case_id: str) -> dict:
         return {
             'error': str(e),
             'total_messages': 0
-        }
\ No newline at end of file
+        }
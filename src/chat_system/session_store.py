@@ -0,0 +1,345 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+import threading
+import weakref
+import sqlite3
+import json
+import time
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ---------------------- CONFIGURATION ----------------------
+
+# memory | sqlite | redis - sqlite and redis let several app workers share sessions
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "500"))
+SESSION_IDLE_TTL_S = float(os.getenv("SESSION_IDLE_TTL_S", "3600"))
+SESSION_MAX_MEMORY_MB = float(os.getenv("SESSION_MAX_MEMORY_MB", "64"))
+SESSION_DB_PATH = Path(os.getenv("SESSION_DB_PATH", "sessions.db"))
+# Any Redis-protocol server works (Redis, Valkey, KeyDB, a local redis-server)
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+
+
+def _encode(session: dict) -> str:
+    return json.dumps(session, ensure_ascii=False)
+
+
+# ---------------------- BACKENDS ----------------------
+
+class MemoryBackend:
+    """Process-local LRU; recency order is the OrderedDict order"""
+
+    def __init__(self):
+        self._sessions = OrderedDict()  # case_id -> (session, size, last_access)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def load(self, case_id: str):
+        with self._lock:
+            entry = self._sessions.get(case_id)
+            if entry is None:
+                return None
+            self._sessions.move_to_end(case_id)
+            self._sessions[case_id] = (entry[0], entry[1], time.monotonic())
+            return entry[0]
+
+    def save(self, case_id: str, session: dict):
+        size = len(_encode(session))
+        with self._lock:
+            old = self._sessions.pop(case_id, None)
+            if old:
+                self._bytes -= old[1]
+            self._sessions[case_id] = (session, size, time.monotonic())
+            self._bytes += size
+
+    def delete(self, case_id: str):
+        with self._lock:
+            old = self._sessions.pop(case_id, None)
+            if old:
+                self._bytes -= old[1]
+
+    def evict(self, max_sessions: int, max_bytes: int, idle_ttl: float) -> dict:
+        evicted = {"ttl": 0, "lru": 0, "memory": 0}
+        with self._lock:
+            now = time.monotonic()
+            # The most recent session is never evicted, however large
+            while len(self._sessions) > 1:
+                case_id, (_, size, last_access) = next(iter(self._sessions.items()))
+                if now - last_access > idle_ttl:
+                    reason = "ttl"
+                elif len(self._sessions) > max_sessions:
+                    reason = "lru"
+                elif self._bytes > max_bytes:
+                    reason = "memory"
+                else:
+                    break
+                del self._sessions[case_id]
+                self._bytes -= size
+                evicted[reason] += 1
+        return evicted
+
+    def usage(self) -> tuple:
+        with self._lock:
+            return len(self._sessions), self._bytes
+
+
+class SQLiteBackend:
+    """Sessions in a SQLite file shared by every worker on the host"""
+
+    def __init__(self, path: Path = SESSION_DB_PATH):
+        self.path = Path(path)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "case_id TEXT PRIMARY KEY, data TEXT NOT NULL, size INTEGER, last_access REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions(last_access)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; multi-statement work goes through transaction()
+            conn = self._local.conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.depth = 0
+        return conn
+
+    def load(self, case_id: str):
+        conn = self._conn()
+        row = conn.execute("SELECT data FROM sessions WHERE case_id = ?", (case_id,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE sessions SET last_access = ? WHERE case_id = ?", (time.time(), case_id))
+        return json.loads(row[0])
+
+    def save(self, case_id: str, session: dict):
+        data = _encode(session)
+        self._conn().execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)",
+                             (case_id, data, len(data), time.time()))
+
+    def delete(self, case_id: str):
+        self._conn().execute("DELETE FROM sessions WHERE case_id = ?", (case_id,))
+
+    @contextmanager
+    def transaction(self, case_id: str = None):
+        # BEGIN IMMEDIATE takes the write lock up front, so read-modify-write is atomic across workers
+        conn = self._conn()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._local.depth = 0
+
+    def evict(self, max_sessions: int, max_bytes: int, idle_ttl: float) -> dict:
+        evicted = {"ttl": 0, "lru": 0, "memory": 0}
+        conn = self._conn()
+        count, size, oldest = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(last_access) FROM sessions"
+        ).fetchone()
+        if count <= max_sessions and size <= max_bytes and (oldest is None or oldest >= time.time() - idle_ttl):
+            return evicted
+
+        with self.transaction():
+            evicted["ttl"] = conn.execute("DELETE FROM sessions WHERE last_access < ?",
+                                          (time.time() - idle_ttl,)).rowcount
+            evicted["lru"] = conn.execute(
+                "DELETE FROM sessions WHERE case_id IN ("
+                "SELECT case_id FROM sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (max_sessions,)
+            ).rowcount
+            # Drop least recently used sessions until the running total fits the cap,
+            # always keeping the most recent one
+            evicted["memory"] = conn.execute(
+                "DELETE FROM sessions WHERE case_id IN (SELECT case_id FROM ("
+                "SELECT case_id, SUM(size) OVER (ORDER BY last_access DESC) AS running, "
+                "ROW_NUMBER() OVER (ORDER BY last_access DESC) AS recency FROM sessions"
+                ") WHERE running > ? AND recency > 1)",
+                (max_bytes,)
+            ).rowcount
+        return evicted
+
+    def usage(self) -> tuple:
+        count, size = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions").fetchone()
+        return count, size
+
+
+class RedisBackend:
+    """
+    Sessions as Redis strings with a sliding idle TTL; a sorted set of last
+    access times drives LRU eviction. Memory capping beyond the session count
+    is left to the server's maxmemory policy.
+    """
+
+    KEY_PREFIX = "agentic-doctor:session:"
+    RECENCY_KEY = "agentic-doctor:sessions:recency"
+
+    def __init__(self, url: str = SESSION_REDIS_URL, idle_ttl: float = SESSION_IDLE_TTL_S):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.idle_ttl = int(idle_ttl)
+
+    def load(self, case_id: str):
+        key = self.KEY_PREFIX + case_id
+        pipe = self.client.pipeline()
+        pipe.get(key)
+        pipe.expire(key, self.idle_ttl)
+        pipe.zadd(self.RECENCY_KEY, {case_id: time.time()}, xx=True)
+        data = pipe.execute()[0]
+        return json.loads(data) if data is not None else None
+
+    def save(self, case_id: str, session: dict):
+        pipe = self.client.pipeline()
+        pipe.set(self.KEY_PREFIX + case_id, _encode(session), ex=self.idle_ttl)
+        pipe.zadd(self.RECENCY_KEY, {case_id: time.time()})
+        pipe.execute()
+
+    def delete(self, case_id: str):
+        pipe = self.client.pipeline()
+        pipe.delete(self.KEY_PREFIX + case_id)
+        pipe.zrem(self.RECENCY_KEY, case_id)
+        pipe.execute()
+
+    @contextmanager
+    def transaction(self, case_id: str):
+        # Redis lock so workers on other hosts serialise updates to the same case
+        with self.client.lock(f"{self.KEY_PREFIX}{case_id}:lock", timeout=30, blocking_timeout=30):
+            yield
+
+    def evict(self, max_sessions: int, max_bytes: int, idle_ttl: float) -> dict:
+        evicted = {"ttl": 0, "lru": 0, "memory": 0}
+        # Keys expire on their own; just forget them in the recency set
+        evicted["ttl"] = self.client.zremrangebyscore(self.RECENCY_KEY, 0, time.time() - idle_ttl)
+        overflow = self.client.zcard(self.RECENCY_KEY) - max_sessions
+        if overflow > 0:
+            oldest = [c.decode() for c in self.client.zrange(self.RECENCY_KEY, 0, overflow - 1)]
+            for case_id in oldest:
+                self.delete(case_id)
+            evicted["lru"] = len(oldest)
+        return evicted
+
+    def usage(self) -> tuple:
+        return self.client.zcard(self.RECENCY_KEY), 0
+
+
+_BACKENDS = {
+    "memory": MemoryBackend,
+    "sqlite": SQLiteBackend,
+    "redis": RedisBackend
+}
+
+
+# ---------------------- STORE ----------------------
+
+class SessionStore:
+    """
+    Bounded, thread-safe store for per-case chat sessions.
+
+    Sessions are evicted after SESSION_IDLE_TTL_S without access, and least
+    recently used first once there are more than SESSION_MAX_SESSIONS or they
+    take more than SESSION_MAX_MEMORY_MB. Evicted cases are rebuilt from
+    chat_history.json on next use. update() is atomic per case.
+    """
+
+    def __init__(self, backend=None, max_sessions: int = SESSION_MAX_SESSIONS,
+                 idle_ttl: float = SESSION_IDLE_TTL_S, max_memory_mb: float = SESSION_MAX_MEMORY_MB):
+        self.backend = backend or _BACKENDS[SESSION_BACKEND]()
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_bytes = int(max_memory_mb * 1024 * 1024)
+        # Entries disappear once no thread holds or waits on the case's lock
+        self._case_locks = weakref.WeakValueDictionary()
+        self._locks_guard = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evicted_ttl": 0, "evicted_lru": 0, "evicted_memory": 0}
+
+    @contextmanager
+    def lock(self, case_id: str):
+        """Serialise work on one case (in-process lock plus the backend's cross-worker lock)"""
+        with self._locks_guard:
+            case_lock = self._case_locks.get(case_id)
+            if case_lock is None:
+                case_lock = self._case_locks[case_id] = threading.RLock()
+        with case_lock:
+            transaction = getattr(self.backend, "transaction", None)
+            if transaction is None:
+                yield
+            else:
+                with transaction(case_id):
+                    yield
+
+    def get(self, case_id: str):
+        """The stored session (treat as read-only - change it through update()) or None"""
+        session = self.backend.load(case_id)
+        with self._stats_lock:
+            self._stats["hits" if session is not None else "misses"] += 1
+        return session
+
+    def put(self, case_id: str, session: dict):
+        with self.lock(case_id):
+            self.backend.save(case_id, session)
+        self._evict()
+
+    def update(self, case_id: str, fn):
+        """Apply fn(session) to the stored session atomically; returns the updated session or None"""
+        with self.lock(case_id):
+            session = self.backend.load(case_id)
+            if session is None:
+                return None
+            fn(session)
+            self.backend.save(case_id, session)
+        self._evict()
+        return session
+
+    def delete(self, case_id: str):
+        with self.lock(case_id):
+            self.backend.delete(case_id)
+
+    def _evict(self):
+        evicted = self.backend.evict(self.max_sessions, self.max_bytes, self.idle_ttl)
+        with self._stats_lock:
+            for reason, count in evicted.items():
+                self._stats[f"evicted_{reason}"] += count
+
+    def get_stats(self) -> dict:
+        """Hit rate, resident sessions/bytes and eviction counts"""
+        sessions, size = self.backend.usage()
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats.update({
+            "backend": type(self.backend).__name__,
+            "hit_rate": stats["hits"] / lookups if lookups else 0.0,
+            "resident_sessions": sessions,
+            "resident_mb": round(size / 1024 / 1024, 3)
+        })
+        return stats
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Process-wide session store for the configured backend"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SessionStore()
+        return _store
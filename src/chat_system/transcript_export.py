@@ -0,0 +1,222 @@
+"""
+Chat transcript export in text, JSONL, Markdown and PDF.
+
+A case's log entries are streamed from chat_history.json through a generator
+into a format's renderer, which yields the transcript as byte chunks; those go
+to a file or are collected into bytes for st.download_button without touching
+disk. export_all_transcripts() reads the log once, groups the entries by case
+and writes every case's transcript from a thread pool, so exporting all cases
+costs one linear scan rather than one scan per case.
+
+    python -m src.chat_system.transcript_export exports/ --format markdown
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import argparse
+import json
+import time
+import re
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHAT_LOG_PATH = Path("chat_history.json")
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "8"))
+
+RULE = "=" * 80
+DISCLAIMER = (
+    "DISCLAIMER: This transcript is for informational purposes only.\n"
+    "It does not replace professional medical advice, diagnosis, or treatment.\n"
+    "Always consult with a qualified healthcare provider for medical concerns."
+)
+
+
+# ---------------------- LOG ----------------------
+
+def iter_log_entries(log_path: Path = CHAT_LOG_PATH):
+    """Every well-formed entry of the chat log, in order"""
+    log_path = Path(log_path)
+    if not log_path.exists():
+        return
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def iter_case_entries(case_id: str, log_path: Path = CHAT_LOG_PATH):
+    """A case's entries, read lazily from the chat log"""
+    return (entry for entry in iter_log_entries(log_path) if entry.get('case_id') == case_id)
+
+
+# ---------------------- RENDERERS ----------------------
+# Each takes (case_id, entries, patient_info) and yields the transcript as byte chunks
+
+def _header_lines(case_id: str, patient_info: dict) -> list:
+    lines = [f"Case ID: {case_id}"]
+    if patient_info.get('name'):
+        lines += [
+            f"Patient Name: {patient_info.get('name', 'Unknown')}",
+            f"Age: {patient_info.get('age', 'Unknown')}",
+            f"Session Started: {patient_info.get('started_at', 'Unknown')}"
+        ]
+    lines.append(f"Export Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    return lines
+
+
+def render_text(case_id: str, entries, patient_info: dict):
+    yield (f"{RULE}\nAI MEDICAL ASSISTANT - CHAT TRANSCRIPT\n{RULE}\n\n"
+           + "\n".join(_header_lines(case_id, patient_info)) + f"\n\n{RULE}\n\n").encode('utf-8')
+    for entry in entries:
+        yield (f"[{entry.get('timestamp', 'Unknown time')}]\n"
+               f"PATIENT: {entry.get('patient_input', '')}\n\n"
+               f"DR. CHEN: {entry.get('agent_response', '')}\n"
+               f"\n{'-' * 80}\n\n").encode('utf-8')
+    yield f"\n{RULE}\nEND OF TRANSCRIPT\n{RULE}\n\n{DISCLAIMER}\n".encode('utf-8')
+
+
+def render_jsonl(case_id: str, entries, patient_info: dict):
+    # The log's own records, one per line, so the export can be re-ingested as is
+    for entry in entries:
+        yield (json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8')
+
+
+def render_markdown(case_id: str, entries, patient_info: dict):
+    yield ("# AI Medical Assistant - Chat Transcript\n\n"
+           + "".join(f"- **{line.replace(': ', ':** ', 1)}\n" for line in _header_lines(case_id, patient_info))
+           + "\n---\n\n").encode('utf-8')
+    for entry in entries:
+        yield (f"### {entry.get('timestamp', 'Unknown time')}\n\n"
+               f"**Patient:** {entry.get('patient_input', '')}\n\n"
+               f"**Dr. Chen:** {entry.get('agent_response', '')}\n\n---\n\n").encode('utf-8')
+    yield f"_{' '.join(DISCLAIMER.splitlines())}_\n".encode('utf-8')
+
+
+def _latin1(text: str) -> str:
+    # The built-in PDF fonts only cover Latin-1; anything else (emoji, arrows) becomes '?'
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+
+def render_pdf(case_id: str, entries, patient_info: dict):
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", style="B", size=16)
+    pdf.cell(0, 10, "AI Medical Assistant - Chat Transcript", ln=True, align="C")
+    pdf.set_font("Arial", size=10)
+    for line in _header_lines(case_id, patient_info):
+        pdf.cell(0, 6, _latin1(line), ln=True)
+    pdf.ln(4)
+
+    for entry in entries:
+        pdf.set_font("Arial", style="B", size=9)
+        pdf.cell(0, 6, _latin1(f"[{entry.get('timestamp', 'Unknown time')}]"), ln=True)
+        pdf.set_font("Arial", size=10)
+        pdf.multi_cell(0, 6, _latin1(f"PATIENT: {entry.get('patient_input', '')}"))
+        pdf.multi_cell(0, 6, _latin1(f"DR. CHEN: {entry.get('agent_response', '')}"))
+        pdf.ln(3)
+
+    pdf.set_font("Arial", style="I", size=8)
+    pdf.multi_cell(0, 5, DISCLAIMER)
+    output = pdf.output(dest="S")
+    yield output.encode('latin-1') if isinstance(output, str) else bytes(output)
+
+
+# format -> (renderer, file extension, MIME type)
+FORMATS = {
+    "text": (render_text, ".txt", "text/plain"),
+    "jsonl": (render_jsonl, ".jsonl", "application/jsonl"),
+    "markdown": (render_markdown, ".md", "text/markdown"),
+    "pdf": (render_pdf, ".pdf", "application/pdf")
+}
+
+
+def _renderer(fmt: str):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}' (expected one of: {', '.join(FORMATS)})")
+    return FORMATS[fmt][0]
+
+
+def _patient_info(case_id: str) -> dict:
+    from src.chat_system.session_store import get_session_store
+    return get_session_store().get(case_id) or {}
+
+
+# ---------------------- EXPORT ----------------------
+
+def transcript_bytes(case_id: str, fmt: str = "text", log_path: Path = CHAT_LOG_PATH) -> bytes:
+    """A case's transcript in memory, e.g. for st.download_button(data=...)"""
+    renderer = _renderer(fmt)
+    return b"".join(renderer(case_id, iter_case_entries(case_id, log_path), _patient_info(case_id)))
+
+
+def _write(path: Path, chunks):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp, path)
+
+
+def export_transcript(case_id: str, fmt: str = "text", out_dir: Path = Path("reports"),
+                      log_path: Path = CHAT_LOG_PATH) -> Path:
+    """Stream a case's transcript to reports/chat_export_<case>_<time><ext>; returns the path"""
+    renderer = _renderer(fmt)
+    extension = FORMATS[fmt][1]
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    path = out_dir / f"chat_export_{case_id}_{timestamp}{extension}"
+    _write(path, renderer(case_id, iter_case_entries(case_id, log_path), _patient_info(case_id)))
+    return path
+
+
+def _safe_name(case_id: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', case_id)
+
+
+def export_all_transcripts(out_dir: Path, fmt: str = "text", log_path: Path = CHAT_LOG_PATH,
+                           workers: int = EXPORT_WORKERS) -> dict:
+    """
+    Export every case in the log to out_dir/<case_id><ext> in one pass over the log.
+    Returns {case_id: path}. Entries are grouped in memory, so peak memory is about the log's size.
+    """
+    renderer = _renderer(fmt)
+    extension = FORMATS[fmt][1]
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    by_case = {}
+    for entry in iter_log_entries(log_path):
+        case_id = entry.get('case_id')
+        if case_id:
+            by_case.setdefault(case_id, []).append(entry)
+
+    def export(case_id: str):
+        path = out_dir / f"{_safe_name(case_id)}{extension}"
+        _write(path, renderer(case_id, by_case[case_id], _patient_info(case_id)))
+        return case_id, path
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(export, by_case))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export every case's chat transcript")
+    parser.add_argument("out_dir", type=Path)
+    parser.add_argument("--format", choices=list(FORMATS), default="text")
+    parser.add_argument("--log", type=Path, default=CHAT_LOG_PATH, help="Chat log path")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    paths = export_all_transcripts(args.out_dir, args.format, args.log)
+    print(f"✅ {len(paths)} transcripts written to {args.out_dir} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
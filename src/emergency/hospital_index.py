@@ -0,0 +1,181 @@
+"""
+Nearest-hospital lookup over a bundled hospital dataset.
+
+Hospitals (name, city, coordinates, types, bed categories) are read from
+data/hospitals.csv, or any CSV with the same columns given as HOSPITALS_PATH.
+They are indexed once per process in one ball tree per hospital type on
+haversine distance, so "the k nearest trauma centres within 10 km" is a single
+tree query. Without scikit-learn the index falls back to a vectorized scan over
+unit vectors, which still takes under a millisecond for 100k hospitals. City
+names are geocoded offline from data/gazetteer.csv (names, common aliases,
+close misspellings); "lat, lon" is accepted as well.
+"""
+from pathlib import Path
+import threading
+import difflib
+import csv
+import re
+import os
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATA_DIR = Path(__file__).parent / "data"
+HOSPITALS_PATH = Path(os.getenv("HOSPITALS_PATH", DATA_DIR / "hospitals.csv"))
+GAZETTEER_PATH = Path(os.getenv("GAZETTEER_PATH", DATA_DIR / "gazetteer.csv"))
+
+EARTH_RADIUS_KM = 6371.0088
+HOSPITAL_TYPES = ("government", "private", "emergency", "trauma", "specialty")
+BED_TYPES = ("general", "icu", "emergency", "maternity")
+
+COORDINATES = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*[, ]\s*(-?\d+(?:\.\d+)?)\s*$")
+
+
+def _split(value: str) -> tuple:
+    return tuple(part.strip().lower() for part in (value or "").split(";") if part.strip())
+
+
+def load_hospitals(path: Path = HOSPITALS_PATH) -> list:
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return [{
+            "name": row["name"].strip(),
+            "city": row["city"].strip(),
+            "lat": float(row["lat"]),
+            "lon": float(row["lon"]),
+            "types": _split(row["types"]),
+            "beds": _split(row["beds"])
+        } for row in csv.DictReader(f)]
+
+
+class _Subset:
+    """The hospitals of one type: their row numbers and a search structure over their coordinates"""
+
+    def __init__(self, rows: np.ndarray, radians: np.ndarray):
+        self.rows = rows
+        try:
+            from sklearn.neighbors import BallTree
+            self.tree = BallTree(radians, metric="haversine") if len(rows) else None
+            self.xyz = None
+        except ImportError:
+            self.tree = None
+            lat, lon = radians[:, 0], radians[:, 1]
+            self.xyz = np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+    def query(self, point: np.ndarray, k: int, radius: float = None) -> tuple:
+        """(row numbers, angular distances) of up to k nearest, optionally within radius radians"""
+        k = min(k, len(self.rows))
+        if k <= 0:
+            return self.rows[:0], np.empty(0)
+        if self.tree is not None:
+            if radius is None:
+                distances, found = self.tree.query(point[None], k=k)
+                return self.rows[found[0]], distances[0]
+            found, distances = self.tree.query_radius(point[None], r=radius, return_distance=True,
+                                                      sort_results=True)
+            return self.rows[found[0][:k]], distances[0][:k]
+
+        lat, lon = point
+        target = np.array([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+        distances = np.arccos(np.clip(self.xyz @ target, -1.0, 1.0))
+        candidates = np.arange(len(distances)) if radius is None else np.flatnonzero(distances <= radius)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(distances[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+        return self.rows[candidates], distances[candidates]
+
+
+class HospitalIndex:
+    def __init__(self, hospitals: list):
+        self.hospitals = hospitals
+        radians = np.radians(np.array([[h["lat"], h["lon"]] for h in hospitals], dtype=np.float64).reshape(-1, 2))
+        everyone = np.arange(len(hospitals))
+        self._subsets = {None: _Subset(everyone, radians)}
+        for hospital_type in HOSPITAL_TYPES:
+            rows = np.array([i for i, h in enumerate(hospitals) if hospital_type in h["types"]], dtype=np.int64)
+            self._subsets[hospital_type] = _Subset(rows, radians[rows])
+        self._by_name = {h["name"].lower(): h for h in hospitals}
+
+    def nearest(self, lat: float, lon: float, k: int = 5, radius_km: float = None, hospital_type: str = None) -> list:
+        """Up to k hospitals nearest (lat, lon), nearest first, each with its distance_km"""
+        hospital_type = (hospital_type or "").lower()
+        subset = self._subsets.get(None if hospital_type in ("", "all") else hospital_type)
+        if subset is None:
+            raise ValueError(f"Unknown hospital type '{hospital_type}' (expected one of: {', '.join(HOSPITAL_TYPES)})")
+        radius = None if radius_km is None else radius_km / EARTH_RADIUS_KM
+        rows, distances = subset.query(np.radians([lat, lon]), k, radius)
+        return [{**self.hospitals[row], "distance_km": round(float(distance) * EARTH_RADIUS_KM, 2)}
+                for row, distance in zip(rows, distances)]
+
+    def get(self, name: str):
+        return self._by_name.get(name.strip().lower())
+
+
+# ---------------------- GAZETTEER ----------------------
+
+class Gazetteer:
+    def __init__(self, path: Path = GAZETTEER_PATH):
+        self.places = {}  # lowercased name or alias -> (canonical name, lat, lon)
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                place = (row["name"].strip(), float(row["lat"]), float(row["lon"]))
+                for key in (row["name"].strip().lower(),) + _split(row.get("aliases")):
+                    self.places[key] = place
+
+    def geocode(self, query: str):
+        """(name, lat, lon) for a city name, alias, near-miss spelling or 'lat, lon'; None if unknown"""
+        if not query or not query.strip():
+            return None
+        match = COORDINATES.match(query)
+        if match:
+            lat, lon = float(match[1]), float(match[2])
+            if -90 <= lat <= 90 and -180 <= lon <= 180:
+                return (f"{lat:.4f}, {lon:.4f}", lat, lon)
+        # "Saheed Nagar, Bhubaneswar": try the whole text, then each comma-separated part
+        for part in [query] + query.split(",")[::-1]:
+            key = re.sub(r"\s+", " ", part.strip().lower())
+            if key in self.places:
+                return self.places[key]
+            close = difflib.get_close_matches(key, self.places, n=1, cutoff=0.8)
+            if close:
+                return self.places[close[0]]
+        return None
+
+
+_index = None
+_gazetteer = None
+_init_lock = threading.Lock()
+
+
+def get_hospital_index() -> HospitalIndex:
+    global _index
+    with _init_lock:
+        if _index is None:
+            _index = HospitalIndex(load_hospitals(HOSPITALS_PATH))
+        return _index
+
+
+def get_gazetteer() -> Gazetteer:
+    global _gazetteer
+    with _init_lock:
+        if _gazetteer is None:
+            _gazetteer = Gazetteer(GAZETTEER_PATH)
+        return _gazetteer
+
+
+def find_hospitals(place: str, hospital_type: str = "All", radius_km: float = 10, k: int = 5) -> tuple:
+    """(geocoded place or None, nearest matching hospitals within radius_km of it)"""
+    location = get_gazetteer().geocode(place)
+    if location is None:
+        return None, []
+    _, lat, lon = location
+    return location, get_hospital_index().nearest(lat, lon, k, radius_km, hospital_type)
+
+
+def hospital_names(place: str = None) -> list:
+    """All hospital names, nearest to place first when it can be geocoded"""
+    index = get_hospital_index()
+    location = get_gazetteer().geocode(place) if place else None
+    if location is None:
+        return sorted(h["name"] for h in index.hospitals)
+    return [h["name"] for h in index.nearest(location[1], location[2], k=len(index.hospitals))]
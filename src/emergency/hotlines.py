@@ -0,0 +1,12 @@
+# Emergency numbers (India), shown in the Emergency tab and with red-flag guidance
+EMERGENCY_NUMBERS = {
+    "Emergency Services": "112",
+    "Ambulance": "102 / 108",
+    "Police": "100",
+    "Fire Brigade": "101",
+    "Women Helpline": "1091",
+    "Child Helpline": "1098",
+    "Medical Emergency": "104",
+    "Poison Control": "1800-425-2255",
+    "Mental Health (Tele-MANAS)": "14416"
+}
@@ -0,0 +1,239 @@
+"""
+Red-flag symptoms detected before any LLM call.
+
+A chat message is scanned once with an Aho-Corasick automaton built from the
+curated lexicon in data/red_flags.csv (English, Hindi in Devanagari and Latin
+script, Bengali, Odia, Spanish), so the cost is linear in the message length
+however many phrases there are; a typical message takes tens of microseconds.
+Matches must start and end on word boundaries, and a match is dropped when a
+negation cue ("no", "not", "denies", "without", "nahi", ...) precedes it, or
+for Hindi-style word order ("nahi", "नहीं") follows it, within the same clause.
+A preceding cue also covers a list ("denies chest pain or shortness of
+breath"), and "... is not present" / "... has resolved" after it negates it.
+Phrases that are themselves negative ("not breathing", "no pulse") are lexicon
+entries, so their own "not" never counts as a cue.
+The chat shows emergency_guidance() straight away and the case's queued
+analyses are moved to the front of the job queue.
+"""
+from collections import deque
+from pathlib import Path
+import threading
+import unicodedata
+import csv
+import re
+import os
+from dotenv import load_dotenv
+from src.emergency.hotlines import EMERGENCY_NUMBERS
+
+load_dotenv()
+
+RED_FLAGS_PATH = Path(os.getenv("RED_FLAGS_PATH", Path(__file__).parent / "data" / "red_flags.csv"))
+
+# Words before a match (within NEGATION_WINDOW words, or heading a list it ends, same sentence) that negate it
+PRE_NEGATIONS = {
+    "no", "not", "never", "without", "denies", "denied", "deny", "dont", "don't", "doesn't", "doesnt",
+    "didn't", "didnt", "isn't", "wasn't", "haven't", "hasn't", "nahi", "nahin", "nhi", "नहीं", "ना", "sin"
+}
+PRE_NEGATION_PHRASES = ("free of", "negative for", "no longer", "ruled out")
+# Hindi-style negation after the symptom: "seene mein dard nahi hai"
+POST_NEGATIONS = {"nahi", "nahin", "nhi", "नहीं", "নেই", "ନାହିଁ"}
+# English negation after the symptom: "chest pain is not present", "the bleeding has resolved"
+POST_NEGATION = re.compile(
+    r"(?:(?:is|are|was|were|has|have|had|been)\s+)*"
+    r"(?:(?:not|no longer)\s+(?:present|there)|(?:isn't|wasn't|aren't)\s+(?:present|there)"
+    r"|absent|resolved|gone|went away)\b"
+)
+NEGATION_WINDOW = 3
+# A list continues a negation: "no fever, cough or chest pain"
+LIST_SEPARATORS = {",", "or", "and", "nor"}
+# Words that start a new statement inside a list, ending the negation: "no fever and I have chest pain"
+SCOPE_ENDERS = {
+    "i", "i'm", "im", "he", "she", "we", "they", "you", "it", "my", "his", "her", "their", "is", "am", "are",
+    "was", "were", "have", "has", "had", "feel", "feels", "now", "also", "mujhe", "मुझे"
+}
+CLAUSE_BREAK = re.compile(r"[.,;:!?\n।]|\b(?:but|however|though|lekin|magar)\b|लेकिन")
+# Clause breaks other than commas, which may separate the items of a negated list
+SENTENCE_BREAK = re.compile(r"[.;:!?\n।]|\b(?:but|however|though|lekin|magar)\b|लेकिन")
+
+CATEGORY_LABELS = {
+    "cardiac": "possible heart attack",
+    "breathing": "severe breathing difficulty",
+    "unresponsive": "loss of consciousness",
+    "stroke": "possible stroke",
+    "seizure": "seizure",
+    "bleeding": "severe bleeding",
+    "self_harm": "risk of self-harm",
+    "poisoning": "poisoning or overdose",
+    "anaphylaxis": "severe allergic reaction"
+}
+CATEGORY_ADVICE = {
+    "cardiac": "Stop all activity, sit down and stay calm. Unlock the door so help can get in.",
+    "breathing": "Sit upright and loosen tight clothing. Use your prescribed inhaler if you have one.",
+    "unresponsive": "Check for breathing. If they are breathing, lay them on their side. If not, start CPR.",
+    "stroke": "Note the time symptoms started. Do not give food, drink or medicine.",
+    "seizure": "Move hard objects away and cushion the head. Do not hold them down or put anything in the mouth.",
+    "bleeding": "Press firmly on the wound with a clean cloth and keep pressing. Do not remove soaked cloths.",
+    "self_harm": "You are not alone. Please call Tele-MANAS (14416) now or go to the nearest emergency department.",
+    "poisoning": "Keep the container or pill bottle. Do not make the person vomit. Call Poison Control.",
+    "anaphylaxis": "Use an epinephrine auto-injector if one is available. Lie down with legs raised unless breathing is hard."
+}
+CATEGORY_HOTLINES = {"poisoning": "Poison Control", "self_harm": "Mental Health (Tele-MANAS)"}
+
+
+def _normalize(text: str) -> str:
+    # Case, curly apostrophes and runs of whitespace vary; offsets don't need to match the original
+    text = unicodedata.normalize("NFC", text).lower().replace("’", "'").replace("‘", "'")
+    return re.sub(r"\s+", " ", text)
+
+
+def _is_word_char(ch: str) -> bool:
+    # Devanagari/Bengali/Odia vowel signs are combining marks, not alnum, but are part of the word
+    return ch.isalnum() or unicodedata.category(ch).startswith("M") or ch in "'_"
+
+
+# ---------------------- AHO-CORASICK ----------------------
+
+class PhraseMatcher:
+    """Aho-Corasick automaton: every occurrence of every phrase in one pass over the text"""
+
+    def __init__(self, phrases: dict):
+        # phrases: normalized phrase -> payload
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for phrase, payload in phrases.items():
+            state = 0
+            for ch in phrase:
+                if ch not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][ch] = len(self._goto) - 1
+                state = self._goto[state][ch]
+            self._out[state].append((len(phrase), payload))
+
+        # Breadth-first failure links; each state also reports its failure state's outputs
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text: str):
+        """(start, end, payload) for every occurrence, in order of end position"""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for end, ch in enumerate(text, 1):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, payload in out[state]:
+                yield end - length, end, payload
+
+
+def load_lexicon(path: Path = RED_FLAGS_PATH) -> dict:
+    """Normalized phrase -> (phrase, category, language)"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return {_normalize(row["phrase"].strip()): (row["phrase"].strip(), row["category"], row["language"])
+                for row in csv.DictReader(f) if row["phrase"].strip()}
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def get_matcher() -> PhraseMatcher:
+    global _matcher
+    with _matcher_lock:
+        if _matcher is None:
+            _matcher = PhraseMatcher(load_lexicon(RED_FLAGS_PATH))
+        return _matcher
+
+
+# ---------------------- DETECTION ----------------------
+
+def _pre_negated(before: str) -> bool:
+    words = [word.strip("\"'()") for word in before.replace(",", " , ").split()]
+    # Where the last negation cue ends
+    cue_end = max((i + 1 for i, word in enumerate(words) if word in PRE_NEGATIONS), default=None)
+    for phrase in PRE_NEGATION_PHRASES:
+        tokens = phrase.split()
+        for i in range(len(words) - len(tokens) + 1):
+            if words[i:i + len(tokens)] == tokens:
+                cue_end = max(cue_end or 0, i + len(tokens))
+    if cue_end is None:
+        return False
+
+    gap = words[cue_end:]
+    if not any(word in LIST_SEPARATORS for word in gap):
+        return len(gap) < NEGATION_WINDOW
+    # A list: the match must be its last item, each earlier item short, and none a new statement
+    if gap[-1] not in LIST_SEPARATORS:
+        return False
+    items, item = [], []
+    for word in gap:
+        if word in LIST_SEPARATORS:
+            if item:
+                items.append(item)
+            item = []
+        else:
+            item.append(word)
+    if any(len(item) > NEGATION_WINDOW for item in items):
+        return False
+    # The first item may carry the cue's verb ("don't have fever, ...")
+    return not any(word in SCOPE_ENDERS for item in items[1:] for word in item)
+
+
+def _negated(text: str, start: int, end: int) -> bool:
+    if _pre_negated(SENTENCE_BREAK.split(text[:start])[-1]):
+        return True
+    after = CLAUSE_BREAK.split(text[end:])[0]
+    if any(word in POST_NEGATIONS for word in after.split()[:NEGATION_WINDOW]):
+        return True
+    return bool(POST_NEGATION.match(after.strip()))
+
+
+def detect_red_flags(message: str) -> list:
+    """
+    Red-flag phrases in a message that aren't negated: [{phrase, category, language, label}],
+    one per category, in the order they appear.
+    """
+    if not message:
+        return []
+    text = _normalize(message)
+    found = {}
+    for start, end, (phrase, category, language) in get_matcher().find(text):
+        if category in found:
+            continue
+        if (start > 0 and _is_word_char(text[start - 1])) or (end < len(text) and _is_word_char(text[end])):
+            continue
+        if _negated(text, start, end):
+            continue
+        found[category] = {"phrase": phrase, "category": category, "language": language,
+                           "label": CATEGORY_LABELS.get(category, category), "start": start}
+    return sorted(found.values(), key=lambda flag: flag["start"])
+
+
+def emergency_guidance(flags: list) -> str:
+    """What to do right now, with the hotlines to call, for detected red flags (Markdown)"""
+    labels = ", ".join(flag["label"] for flag in flags)
+    lines = [
+        f"🚨 **This may be an emergency ({labels}).**",
+        f"**Call {EMERGENCY_NUMBERS['Emergency Services']} or an ambulance "
+        f"({EMERGENCY_NUMBERS['Ambulance']}) now.** Do not wait for the assistant's reply.",
+        ""
+    ]
+    for flag in flags:
+        advice = CATEGORY_ADVICE.get(flag["category"])
+        if advice:
+            lines.append(f"- **{flag['label'].capitalize()}:** {advice}")
+    extra = [CATEGORY_HOTLINES[flag["category"]] for flag in flags if flag["category"] in CATEGORY_HOTLINES]
+    if extra:
+        lines.append("")
+        lines += [f"📞 **{service}:** {EMERGENCY_NUMBERS[service]}" for service in extra]
+    return "\n".join(lines)
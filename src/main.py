@@ -1,97 +1,224 @@
 from crewai import Crew
-from src.agents.crew_agents import (
-    chat_agent,
-    lab_agent,
-    image_agent,
-    research_agent,
-    symptom_agent,
-    diet_agent,
-    wellness_agent,
-    followup_agent,
-    report_agent,
-    vision_agent,
-    collab_agent
-)
-from src.tasks.crew_tasks import (
-    triage_task,
-    lab_analysis_task,
-    image_analysis_task,
-    research_task,
-    symptom_classification_task,
-    diet_task,
-    wellness_task,
-    followup_task,
-    report_task,
-    vision_task,
-    collab_task
+from crewai.tasks.task_output import TaskOutput
+from src.pipeline import checkpoints
+from src.pipeline.task_cache import get_task_cache, task_key
+from src.tools.tool_memo import tool_memo
+from src.pipeline.lab_trends import NO_LAB_TRENDS, add_report_file, trend_summary
+from src.pipeline.router import (
+    TASK_GRAPH,
+    NO_PATIENT_INPUT,
+    NO_IMAGE,
+    NO_LAB_REPORT,
+    plan_pipeline,
+    plan_agents_and_tasks
 )
 from pathlib import Path
-import os
 from dotenv import load_dotenv
 from datetime import datetime
+import argparse
 import json
 
 load_dotenv()
 
+
+class PipelineCancelled(Exception):
+    """Raised inside a run when its cancel event is set"""
+
+
 # 🧠 Full Diagnostic Pipeline
-def run_diagnostic_pipeline(patient_input: str = None, image_path: str = None, lab_report_path: str = None):
-    inputs = {
-        "patient_input": patient_input or "General checkup",
-        "image_path": image_path if image_path and Path(image_path).exists() else "No image provided",
-        "lab_report_path": lab_report_path if lab_report_path and Path(lab_report_path).exists() else "No lab report provided"
-    }
+def run_diagnostic_pipeline(patient_input: str = None, image_path: str = None, lab_report_path: str = None,
+                            adaptive: bool = True, on_progress=None, cancel_event=None, run_id: str = None,
+                            reuse: bool = True, case_id: str = None):
+    """
+    Run every agent the case needs, checkpointing each task's output under run_id.
 
-    crew = Crew(
-        agents=[
-            chat_agent, lab_agent, image_agent, research_agent,
-            symptom_agent, diet_agent, wellness_agent, followup_agent,
-            report_agent, vision_agent, collab_agent
-        ],
-        tasks=[
-            triage_task, lab_analysis_task, image_analysis_task,
-            research_task, symptom_classification_task, diet_task,
-            wellness_task, followup_task, report_task, vision_task,
-            collab_task
-        ],
-        verbose=True
-    )
+    Passing the run_id of an unfinished run resumes it from its first incomplete task
+    (with the inputs and plan it started with); a completed run returns its stored result.
+
+    on_progress(task_name, status, detail) is called with 'pending'/'skipped' for the plan,
+    then 'running' and 'done' (detail = the task's output) as the crew works through it.
+    Setting cancel_event stops the run at the next agent step with PipelineCancelled.
+
+    With reuse, a task whose inputs and upstream outputs match an earlier run returns that
+    run's output instead of calling its agent ('reused' progress status).
+
+    With a case_id, the lab report is added to the case's lab history and the lab and
+    follow-up agents get a summary of how its values have been trending.
+    """
+    run = checkpoints.load_run(run_id) if run_id else None
+    if run and run["status"] == "completed":
+        return run["result"]
+    if run:
+        print(f"♻️ Resuming run {run['run_id']} from task {checkpoints.first_incomplete(run) + 1}"
+              f"/{len(run['plan']['tasks'])}")
+    else:
+        inputs = {
+            "patient_input": patient_input or NO_PATIENT_INPUT,
+            "image_path": image_path if image_path and Path(image_path).exists() else NO_IMAGE,
+            "lab_report_path": lab_report_path if lab_report_path and Path(lab_report_path).exists() else NO_LAB_REPORT,
+            "lab_trends": _lab_trends(case_id, lab_report_path)
+        }
+
+        # Only run the agents this case actually needs
+        plan = plan_pipeline(inputs, adaptive=adaptive)
+        for name, reason in plan["skipped"].items():
+            print(f"⏭️ Skipping {name} task: {reason}")
+        run = checkpoints.start_run(inputs, plan, run_id)
+
+    return _execute_run(run, on_progress, cancel_event, reuse)
+
+
+# ⏪ Replay From A Task
+def replay(run_id: str = None, from_task: str = None, on_progress=None, cancel_event=None):
+    """
+    Re-execute a stored run from from_task onward, reusing the stored outputs of the
+    tasks before it. The replay is checkpointed as a new run; the original is kept.
+    """
+    if run_id is None:
+        # Console-script entry point: replay <run_id> [--from-task NAME]
+        parser = argparse.ArgumentParser(description="Replay a diagnostic run from a task onward")
+        parser.add_argument("run_id")
+        parser.add_argument("--from-task", help="first task to re-execute (default: first incomplete)")
+        args = parser.parse_args()
+        result = replay(args.run_id, args.from_task)
+        print(result)
+        return result
+
+    original = checkpoints.load_run(run_id)
+    if original is None:
+        return f"❌ Error: No checkpoint for run '{run_id}'"
+    names = original["plan"]["tasks"]
+    if from_task and from_task not in names:
+        return f"❌ Error: Task '{from_task}' is not part of run '{run_id}' (tasks: {', '.join(names)})"
+    start = names.index(from_task) if from_task else checkpoints.first_incomplete(original)
+    missing = [name for name in names[:start] if name not in original["outputs"]]
+    if missing:
+        return f"❌ Error: Run '{run_id}' has no stored output for {', '.join(missing)}; replay from an earlier task"
+
+    upstream = {name: original["outputs"][name] for name in names[:start]}
+    run = checkpoints.start_run(original["inputs"], original["plan"], outputs=upstream, replayed_from=run_id)
+    print(f"⏪ Replaying run {run_id} from '{names[start] if start < len(names) else 'end'}' as {run['run_id']}")
+    # A replay is an explicit request to re-execute, so it bypasses the task cache
+    return _execute_run(run, on_progress, cancel_event, reuse=False)
+
+
+def _lab_trends(case_id: str, lab_report_path: str) -> str:
+    if not case_id:
+        return NO_LAB_TRENDS
+    if lab_report_path and Path(lab_report_path).exists():
+        try:
+            add_report_file(case_id, lab_report_path)
+        except Exception as e:
+            print(f"⚠️ Could not add the lab report to the case's history: {e}")
+    return trend_summary(case_id)
+
+
+def _execute_run(run: dict, on_progress=None, cancel_event=None, reuse: bool = True):
+    plan, inputs = run["plan"], run["inputs"]
+    # Runs checkpointed before lab history existed
+    inputs.setdefault("lab_trends", NO_LAB_TRENDS)
+    names = plan["tasks"]
+    on_progress = on_progress or (lambda *args: None)
+    cache = get_task_cache() if reuse else None
+    restored = [name for name in names if name in run["outputs"]]
+    reused, recomputed = [], []
+
+    for name in names:
+        on_progress(name, "done" if name in run["outputs"] else "pending", run["outputs"].get(name))
+    for name, reason in plan["skipped"].items():
+        on_progress(name, "skipped", reason)
+
+    def check_cancelled(*_):
+        if cancel_event is not None and cancel_event.is_set():
+            raise PipelineCancelled()
 
     try:
-        result = crew.kickoff(inputs=inputs)
+        tasks = _run_tasks(plan)
+        for task in tasks.values():
+            task.agent.step_callback = check_cancelled
+
+        # Identical tool calls within the run (e.g. two agents parsing the same image) execute once
+        with tool_memo() as memo:
+            keys = {}
+            for name in names:
+                task = tasks[name]
+                # Keys chain through the graph, so everything downstream of a changed input is recomputed
+                keys[name] = key = task_key(name, task, inputs,
+                                            {dep: keys[dep] for dep in TASK_GRAPH[name][2] if dep in keys})
+                if name in run["outputs"]:
+                    _set_output(task, run["outputs"][name])
+                    continue
+                check_cancelled()
+                output = cache.get(key) if cache else None
+                if output is not None:
+                    _set_output(task, output)
+                    reused.append(name)
+                else:
+                    on_progress(name, "running", None)
+                    output = str(Crew(agents=[task.agent], tasks=[task], verbose=True).kickoff(inputs=inputs).raw)
+                    if cache:
+                        cache.put(key, name, output)
+                    recomputed.append(name)
+                checkpoints.record_task(run, name, output)
+                on_progress(name, "reused" if name in reused else "done", output)
+
+        result = run["outputs"][names[-1]] if names else ""
+        run.update({"reused": reused, "recomputed": recomputed, "tool_executions_saved": memo.saved})
+        checkpoints.finish_run(run, "completed", result)
+        print(f"♻️ Reused: {', '.join(reused) or 'none'} | 🔄 Recomputed: {', '.join(recomputed) or 'none'}"
+              + (f" | 🔖 Restored: {', '.join(restored)}" if restored else ""))
+        print(f"🔁 Tool executions saved: {memo.saved} (executed {memo.executions})")
 
         # Optional: Save result to JSON
         log = {
             "timestamp": datetime.now().isoformat(),
+            "run_id": run["run_id"],
             "inputs": inputs,
+            "tasks_run": recomputed,
+            "tasks_reused": reused,
+            "tasks_restored": restored,
+            "skipped_tasks": plan["skipped"],
+            "tool_executions": memo.executions,
+            "tool_executions_saved": memo.saved,
             "result": result
         }
         with open("diagnostic_logs.json", "a") as f:
             f.write(json.dumps(log) + "\n")
 
         return result
+    except PipelineCancelled:
+        checkpoints.finish_run(run, "cancelled")
+        raise
     except Exception as e:
-        return f"❌ Error executing diagnostic pipeline: {str(e)}"
+        checkpoints.finish_run(run, "failed", error=str(e))
+        return f"❌ Error executing diagnostic pipeline: {str(e)} (resume with run id {run['run_id']})"
+
+
+def _run_tasks(plan: dict) -> dict:
+    """
+    This run's own copies of the plan's tasks and agents (callbacks and outputs are per run),
+    keyed by name. Each task's context is its upstream tasks from TASK_GRAPH, so a task's
+    output depends only on the inputs it reads and those tasks - which is what makes
+    task-level reuse and resuming from any task exact.
+    """
+    agents, tasks = plan_agents_and_tasks(plan)
+    copies = dict(zip(plan["tasks"], Crew(agents=agents, tasks=tasks).copy().tasks))
+    for name, task in copies.items():
+        task.context = [copies[dep] for dep in TASK_GRAPH[name][2] if dep in copies]
+    return copies
+
+
+def _set_output(task, raw: str):
+    # Stored outputs stand in for the task when it is another task's context
+    task.output = TaskOutput(description=task.description, agent=task.agent.role, raw=raw)
 
 # 🧪 Run Single Task
 def run_single_task(task_type: str, **kwargs):
-    task_map = {
-        'triage': (chat_agent, triage_task),
-        'lab': (lab_agent, lab_analysis_task),
-        'image': (image_agent, image_analysis_task),
-        'research': (research_agent, research_task),
-        'symptom': (symptom_agent, symptom_classification_task),
-        'diet': (diet_agent, diet_task),
-        'wellness': (wellness_agent, wellness_task),
-        'followup': (followup_agent, followup_task),
-        'report': (report_agent, report_task),
-        'vision': (vision_agent, vision_task),
-        'collab': (collab_agent, collab_task)
-    }
-
-    if task_type not in task_map:
+    if task_type not in TASK_GRAPH:
         return f"❌ Error: Unknown task type '{task_type}'"
 
-    agent, task = task_map[task_type]
+    agent, task, _ = TASK_GRAPH[task_type]
+    kwargs.setdefault("lab_trends", NO_LAB_TRENDS)
 
     crew = Crew(
         agents=[agent],
@@ -106,3 +233,5 @@ def run_single_task(task_type: str, **kwargs):
         return f"❌ Error executing {task_type} task: {str(e)}"
 
 
+if __name__ == "__main__":
+    replay()
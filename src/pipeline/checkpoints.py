@@ -0,0 +1,92 @@
+"""
+Per-run checkpoints for the diagnostic pipeline.
+
+Every task's output is written to runs/<run_id>.json as soon as the task
+finishes, together with the run's inputs and plan. A run that fails part-way
+can then resume from its first incomplete task, and any run can be replayed
+from a chosen task onward using the stored outputs of the tasks before it.
+"""
+from datetime import datetime
+from pathlib import Path
+import json
+import uuid
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RUNS_DIR = Path(os.getenv("RUNS_DIR", "runs"))
+
+
+def _run_path(run_id: str) -> Path:
+    return RUNS_DIR / f"{run_id}.json"
+
+
+def new_run_id() -> str:
+    return datetime.now().strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+
+
+def load_run(run_id: str):
+    """Stored run record, or None if there is no checkpoint for this id"""
+    path = _run_path(run_id)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_run(run: dict):
+    """Write a run record atomically (a crash mid-write keeps the previous checkpoint)"""
+    RUNS_DIR.mkdir(parents=True, exist_ok=True)
+    run["updated_at"] = datetime.now().isoformat()
+    path = _run_path(run["run_id"])
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(run, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def start_run(inputs: dict, plan: dict, run_id: str = None, outputs: dict = None, replayed_from: str = None) -> dict:
+    run = {
+        "run_id": run_id or new_run_id(),
+        "status": "running",
+        "created_at": datetime.now().isoformat(),
+        "inputs": inputs,
+        "plan": plan,
+        "outputs": dict(outputs or {}),  # task name -> raw output, in plan order
+        "result": None,
+        "error": None,
+        "replayed_from": replayed_from
+    }
+    save_run(run)
+    return run
+
+
+def record_task(run: dict, task_name: str, output: str):
+    run["outputs"][task_name] = output
+    save_run(run)
+
+
+def finish_run(run: dict, status: str, result: str = None, error: str = None):
+    run.update({"status": status, "result": result, "error": error})
+    save_run(run)
+
+
+def first_incomplete(run: dict) -> int:
+    """Index into the plan of the first task without a checkpoint"""
+    names = run["plan"]["tasks"]
+    return next((i for i, name in enumerate(names) if name not in run["outputs"]), len(names))
+
+
+def list_runs(limit: int = 20) -> list:
+    """Most recent runs, newest first (id, status, tasks done / planned)"""
+    runs = []
+    paths = sorted(RUNS_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for path in paths[:limit]:
+        run = json.loads(path.read_text(encoding="utf-8"))
+        runs.append({
+            "run_id": run["run_id"],
+            "status": run["status"],
+            "updated_at": run.get("updated_at"),
+            "done": len(run["outputs"]),
+            "planned": len(run["plan"]["tasks"])
+        })
+    return runs
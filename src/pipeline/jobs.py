@@ -0,0 +1,387 @@
+"""
+Background job queue for full diagnostic runs.
+
+The Streamlit script submits a case and gets a job id back immediately; a small
+pool of worker threads runs the crew and records per-task progress (with each
+task's output as soon as it finishes) in SQLite, which the UI polls. Jobs can
+be cancelled while queued or between agent steps. Several app processes can
+share one jobs database: claiming a job is a single write transaction, and a
+running job whose worker stops heartbeating is marked failed.
+"""
+from pathlib import Path
+import threading
+import sqlite3
+import socket
+import json
+import time
+import uuid
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ---------------------- CONFIGURATION ----------------------
+
+JOBS_DB_PATH = Path(os.getenv("JOBS_DB_PATH", "jobs.db"))
+# Concurrent pipeline runs per app process (each run makes its own LLM calls)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Queued + running jobs one case may have at a time
+JOB_MAX_ACTIVE_PER_CASE = int(os.getenv("JOB_MAX_ACTIVE_PER_CASE", "1"))
+# Finished jobs (and their outputs) are deleted after this long
+JOB_RETENTION_S = float(os.getenv("JOB_RETENTION_S", str(7 * 24 * 3600)))
+# How long a case flagged as urgent keeps its jobs at the front of the queue
+JOB_PRIORITY_TTL_S = float(os.getenv("JOB_PRIORITY_TTL_S", str(24 * 3600)))
+HEARTBEAT_S = 10
+STALE_AFTER_S = 6 * HEARTBEAT_S
+POLL_S = 1.0  # how often idle workers look for jobs submitted by other processes
+CLAIM_BACKOFF_MAX_S = 30.0  # longest wait between retries after a failed claim
+
+ACTIVE = ("queued", "running")
+FINISHED = ("succeeded", "failed", "cancelled")
+PRIORITIZE_SQL = (
+    "INSERT INTO case_priority (case_id, reason, flagged_at) VALUES (?, ?, ?) "
+    "ON CONFLICT (case_id) DO UPDATE SET reason = excluded.reason, flagged_at = excluded.flagged_at"
+)
+
+
+class JobLimitError(RuntimeError):
+    """The case already has JOB_MAX_ACTIVE_PER_CASE jobs queued or running"""
+
+
+class _CancelFlag:
+    """threading.Event-like flag that also sees cancellations made by other processes"""
+
+    def __init__(self, queue: "JobQueue", job_id: str):
+        self._queue = queue
+        self._job_id = job_id
+        self._event = threading.Event()
+        self._checked = 0.0
+
+    def set(self):
+        self._event.set()
+
+    def is_set(self) -> bool:
+        if not self._event.is_set() and time.monotonic() - self._checked > POLL_S:
+            self._checked = time.monotonic()
+            row = self._queue._conn().execute(
+                "SELECT cancel_requested FROM jobs WHERE id = ?", (self._job_id,)
+            ).fetchone()
+            if row is None or row[0]:
+                self._event.set()
+        return self._event.is_set()
+
+
+def _create_tables(conn: sqlite3.Connection):
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS jobs ("
+        "id TEXT PRIMARY KEY, case_id TEXT, status TEXT NOT NULL, inputs TEXT NOT NULL, "
+        "created_at REAL, started_at REAL, finished_at REAL, heartbeat REAL, worker TEXT, "
+        "cancel_requested INTEGER DEFAULT 0, result TEXT, error TEXT)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS job_tasks ("
+        "job_id TEXT, name TEXT, position INTEGER, status TEXT, detail TEXT, updated_at REAL, "
+        "PRIMARY KEY (job_id, name))"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS case_priority (case_id TEXT PRIMARY KEY, reason TEXT, flagged_at REAL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_case ON jobs(case_id, created_at)")
+
+
+class JobQueue:
+    def __init__(self, path: Path = JOBS_DB_PATH, workers: int = JOB_WORKERS, runner=None):
+        self.path = Path(path)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._runner = runner
+        self._local = threading.local()
+        self._wakeup = threading.Condition()
+        self._running = {}  # job_id -> _CancelFlag for jobs this process is running
+        self._running_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+        _create_tables(self._conn())
+
+        self._threads = [
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True) for i in range(workers)
+        ]
+        self._threads.append(threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; claims go through an explicit BEGIN IMMEDIATE
+            conn = self._local.conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ---------------------- PUBLIC API ----------------------
+
+    def submit(self, case_id: str, patient_input: str = None, image_path: str = None,
+               lab_report_path: str = None) -> str:
+        """Queue a full diagnostic run for a case; returns the job id"""
+        self.purge()
+        inputs = {"patient_input": patient_input, "image_path": image_path, "lab_report_path": lab_report_path,
+                  "case_id": case_id}
+        job_id = uuid.uuid4().hex[:12]
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            (active,) = conn.execute(
+                f"SELECT COUNT(*) FROM jobs WHERE case_id = ? AND status IN {ACTIVE}", (case_id,)
+            ).fetchone()
+            if active >= JOB_MAX_ACTIVE_PER_CASE:
+                raise JobLimitError(f"Case {case_id} already has {active} analysis job(s) in progress")
+            conn.execute(
+                "INSERT INTO jobs (id, case_id, status, inputs, created_at) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, case_id, json.dumps(inputs), time.time())
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id: str):
+        """Job status, per-task progress and (once finished) the result; None if unknown or purged"""
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT id, case_id, status, created_at, started_at, finished_at, cancel_requested, result, error "
+            "FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(
+            ("id", "case_id", "status", "created_at", "started_at", "finished_at", "cancel_requested",
+             "result", "error"), row
+        ))
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        job["tasks"] = [
+            {"name": name, "status": status, "detail": detail}
+            for name, status, detail in conn.execute(
+                "SELECT name, status, detail FROM job_tasks WHERE job_id = ? ORDER BY position", (job_id,)
+            )
+        ]
+        return job
+
+    def list_jobs(self, case_id: str, limit: int = 10) -> list:
+        """A case's most recent jobs, newest first"""
+        rows = self._conn().execute(
+            "SELECT id FROM jobs WHERE case_id = ? ORDER BY created_at DESC LIMIT ?", (case_id, limit)
+        ).fetchall()
+        return [job for job in (self.get(job_id) for (job_id,) in rows) if job]
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued job now, or a running one at its next agent step"""
+        conn = self._conn()
+        now = time.time()
+        cancelled = conn.execute(
+            "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished_at = ? "
+            "WHERE id = ? AND status = 'queued'", (now, job_id)
+        ).rowcount
+        if not cancelled:
+            cancelled = conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,)
+            ).rowcount
+            with self._running_lock:
+                flag = self._running.get(job_id)
+            if flag:
+                flag.set()
+        return bool(cancelled)
+
+    def retry(self, job_id: str) -> bool:
+        """Requeue a failed or cancelled job; it resumes from its last checkpointed task"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT case_id FROM jobs WHERE id = ? AND status IN ('failed', 'cancelled')",
+                               (job_id,)).fetchone()
+            if row:
+                (active,) = conn.execute(
+                    f"SELECT COUNT(*) FROM jobs WHERE case_id = ? AND status IN {ACTIVE}", (row[0],)
+                ).fetchone()
+                if active >= JOB_MAX_ACTIVE_PER_CASE:
+                    raise JobLimitError(f"Case {row[0]} already has {active} analysis job(s) in progress")
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', cancel_requested = 0, error = NULL, finished_at = NULL, "
+                    "started_at = NULL WHERE id = ?", (job_id,)
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if row:
+            with self._wakeup:
+                self._wakeup.notify()
+        return row is not None
+
+    def prioritize_case(self, case_id: str, reason: str):
+        """Run the case's queued jobs (and any it submits in the next JOB_PRIORITY_TTL_S) ahead of others"""
+        self._conn().execute(PRIORITIZE_SQL, (case_id, reason, time.time()))
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def purge(self) -> int:
+        """Delete finished jobs older than JOB_RETENTION_S"""
+        conn = self._conn()
+        cutoff = time.time() - JOB_RETENTION_S
+        conn.execute("DELETE FROM case_priority WHERE flagged_at < ?", (time.time() - JOB_PRIORITY_TTL_S,))
+        conn.execute(
+            f"DELETE FROM job_tasks WHERE job_id IN "
+            f"(SELECT id FROM jobs WHERE status IN {FINISHED} AND finished_at < ?)", (cutoff,)
+        )
+        return conn.execute(
+            f"DELETE FROM jobs WHERE status IN {FINISHED} AND finished_at < ?", (cutoff,)
+        ).rowcount
+
+    def shutdown(self, cancel_running: bool = True):
+        self._stopping.set()
+        if cancel_running:
+            # cancel() takes _running_lock itself
+            with self._running_lock:
+                running = list(self._running)
+            for job_id in running:
+                self.cancel(job_id)
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    # ---------------------- WORKERS ----------------------
+
+    def _claim(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Jobs of cases flagged as urgent first, then oldest first
+            row = conn.execute(
+                "SELECT jobs.id, jobs.inputs FROM jobs LEFT JOIN case_priority AS priority "
+                "ON priority.case_id = jobs.case_id AND priority.flagged_at >= ? "
+                "WHERE jobs.status = 'queued' ORDER BY priority.case_id IS NULL, jobs.created_at LIMIT 1",
+                (time.time() - JOB_PRIORITY_TTL_S,)
+            ).fetchone()
+            if row:
+                now = time.time()
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, heartbeat = ?, worker = ? WHERE id = ?",
+                    (now, now, self.worker_id, row[0])
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _work(self):
+        failures = 0
+        while not self._stopping.is_set():
+            try:
+                claimed = self._claim()
+                failures = 0
+            except Exception as e:
+                # e.g. "database is locked" when other processes hold the write lock past the timeout
+                failures += 1
+                print(f"⚠️ Job worker could not claim a job: {e}")
+                self._stopping.wait(min(POLL_S * 2 ** failures, CLAIM_BACKOFF_MAX_S))
+                continue
+            if claimed is None:
+                with self._wakeup:
+                    self._wakeup.wait(POLL_S)
+                continue
+            self._run(claimed[0], json.loads(claimed[1]))
+
+    def _run(self, job_id: str, inputs: dict):
+        from src.main import PipelineCancelled, run_diagnostic_pipeline
+
+        runner = self._runner or run_diagnostic_pipeline
+        flag = _CancelFlag(self, job_id)
+        with self._running_lock:
+            self._running[job_id] = flag
+        positions = iter(range(10**6))
+
+        def on_progress(name, status, detail):
+            # Task callbacks may fire on crewai's threads, so take that thread's connection
+            self._conn().execute(
+                "INSERT INTO job_tasks VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (job_id, name) "
+                "DO UPDATE SET status = excluded.status, detail = excluded.detail, updated_at = excluded.updated_at",
+                (job_id, name, next(positions), status, detail, time.time())
+            )
+
+        status, result, error = "succeeded", None, None
+        try:
+            # The job id doubles as the checkpoint run id, so a retried job resumes where it stopped
+            result = str(runner(on_progress=on_progress, cancel_event=flag, run_id=job_id, **inputs))
+            if result.startswith("❌"):
+                status, error = "failed", result
+        except PipelineCancelled:
+            status = "cancelled"
+        except Exception as e:
+            status, error = "failed", str(e)
+        finally:
+            with self._running_lock:
+                self._running.pop(job_id, None)
+
+        conn = self._conn()
+        if status == "cancelled":
+            conn.execute(
+                "UPDATE job_tasks SET status = 'cancelled' WHERE job_id = ? AND status IN ('pending', 'running')",
+                (job_id,)
+            )
+        conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, result, error, time.time(), job_id)
+        )
+
+    def _heartbeat(self):
+        """Keep this process's running jobs alive and fail ones whose worker went away"""
+        while not self._stopping.wait(HEARTBEAT_S):
+            conn = self._conn()
+            now = time.time()
+            with self._running_lock:
+                running = list(self._running)
+            conn.executemany("UPDATE jobs SET heartbeat = ? WHERE id = ?", [(now, job_id) for job_id in running])
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Interrupted: the worker running this job stopped', "
+                "finished_at = ? WHERE status = 'running' AND heartbeat < ?", (now, now - STALE_AFTER_S)
+            )
+
+
+# ---------------------- SINGLETON ----------------------
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def prioritize_case(case_id: str, reason: str):
+    """
+    Flag a case as urgent without starting workers in this process: goes through
+    the queue when this process already has one, else writes the row directly.
+    Workers elsewhere pick it up on their next poll.
+    """
+    with _queue_lock:
+        queue = _queue
+    if queue is not None:
+        queue.prioritize_case(case_id, reason)
+        return
+    conn = sqlite3.connect(str(JOBS_DB_PATH), timeout=30, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        _create_tables(conn)
+        conn.execute(PRIORITIZE_SQL, (case_id, reason, time.time()))
+    finally:
+        conn.close()
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide job queue (workers start on first use)"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
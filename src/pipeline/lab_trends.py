@@ -0,0 +1,278 @@
+"""
+Per-case time series of lab results.
+
+Each lab report a case submits is parsed into (analyte, value, unit, reference
+range) rows and appended to the case's columnar store, lab_trends/<case_id>.npz:
+one array per column (analyte code, time, value, low, high, report), so a case
+with years of reports is a few hundred KB and loads in a millisecond. Deltas,
+slopes and reference-range crossings over any time window are computed for all
+analytes at once with grouped numpy reductions. trend_summary() renders them as
+a few lines for the lab and follow-up agents and for chat follow-ups.
+"""
+from datetime import datetime
+from pathlib import Path
+import threading
+import hashlib
+import re
+import os
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LAB_TRENDS_DIR = Path(os.getenv("LAB_TRENDS_DIR", "lab_trends"))
+# Analytes listed in a summary; the most notable come first
+LAB_TRENDS_MAX_LINES = int(os.getenv("LAB_TRENDS_MAX_LINES", "12"))
+
+NO_LAB_TRENDS = "No earlier lab results on file"
+
+# "Hemoglobin   12.10 L  g/dL   13.5-17.5": name, value, optional flag, optional unit, reference range
+RESULT_LINE = re.compile(
+    r"^\s*(?P<name>[A-Za-z][A-Za-z0-9 ()%,'/+.-]*?[A-Za-z)%])\s*[:=]?\s+"
+    r"(?P<value>[<>]?-?\d+(?:\.\d+)?)\s*(?P<flag>HH|LL|H|L|\*)?\s+"
+    r"(?:(?P<unit>[^\s\d][^\s]*)\s+)?"
+    r"(?P<low>-?\d+(?:\.\d+)?)\s*[-–]\s*(?P<high>-?\d+(?:\.\d+)?)\b"
+)
+# Collection date printed on the report: ISO, or day/month/year
+DATE_PATTERNS = (
+    (re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b"), ("year", "month", "day")),
+    (re.compile(r"\b(\d{1,2})[/.](\d{1,2})[/.](\d{4})\b"), ("day", "month", "year"))
+)
+DAY_S = 24 * 3600.0
+COLUMNS = ("code", "t", "value", "low", "high", "report")
+
+_case_locks = {}
+_case_locks_lock = threading.Lock()
+_loaded = {}  # case path -> (mtime_ns, arrays)
+
+
+def _analyte_key(name: str) -> str:
+    return re.sub(r"\s+", " ", name.strip().lower())
+
+
+def parse_results(text: str) -> list:
+    """(name, value, unit, low, high) for every result line with a reference range"""
+    rows = []
+    for line in text.splitlines():
+        match = RESULT_LINE.match(line)
+        if not match:
+            continue
+        low, high = float(match["low"]), float(match["high"])
+        if low >= high:
+            continue
+        rows.append((match["name"].strip(), float(match["value"].lstrip("<>")), match["unit"] or "", low, high))
+    return rows
+
+
+def report_date(text: str):
+    """The first date printed on the report, if any"""
+    for pattern, fields in DATE_PATTERNS:
+        for match in pattern.finditer(text):
+            try:
+                return datetime(**{field: int(value) for field, value in zip(fields, match.groups())})
+            except ValueError:
+                continue
+    return None
+
+
+# ---------------------- STORE ----------------------
+
+def _case_path(case_id: str) -> Path:
+    return LAB_TRENDS_DIR / f"{re.sub(r'[^A-Za-z0-9_.-]', '_', case_id)}.npz"
+
+
+def _case_lock(case_id: str) -> threading.Lock:
+    with _case_locks_lock:
+        return _case_locks.setdefault(case_id, threading.Lock())
+
+
+def _empty() -> dict:
+    return {
+        "code": np.empty(0, np.int32), "t": np.empty(0, np.float64), "value": np.empty(0, np.float32),
+        "low": np.empty(0, np.float32), "high": np.empty(0, np.float32), "report": np.empty(0, np.int32),
+        "names": np.empty(0, str), "units": np.empty(0, str), "reports": np.empty(0, str)
+    }
+
+
+def load_case(case_id: str) -> dict:
+    """A case's columns (rows sorted by analyte, then time); cached until the file changes"""
+    path = _case_path(case_id)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return _empty()
+    cached = _loaded.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with np.load(path) as data:
+        arrays = {key: data[key] for key in data.files}
+    _loaded[path] = (mtime, arrays)
+    return arrays
+
+
+def _save_case(case_id: str, arrays: dict):
+    path = _case_path(case_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.stem + ".tmp.npz")
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+
+def add_report(case_id: str, text: str, taken_at: datetime = None, report_id: str = None) -> int:
+    """
+    Append a report's results to the case's series; returns the number of results added.
+    A report already on file (same report_id, by default the text's hash) is not added twice.
+    """
+    report_id = report_id or hashlib.sha256(text.encode("utf-8")).hexdigest()
+    rows = parse_results(text)
+    if not rows:
+        return 0
+    taken_at = taken_at or report_date(text) or datetime.now()
+
+    with _case_lock(case_id):
+        arrays = load_case(case_id)
+        reports = list(arrays["reports"])
+        if report_id in reports:
+            return 0
+        names, units = list(arrays["names"]), list(arrays["units"])
+        codes_by_key = {_analyte_key(name): code for code, name in enumerate(names)}
+        codes = []
+        for name, _, unit, _, _ in rows:
+            key = _analyte_key(name)
+            if key not in codes_by_key:
+                codes_by_key[key] = len(names)
+                names.append(name)
+                units.append(unit)
+            codes.append(codes_by_key[key])
+
+        new = {
+            "code": np.array(codes, np.int32),
+            "t": np.full(len(rows), taken_at.timestamp()),
+            "value": np.array([row[1] for row in rows], np.float32),
+            "low": np.array([row[3] for row in rows], np.float32),
+            "high": np.array([row[4] for row in rows], np.float32),
+            "report": np.full(len(rows), len(reports), np.int32)
+        }
+        merged = {column: np.concatenate([arrays[column], new[column]]) for column in COLUMNS}
+        order = np.lexsort((merged["t"], merged["code"]))
+        merged = {column: values[order] for column, values in merged.items()}
+        merged.update(names=np.array(names, str), units=np.array(units, str), reports=np.array(reports + [report_id], str))
+        _save_case(case_id, merged)
+    return len(rows)
+
+
+def add_report_file(case_id: str, path: str) -> int:
+    """Parse a lab report file into the case's series (keyed by the file's content)"""
+    from src.tools.data_tools import read_lab_report
+    path = Path(path)
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()
+    return add_report(case_id, read_lab_report(path), report_id=digest)
+
+
+# ---------------------- TRENDS ----------------------
+
+def compute_trends(case_id: str, since: datetime = None, until: datetime = None) -> list:
+    """
+    Per-analyte trend over the window: latest value and date, change since the previous
+    result, least-squares slope per 30 days, and the latest reference-range crossing.
+    """
+    arrays = load_case(case_id)
+    t = arrays["t"]
+    mask = np.ones(len(t), bool)
+    if since is not None:
+        mask &= t >= since.timestamp()
+    if until is not None:
+        mask &= t <= until.timestamp()
+    if not mask.any():
+        return []
+    code, t = arrays["code"][mask], t[mask]
+    value = arrays["value"][mask].astype(np.float64)
+    low, high = arrays["low"][mask], arrays["high"][mask]
+
+    # Rows are sorted by (code, t), so each analyte is one contiguous run
+    present, first, counts = np.unique(code, return_index=True, return_counts=True)
+    last = first + counts - 1
+    group = np.repeat(np.arange(len(present)), counts)
+
+    # Slope from grouped sums: cov(t, v) / var(t), in units per 30 days
+    days = (t - t.min()) / DAY_S
+    mean_t = np.bincount(group, days) / counts
+    mean_v = np.bincount(group, value) / counts
+    dt = days - mean_t[group]
+    var_t = np.bincount(group, dt * dt)
+    cov = np.bincount(group, dt * (value - mean_v[group]))
+    slope = np.divide(cov, var_t, out=np.full(len(present), np.nan), where=var_t > 0) * 30
+
+    has_previous = counts > 1
+    previous = np.where(has_previous, last - 1, last)
+    delta = np.where(has_previous, value[last] - value[previous], np.nan)
+    delta_pct = np.divide(delta, np.abs(value[previous]), out=np.full(len(present), np.nan),
+                          where=has_previous & (value[previous] != 0))
+
+    # -1 below range, 0 within, 1 above; a crossing is a change between consecutive results
+    state = np.where(value < low, -1, np.where(value > high, 1, 0))
+    same_analyte = np.r_[False, code[1:] == code[:-1]]
+    crossed = same_analyte & np.r_[False, state[1:] != state[:-1]]
+    crossing_rows = np.flatnonzero(crossed)
+    latest_crossing = np.full(len(present), -1)
+    np.maximum.at(latest_crossing, group[crossing_rows], crossing_rows)
+
+    names, units = arrays["names"], arrays["units"]
+    trends = []
+    for i, analyte in enumerate(present):
+        row = latest_crossing[i]
+        trends.append({
+            "analyte": str(names[analyte]),
+            "unit": str(units[analyte]),
+            "results": int(counts[i]),
+            "latest": float(value[last[i]]),
+            "latest_at": datetime.fromtimestamp(t[last[i]]),
+            "status": ("low", "normal", "high")[state[last[i]] + 1],
+            "range": (float(low[last[i]]), float(high[last[i]])),
+            "delta": float(delta[i]),
+            "delta_pct": float(delta_pct[i]),
+            "slope_per_30d": float(slope[i]),
+            "crossing": None if row < 0 else {
+                "at": datetime.fromtimestamp(t[row]),
+                "to": ("low", "normal", "high")[state[row] + 1]
+            }
+        })
+    return trends
+
+
+def _trend_line(trend: dict) -> str:
+    unit = f" {trend['unit']}" if trend["unit"] else ""
+    line = (f"{trend['analyte']}: {trend['latest']:g}{unit} ({trend['status']}, range "
+            f"{trend['range'][0]:g}-{trend['range'][1]:g}) on {trend['latest_at']:%Y-%m-%d}")
+    if trend["results"] > 1:
+        # No percentage when the previous value was 0 (e.g. eosinophils 0 -> 2)
+        pct = f" ({trend['delta_pct'] * 100:+.1f}%)" if np.isfinite(trend["delta_pct"]) else ""
+        line += f", {trend['delta']:+.3g}{pct} vs previous"
+        if not np.isnan(trend["slope_per_30d"]):
+            line += f", trend {trend['slope_per_30d']:+.3g}/30d over {trend['results']} results"
+    if trend["crossing"]:
+        line += f"; moved to {trend['crossing']['to']} on {trend['crossing']['at']:%Y-%m-%d}"
+    return line
+
+
+def trend_summary(case_id: str, since: datetime = None, until: datetime = None,
+                  max_lines: int = LAB_TRENDS_MAX_LINES) -> str:
+    """A few lines on the case's lab history, abnormal and changing analytes first"""
+    trends = compute_trends(case_id, since, until)
+    if not trends:
+        return NO_LAB_TRENDS
+    trends.sort(key=lambda trend: (
+        trend["status"] == "normal",
+        trend["crossing"] is None,
+        -abs(np.nan_to_num(trend["delta_pct"]))
+    ))
+    reports = len(load_case(case_id)["reports"])
+    lines = [f"Lab history: {reports} report(s) on file"]
+    lines += [_trend_line(trend) for trend in trends[:max_lines]]
+    if len(trends) > max_lines:
+        lines.append(f"({len(trends) - max_lines} more analytes not shown)")
+    return "\n".join(lines)
+
+
+def known_analytes(case_id: str) -> list:
+    return [str(name) for name in load_case(case_id)["names"]]
@@ -0,0 +1,146 @@
+from src.agents.crew_agents import (
+    chat_agent,
+    lab_agent,
+    image_agent,
+    research_agent,
+    symptom_agent,
+    diet_agent,
+    wellness_agent,
+    followup_agent,
+    report_agent,
+    vision_agent,
+    collab_agent
+)
+from src.tasks.crew_tasks import (
+    triage_task,
+    lab_analysis_task,
+    image_analysis_task,
+    research_task,
+    symptom_classification_task,
+    diet_task,
+    wellness_task,
+    followup_task,
+    report_task,
+    vision_task,
+    collab_task
+)
+import re
+
+NO_PATIENT_INPUT = "General checkup"
+NO_IMAGE = "No image provided"
+NO_LAB_REPORT = "No lab report provided"
+
+# 🗺️ Task graph: name -> (agent, task, upstream tasks whose output it builds on)
+# Order here is the canonical execution order used to break ties.
+TASK_GRAPH = {
+    'triage': (chat_agent, triage_task, []),
+    'lab': (lab_agent, lab_analysis_task, []),
+    'image': (image_agent, image_analysis_task, []),
+    'vision': (vision_agent, vision_task, ['image']),
+    'research': (research_agent, research_task, ['triage', 'lab', 'image']),
+    'symptom': (symptom_agent, symptom_classification_task, ['triage']),
+    'diet': (diet_agent, diet_task, ['triage', 'lab']),
+    'wellness': (wellness_agent, wellness_task, ['triage']),
+    'followup': (followup_agent, followup_task, ['triage', 'lab', 'image', 'symptom']),
+    'report': (report_agent, report_task, [
+        'triage', 'lab', 'image', 'vision', 'research', 'symptom', 'diet', 'wellness', 'followup'
+    ]),
+    'collab': (collab_agent, collab_task, [
+        'triage', 'lab', 'image', 'vision', 'research', 'symptom', 'diet', 'wellness', 'followup', 'report'
+    ])
+}
+
+# Specialist tasks the collaboration coordinator reconciles
+SPECIALIST_TASKS = ['lab', 'image', 'vision', 'research', 'diet', 'wellness']
+MIN_SPECIALISTS_FOR_COLLAB = 3
+
+# Cheap keyword triage - no LLM call involved
+CONCERN_PATTERNS = {
+    'dietary': re.compile(
+        r"\b(diet|food|eat(ing)?|meal|appetite|weight|nutrition|diabet\w*|sugar|cholesterol|"
+        r"nause\w*|vomit\w*|diarrh\w*|constipat\w*|stomach|acid(ity)?|bloat\w*|dehydrat\w*)\b",
+        re.IGNORECASE
+    ),
+    'emotional': re.compile(
+        r"\b(stress\w*|anxi\w*|depress\w*|panic\w*|worr\w*|sad|lonely|overwhelm\w*|"
+        r"can'?t sleep|insomnia|mental|mood|grief|burn(ed|t)? out|hopeless)\b",
+        re.IGNORECASE
+    )
+}
+
+
+def classify_case(patient_input: str) -> set:
+    """Return the set of concerns ('dietary', 'emotional') mentioned in the patient input"""
+    return {concern for concern, pattern in CONCERN_PATTERNS.items() if pattern.search(patient_input or "")}
+
+
+def plan_pipeline(inputs: dict, adaptive: bool = True, classifier=classify_case) -> dict:
+    """
+    Decide which tasks a case needs and in what order.
+
+    Args:
+        inputs: Pipeline inputs (patient_input, image_path, lab_report_path)
+        adaptive: When False every task runs, as before routing existed
+        classifier: Callable mapping patient_input to a set of concerns
+
+    Returns:
+        dict: 'tasks' (task names in execution order) and 'skipped' (task name -> reason)
+    """
+    patient_input = inputs.get("patient_input") or NO_PATIENT_INPUT
+    has_image = inputs.get("image_path", NO_IMAGE) != NO_IMAGE
+    has_lab = inputs.get("lab_report_path", NO_LAB_REPORT) != NO_LAB_REPORT
+    has_symptoms = patient_input != NO_PATIENT_INPUT
+
+    skipped = {}
+    if adaptive:
+        concerns = classifier(patient_input)
+        if not has_image:
+            skipped['image'] = "no image provided"
+            skipped['vision'] = "no image provided"
+        if not has_lab:
+            skipped['lab'] = "no lab report provided"
+        if not has_symptoms:
+            skipped['symptom'] = "no symptoms described"
+        if not (has_symptoms or has_image or has_lab):
+            skipped['research'] = "nothing to research"
+        if not has_lab and 'dietary' not in concerns:
+            skipped['diet'] = "no lab report or dietary concern"
+        if 'emotional' not in concerns:
+            skipped['wellness'] = "no emotional concern raised"
+
+        specialists = [name for name in SPECIALIST_TASKS if name not in skipped]
+        if len(specialists) < MIN_SPECIALISTS_FOR_COLLAB:
+            skipped['collab'] = f"only {len(specialists)} specialist task(s), nothing to reconcile"
+
+    selected = [name for name in TASK_GRAPH if name not in skipped]
+    return {
+        "tasks": _execution_order(selected),
+        "skipped": skipped
+    }
+
+
+def _execution_order(names: list) -> list:
+    """Topologically sort the selected tasks, keeping TASK_GRAPH order between independent ones"""
+    remaining = list(names)
+    ordered = []
+    while remaining:
+        for name in remaining:
+            upstream = [dep for dep in TASK_GRAPH[name][2] if dep in remaining]
+            if not upstream:
+                ordered.append(name)
+                remaining.remove(name)
+                break
+        else:
+            raise ValueError(f"Cycle in task graph between: {remaining}")
+    return ordered
+
+
+def plan_agents_and_tasks(plan: dict) -> tuple:
+    """Resolve a plan's task names into the (agents, tasks) lists a Crew expects"""
+    agents, tasks = [], []
+    for name in plan["tasks"]:
+        agent, task, _ = TASK_GRAPH[name]
+        if not any(existing is agent for existing in agents):
+            agents.append(agent)
+        tasks.append(task)
+    return agents, tasks
@@ -0,0 +1,164 @@
+"""
+Task-level memoization for the diagnostic pipeline.
+
+A task's cache key covers everything its output depends on: the task and agent
+prompts, the agent's resolved models, the case inputs it reads (input files by
+content hash) and the keys of its upstream tasks in the task graph. When one
+input changes, only the tasks that read it, and the tasks downstream of those,
+get a new key and re-execute.
+"""
+from pathlib import Path
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+import re
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TASK_CACHE = os.getenv("TASK_CACHE", "on").lower() != "off"
+TASK_CACHE_PATH = Path(os.getenv("TASK_CACHE_PATH", "task_cache.db"))
+# Research and similar outputs go stale; entries older than this are recomputed
+TASK_CACHE_TTL_S = float(os.getenv("TASK_CACHE_TTL_S", str(7 * 24 * 3600)))
+# Bump when the key recipe changes so old entries stop matching
+KEY_VERSION = 2
+
+PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+# Case inputs each task reads besides its template placeholders. The specialist
+# agents find their files through tools, so the paths never appear in the prompt.
+TASK_INPUTS = {
+    "lab": ("lab_report_path",),
+    "image": ("image_path",),
+    "vision": ("image_path",)
+}
+# Every agent sees the patient's description through the shared crew inputs
+COMMON_INPUTS = ("patient_input",)
+
+_file_hashes = {}  # (path, size, mtime_ns) -> sha256 of the content
+_file_hashes_lock = threading.Lock()
+
+
+def _template(task, field: str) -> str:
+    # crewai overwrites description/expected_output on interpolation but keeps the templates
+    return getattr(task, f"_original_{field}", None) or getattr(task, field)
+
+
+def _file_sha256(path: Path) -> str:
+    stat = path.stat()
+    stamp = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    with _file_hashes_lock:
+        if stamp in _file_hashes:
+            return _file_hashes[stamp]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    with _file_hashes_lock:
+        _file_hashes[stamp] = digest.hexdigest()
+    return _file_hashes[stamp]
+
+
+def _input_fingerprint(value):
+    """Files are identified by their content, so a replaced file at the same path gets a new key"""
+    if isinstance(value, str) and value and len(value) < 4096:
+        path = Path(value)
+        try:
+            if path.is_file():
+                return {"sha256": _file_sha256(path)}
+        except OSError:
+            pass
+    return value
+
+
+def _llm_fingerprint(llm) -> dict:
+    """The models behind an agent's LLM; a TieredLLM's own model name is only its tier label"""
+    tiers = getattr(llm, "tiers", None)
+    if tiers:
+        from src.agents.model_tiers import CASCADE_ENABLED
+        return {
+            "mode": llm.mode,
+            "cascade": CASCADE_ENABLED,
+            "models": {tier: [tier_llm.model, tier_llm.temperature] for tier, tier_llm in sorted(tiers.items())}
+        }
+    return {"model": str(getattr(llm, "model", llm)), "temperature": getattr(llm, "temperature", None)}
+
+
+def task_key(name: str, task, inputs: dict, upstream_keys: dict) -> str:
+    """Cache key for one task given the case inputs and its upstream tasks' keys"""
+    description = _template(task, "description")
+    expected_output = _template(task, "expected_output")
+    agent = task.agent
+    used_inputs = sorted(
+        set(PLACEHOLDER.findall(description + expected_output)) | set(COMMON_INPUTS) | set(TASK_INPUTS.get(name, ()))
+    )
+    material = {
+        "version": KEY_VERSION,
+        "task": name,
+        "description": description,
+        "expected_output": expected_output,
+        "agent": [agent.role, agent.goal, agent.backstory],
+        "llm": _llm_fingerprint(agent.llm),
+        "inputs": {key: _input_fingerprint(inputs.get(key)) for key in used_inputs},
+        "upstream": dict(sorted(upstream_keys.items()))
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class TaskCache:
+    def __init__(self, path: Path = TASK_CACHE_PATH, ttl_s: float = TASK_CACHE_TTL_S):
+        self.path = Path(path)
+        self.ttl_s = ttl_s
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS task_outputs ("
+            "key TEXT PRIMARY KEY, task TEXT, output TEXT NOT NULL, created_at REAL, hits INTEGER DEFAULT 0)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key: str):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT output FROM task_outputs WHERE key = ? AND created_at >= ?", (key, time.time() - self.ttl_s)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE task_outputs SET hits = hits + 1 WHERE key = ?", (key,))
+        return row[0]
+
+    def put(self, key: str, task_name: str, output: str):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO task_outputs (key, task, output, created_at) VALUES (?, ?, ?, ?)",
+            (key, task_name, output, time.time())
+        )
+
+    def purge(self) -> int:
+        return self._conn().execute(
+            "DELETE FROM task_outputs WHERE created_at < ?", (time.time() - self.ttl_s,)
+        ).rowcount
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_task_cache():
+    """Process-wide task cache, or None when TASK_CACHE=off"""
+    global _cache
+    if not TASK_CACHE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = TaskCache()
+            _cache.purge()
+        return _cache
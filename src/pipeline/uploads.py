@@ -0,0 +1,355 @@
+"""
+Upload ingestion: chunked, content-addressed storage plus background pre-parsing.
+
+Uploads are streamed to disk in UPLOAD_CHUNK_BYTES chunks and hashed (SHA-256)
+on the way, so large studies are never held in memory twice and identical
+files are stored once under uploads/objects/. The file type comes from its
+magic bytes, not the name the browser sent. As soon as a file is stored, the
+expensive first pass (DICOM/NIfTI header and pixel read, OCR / PDF text,
+ZIP study extraction, thumbnail) runs on a background thread and is cached
+next to the object, where the tools pick it up.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import threading
+import hashlib
+import zipfile
+import shutil
+import uuid
+import json
+import zlib
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "uploads"))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+UPLOAD_MAX_MB = float(os.getenv("UPLOAD_MAX_MB", "1024"))
+# Guard against zip bombs when unpacking DICOM studies
+UPLOAD_MAX_EXTRACTED_MB = float(os.getenv("UPLOAD_MAX_EXTRACTED_MB", "4096"))
+UPLOAD_PREPARSE_WORKERS = int(os.getenv("UPLOAD_PREPARSE_WORKERS", "2"))
+
+# Stored file extension per detected type (the tools dispatch on it)
+FILE_TYPES = {
+    "dicom": ".dcm",
+    "nifti": ".nii",
+    "nifti-gz": ".nii.gz",
+    "png": ".png",
+    "jpeg": ".jpg",
+    "pdf": ".pdf",
+    "zip": ".zip",
+    "text": ".txt"
+}
+
+# Which detected types each upload slot accepts
+ACCEPTED_TYPES = {
+    "image": {"dicom", "nifti", "nifti-gz", "png", "jpeg", "zip"},
+    "lab": {"pdf", "text", "png", "jpeg"}
+}
+
+
+class UploadError(ValueError):
+    """Upload rejected: unknown or disallowed type, oversized, or malformed archive"""
+
+
+# ---------------------- TYPE DETECTION ----------------------
+
+def _is_nifti_header(head: bytes) -> bool:
+    if len(head) < 348:
+        return False
+    sizeof_hdr = int.from_bytes(head[:4], "little")
+    swapped = int.from_bytes(head[:4], "big")
+    return 348 in (sizeof_hdr, swapped) and head[344:348] in (b"n+1\x00", b"ni1\x00")
+
+
+def _is_text(head: bytes, complete: bool) -> bool:
+    if b"\x00" in head:
+        return False
+    try:
+        head.decode("utf-8")
+        return True
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut at the chunk boundary is still text
+        return not complete and e.start >= len(head) - 3
+
+
+def detect_type(head: bytes, complete: bool = False):
+    """File type from the first bytes of a file, or None if it isn't one we accept"""
+    if len(head) >= 132 and head[128:132] == b"DICM":
+        return "dicom"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"%PDF-"):
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        return "zip"
+    if _is_nifti_header(head):
+        return "nifti"
+    if head.startswith(b"\x1f\x8b"):
+        try:
+            inner = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(head, 348)
+        except zlib.error:
+            return None
+        return "nifti-gz" if _is_nifti_header(inner) else None
+    if head and _is_text(head, complete):
+        return "text"
+    return None
+
+
+# ---------------------- STORAGE ----------------------
+
+def _object_path(digest: str, file_type: str) -> Path:
+    return UPLOAD_DIR / "objects" / digest[:2] / f"{digest}{FILE_TYPES[file_type]}"
+
+
+def _read_chunks(source):
+    """Chunks from a file-like object (Streamlit UploadedFile, open file) or an iterable of bytes"""
+    if hasattr(source, "read"):
+        if hasattr(source, "seek"):
+            source.seek(0)
+        while True:
+            chunk = source.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        yield from source
+
+
+def ingest_upload(source, kind: str, filename: str = "") -> dict:
+    """
+    Store an upload and schedule its pre-parse.
+
+    Args:
+        source: file-like object or iterable of byte chunks
+        kind: 'image' (scan/study) or 'lab' (lab report)
+        filename: original name, kept for display only
+
+    Returns:
+        dict: sha256, path, type, size, original_name and whether the content
+        was already stored (deduplicated)
+    """
+    tmp_dir = UPLOAD_DIR / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = tmp_dir / f"{uuid.uuid4().hex}.part"
+    max_bytes = UPLOAD_MAX_MB * 1024 * 1024
+
+    digest = hashlib.sha256()
+    size = 0
+    file_type = None
+    try:
+        with open(tmp_path, "wb") as out:
+            head = b""
+            for chunk in _read_chunks(source):
+                if file_type is None:
+                    # Sniff the type before writing more than the first chunk
+                    head += chunk
+                    if len(head) < 348:
+                        continue
+                    chunk, head = head, b""
+                    file_type = _check_type(chunk, kind, complete=False)
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadError(f"Upload exceeds the {UPLOAD_MAX_MB:.0f} MB limit")
+                digest.update(chunk)
+                out.write(chunk)
+            if file_type is None:
+                file_type = _check_type(head, kind, complete=True)
+                size += len(head)
+                digest.update(head)
+                out.write(head)
+
+        if file_type == "zip":
+            _check_zip(tmp_path)
+
+        sha256 = digest.hexdigest()
+        path = _object_path(sha256, file_type)
+        deduplicated = path.exists()
+        if deduplicated:
+            tmp_path.unlink()
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    upload = {
+        "sha256": sha256,
+        "path": str(path),
+        "type": file_type,
+        "kind": kind,
+        "size": size,
+        "original_name": filename,
+        "deduplicated": deduplicated
+    }
+    schedule_preparse(upload)
+    return upload
+
+
+def _check_zip(path: Path):
+    """Reject archives without a DICOM member (reads the central directory and a few member headers)"""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.infolist():
+                if member.is_dir():
+                    continue
+                with archive.open(member) as f:
+                    if f.read(132)[128:132] == b"DICM":
+                        return
+    except zipfile.BadZipFile as e:
+        raise UploadError(f"Corrupt ZIP archive: {e}")
+    raise UploadError("ZIP contains no DICOM files")
+
+
+def _check_type(head: bytes, kind: str, complete: bool) -> str:
+    file_type = detect_type(head, complete)
+    if file_type is None:
+        raise UploadError("Unrecognised file type")
+    if file_type not in ACCEPTED_TYPES[kind]:
+        raise UploadError(f"A {file_type} file is not accepted as a {kind} upload")
+    return file_type
+
+
+# ---------------------- BACKGROUND PRE-PARSE ----------------------
+
+_executor = ThreadPoolExecutor(max_workers=UPLOAD_PREPARSE_WORKERS, thread_name_prefix="preparse")
+_jobs = {}
+_jobs_lock = threading.Lock()
+_sidecar_lock = threading.Lock()
+
+
+def _sidecar(path: Path) -> Path:
+    from src.tools.data_tools import PREPARSE_SUFFIX
+    return path.with_name(path.name + PREPARSE_SUFFIX)
+
+
+def _read_sidecar(path: Path) -> dict:
+    sidecar = _sidecar(path)
+    return json.loads(sidecar.read_text(encoding="utf-8")) if sidecar.exists() else {}
+
+
+def schedule_preparse(upload: dict):
+    """Start pre-parsing an upload once per process; already pre-parsed objects are skipped"""
+    key = (upload["sha256"], upload["kind"])
+    with _jobs_lock:
+        if key in _jobs:
+            return _jobs[key]
+        if preparse_ready(upload):
+            return None
+        _jobs[key] = _executor.submit(_preparse, upload)
+        return _jobs[key]
+
+
+def wait_for_preparse(upload: dict, timeout: float = None) -> dict:
+    """Block until the upload's pre-parse is done (or timeout); returns the cached results"""
+    with _jobs_lock:
+        job = _jobs.get((upload["sha256"], upload["kind"]))
+    if job is not None:
+        job.result(timeout=timeout)
+    return _read_sidecar(Path(upload["path"]))
+
+
+def preparse_ready(upload: dict) -> bool:
+    # The same bytes can be uploaded as a scan and as a lab report; each kind is pre-parsed once
+    return upload["kind"] in _read_sidecar(Path(upload["path"])).get("kinds", [])
+
+
+def preparse_results(upload: dict) -> dict:
+    """Non-blocking: the cached results if this upload's pre-parse has finished, else {}"""
+    results = _read_sidecar(Path(upload["path"]))
+    return results if upload["kind"] in results.get("kinds", []) else {}
+
+
+def analysis_path(upload: dict, timeout: float = None) -> str:
+    """Path the pipeline should analyse: the object itself, or the representative slice of a DICOM ZIP"""
+    if upload["type"] != "zip":
+        return upload["path"]
+    return wait_for_preparse(upload, timeout).get("analysis_path", upload["path"])
+
+
+def _extract_dicom_study(path: Path, out_dir: Path) -> str:
+    """Unpack the DICOM members of a ZIP (streamed, renamed to avoid zip-slip); returns the middle slice"""
+    import pydicom
+
+    max_bytes = UPLOAD_MAX_EXTRACTED_MB * 1024 * 1024
+    extracted = 0
+    slices = []
+    shutil.rmtree(out_dir, ignore_errors=True)
+    out_dir.mkdir(parents=True)
+    with zipfile.ZipFile(path) as archive:
+        for index, member in enumerate(m for m in archive.infolist() if not m.is_dir()):
+            extracted += member.file_size
+            if extracted > max_bytes:
+                raise UploadError(f"Study unpacks to more than {UPLOAD_MAX_EXTRACTED_MB:.0f} MB")
+            with archive.open(member) as src:
+                head = src.read(132)
+                if head[128:132] != b"DICM":
+                    continue
+                target = out_dir / f"{index:05d}.dcm"
+                with open(target, "wb") as dst:
+                    dst.write(head)
+                    shutil.copyfileobj(src, dst, UPLOAD_CHUNK_BYTES)
+            header = pydicom.dcmread(str(target), stop_before_pixels=True)
+            slices.append((str(getattr(header, "SeriesInstanceUID", "")),
+                           int(getattr(header, "InstanceNumber", 0) or 0), target))
+
+    if not slices:
+        raise UploadError("ZIP contains no DICOM files")
+    # Middle slice of the largest series
+    series = {}
+    for uid, number, target in slices:
+        series.setdefault(uid, []).append((number, target))
+    largest = sorted(max(series.values(), key=len))
+    return str(largest[len(largest) // 2][1])
+
+
+def _preparse(upload: dict):
+    """First pass over an upload; results land in a sidecar JSON the tools read"""
+    from src.tools.data_tools import ExtractLabTextTool, ParseMedicalImageTool
+    from src.tools.image_prep import preprocess_image
+
+    path = Path(upload["path"])
+    file_type = upload["type"]
+    result = {"type": file_type}
+    try:
+        if upload["kind"] == "image":
+            target = path
+            if file_type == "zip":
+                target = Path(_extract_dicom_study(path, path.with_name(path.stem + ".study")))
+                result["analysis_path"] = str(target)
+            result[ParseMedicalImageTool().name] = ParseMedicalImageTool()._run(str(target))
+            if target != path:
+                # The pipeline is handed the slice, so cache the parse next to it too
+                _write_sidecar(target, {ParseMedicalImageTool().name: result[ParseMedicalImageTool().name]}, "image")
+            # Windowed pyramid for previews and vision models; its smallest level is the thumbnail
+            levels = preprocess_image(target)["levels"]
+            result["pyramid"] = levels
+            result["thumbnail"] = levels[min(levels, key=int)]
+        else:
+            result[ExtractLabTextTool().name] = ExtractLabTextTool()._run(str(path))
+            if file_type in ("png", "jpeg"):
+                levels = preprocess_image(path)["levels"]
+                result["thumbnail"] = levels[min(levels, key=int)]
+    except Exception as e:
+        # Pre-parsing is only an optimisation; the tools will redo the work and report errors
+        result[f"{upload['kind']}_error"] = str(e)
+        print(f"⚠️ Pre-parse failed for {upload.get('original_name') or path.name}: {e}")
+
+    return _write_sidecar(path, result, upload["kind"])
+
+
+def _write_sidecar(path: Path, result: dict, kind: str) -> dict:
+    """Merge one kind's pre-parse results into the sidecar (atomic replace)"""
+    with _sidecar_lock:
+        merged = _read_sidecar(path)
+        merged.update(result)
+        merged["kinds"] = sorted(set(merged.get("kinds", [])) | {kind})
+        sidecar = _sidecar(path)
+        tmp = sidecar.with_name(sidecar.name + ".tmp")
+        tmp.write_text(json.dumps(merged, indent=2), encoding="utf-8")
+        os.replace(tmp, sidecar)
+    return merged
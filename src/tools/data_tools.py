@@ -2,23 +2,53 @@ from crewai.tools import BaseTool
 from typing import Type
 from pydantic import BaseModel, Field
 from pathlib import Path
-from PIL import Image
-import pytesseract
-import pdfplumber
-import cv2
-import pydicom
-import nibabel as nib
-from Bio import Entrez
-from transformers import AutoTokenizer, AutoModelForCausalLM, AutoModelForSequenceClassification
-import torch
-import os
 from dotenv import load_dotenv
+from src.tools.tool_memo import memoized
+
+# Heavy dependencies (OCR, imaging, NCBI client, transformers/torch) are imported
+# inside each tool's _run so that importing the agents stays cheap.
 
 load_dotenv()
-Entrez.email = os.getenv("PUBMED_EMAIL", "your_email@example.com")
+
+BIOGPT_MODEL = "microsoft/BioGPT"
+CLINICAL_BERT_MODEL = "emilyalsentzer/Bio_ClinicalBERT"
+
+# Uploads are pre-parsed in the background (src/pipeline/uploads.py); results sit next to the file
+PREPARSE_SUFFIX = ".preparsed.json"
+
+def _preparsed_output(file_path: str, tool_name: str):
+    """Cached output of a tool for an upload, if its background pre-parse succeeded"""
+    sidecar = Path(file_path + PREPARSE_SUFFIX)
+    if not sidecar.exists():
+        return None
+    try:
+        import json
+        output = json.loads(sidecar.read_text(encoding='utf-8')).get(tool_name)
+    except (OSError, ValueError):
+        return None
+    return output if output and not output.startswith("Error") else None
 
 # ---------------------- LAB REPORT TOOL ----------------------
 
+def read_lab_report(path: Path) -> str:
+    """Full text of a lab report (PDF, TXT, or an image through OCR)"""
+    ext = path.suffix.lower()
+    if ext == ".pdf":
+        import pdfplumber
+        with pdfplumber.open(str(path)) as pdf:
+            text = "\n".join(page.extract_text() for page in pdf.pages if page.extract_text())
+            return text or "No text found in PDF"
+    elif ext == ".txt":
+        return path.read_text(encoding='utf-8')
+    elif ext in [".png", ".jpg", ".jpeg"]:
+        from PIL import Image
+        import pytesseract
+        image = Image.open(str(path))
+        text = pytesseract.image_to_string(image)
+        return text or "No text detected in image"
+    else:
+        return f"Unsupported format: {ext}"
+
 class ExtractLabTextInput(BaseModel):
     file_path: str = Field(..., description="Path to the lab report file")
 
@@ -27,23 +57,15 @@ class ExtractLabTextTool(BaseTool):
     description: str = "Extracts text from lab reports in PDF, TXT, or image formats using OCR."
     args_schema: Type[BaseModel] = ExtractLabTextInput
 
+    @memoized
     def _run(self, file_path: str) -> str:
+        # Long reports are handed to the agent as a digest (tiktoken loads on first use)
+        from src.tools.digest import condense
+        cached = _preparsed_output(file_path, self.name)
+        if cached:
+            return condense(cached, "lab report")
         try:
-            path = Path(file_path)
-            ext = path.suffix.lower()
-
-            if ext == ".pdf":
-                with pdfplumber.open(str(path)) as pdf:
-                    text = "\n".join(page.extract_text() for page in pdf.pages if page.extract_text())
-                    return text or "No text found in PDF"
-            elif ext == ".txt":
-                return path.read_text(encoding='utf-8')
-            elif ext in [".png", ".jpg", ".jpeg"]:
-                image = Image.open(str(path))
-                text = pytesseract.image_to_string(image)
-                return text or "No text detected in image"
-            else:
-                return f"Unsupported format: {ext}"
+            return condense(read_lab_report(Path(file_path)), "lab report")
         except Exception as e:
             return f"Error extracting lab text: {str(e)}"
 
@@ -54,23 +76,30 @@ class ParseMedicalImageInput(BaseModel):
 
 class ParseMedicalImageTool(BaseTool):
     name: str = "Parse Medical Image"
-    description: str = "Parses DICOM (.dcm), NIfTI (.nii), or standard images (.png/.jpg)."
+    description: str = "Parses DICOM (.dcm), NIfTI (.nii/.nii.gz), or standard images (.png/.jpg)."
     args_schema: Type[BaseModel] = ParseMedicalImageInput
 
+    @memoized
     def _run(self, file_path: str) -> str:
+        cached = _preparsed_output(file_path, self.name)
+        if cached:
+            return cached
         try:
             path = Path(file_path)
-            ext = path.suffix.lower()
+            ext = ".nii" if path.name.lower().endswith(".nii.gz") else path.suffix.lower()
 
             if ext == ".dcm":
+                import pydicom
                 ds = pydicom.dcmread(str(path))
                 pixel_array = ds.pixel_array
                 return f"DICOM loaded. Shape: {pixel_array.shape}, Type: {pixel_array.dtype}, Patient ID: {getattr(ds, 'PatientID', 'N/A')}"
             elif ext == ".nii":
+                import nibabel as nib
                 img = nib.load(str(path))
                 data = img.get_fdata()
                 return f"NIfTI loaded. Shape: {data.shape}, Type: {data.dtype}, Affine: {img.affine.shape}"
             elif ext in [".png", ".jpg", ".jpeg"]:
+                import cv2
                 img_array = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
                 if img_array is None:
                     return "Error reading image"
@@ -86,56 +115,107 @@ class SearchPubMedInput(BaseModel):
     topic: str = Field(..., description="Medical topic to search for")
     max_results: int = Field(default=5, description="Max number of results")
 
+# Candidates fetched per requested result when the dense index can rerank them
+RERANK_CANDIDATES = 4
+
+def _format_articles(articles: list, scores: dict = None) -> str:
+    summaries = []
+    for i, article in enumerate(articles, 1):
+        authors = ", ".join(article["authors"][:3]) or "Unknown authors"
+        summary = (f"{i}. {article['title']}\n   Authors: {authors}\n"
+                   f"   Date: {article['pub_date'] or 'Unknown date'}\n   PMID: {article['pmid']}")
+        if scores:
+            summary += f"\n   Similarity: {scores[int(article['pmid'])]:.2f}"
+        summaries.append(summary)
+    return "\n\n".join(summaries)
+
 class SearchPubMedTool(BaseTool):
     name: str = "Search PubMed"
     description: str = "Searches PubMed for recent studies on a medical topic."
     args_schema: Type[BaseModel] = SearchPubMedInput
 
+    @memoized
     def _run(self, topic: str, max_results: int = 5) -> str:
         try:
             from datetime import datetime
+            from src.tools.pubmed_index import search_index
+            from src.tools.dense_index import get_dense_index, rerank_articles
             year = datetime.now().year
-            handle = Entrez.esearch(db="pubmed", term=f"{topic} AND {year}[PDAT]", retmax=max_results)
-            record = Entrez.read(handle)
-            handle.close()
-
-            ids = record["IdList"]
-            if not ids:
-                return f"No recent studies found for '{topic}'"
+            # Over-fetch keyword hits so the dense index can pick the closest ones
+            limit = max_results * RERANK_CANDIDATES if get_dense_index() is not None else max_results
+
+            # Offline index first; the live API only on a miss
+            articles = search_index(topic, year=year, limit=limit)
+            if not articles:
+                from src.tools.ncbi_client import get_ncbi_client
+                client = get_ncbi_client()
+                ids = client.esearch(f"{topic} AND {year}[PDAT]", retmax=limit)
+                if not ids:
+                    return f"No recent studies found for '{topic}'"
+                articles = [
+                    {
+                        "pmid": summary["uid"],
+                        "title": summary.get("title", "No title"),
+                        "authors": [a["name"] for a in summary.get("authors", [])],
+                        "pub_date": summary.get("pubdate", "Unknown date")
+                    }
+                    for summary in client.esummary(ids)
+                ]
+
+            if len(articles) > max_results:
+                articles = rerank_articles(topic, articles)
+            return _format_articles(articles[:max_results])
+        except Exception as e:
+            return f"Error searching PubMed: {str(e)}"
 
-            summaries = []
-            for i, pubmed_id in enumerate(ids, 1):
-                summary_handle = Entrez.esummary(db="pubmed", id=pubmed_id)
-                summary = Entrez.read(summary_handle)[0]
-                summary_handle.close()
+# ---------------------- SEMANTIC LITERATURE SEARCH TOOL ----------------------
 
-                title = summary.get("Title", "No title")
-                authors = ", ".join(summary.get("AuthorList", [])[:3]) or "Unknown authors"
-                pub_date = summary.get("PubDate", "Unknown date")
+class SemanticPubMedInput(BaseModel):
+    query: str = Field(..., description="Symptoms, findings or clinical question to match against abstracts")
+    max_results: int = Field(default=5, description="Max number of results")
 
-                summaries.append(f"{i}. {title}\n   Authors: {authors}\n   Date: {pub_date}\n   PMID: {pubmed_id}")
+class SemanticPubMedSearchTool(BaseTool):
+    name: str = "Find Similar Studies"
+    description: str = (
+        "Finds cached PubMed abstracts closest in meaning to a description of symptoms or findings, "
+        "even when they use different wording."
+    )
+    args_schema: Type[BaseModel] = SemanticPubMedInput
 
-            return "\n\n".join(summaries)
+    @memoized
+    def _run(self, query: str, max_results: int = 5) -> str:
+        try:
+            from src.tools.dense_index import get_dense_index, semantic_search
+            from src.tools.pubmed_index import fetch_articles
+            if get_dense_index() is None:
+                return "Semantic literature index is not available - use Search PubMed instead"
+
+            hits = semantic_search(query, k=max_results)
+            articles = fetch_articles([pmid for pmid, _ in hits])
+            if not articles:
+                return f"No similar studies found for '{query}'"
+            return _format_articles(articles, scores=dict(hits))
         except Exception as e:
-            return f"Error searching PubMed: {str(e)}"
+            return f"Error searching similar studies: {str(e)}"
 
 # ---------------------- BIOGPT TOOL ----------------------
 
 class BioGPTInput(BaseModel):
     question: str = Field(..., description="Biomedical question")
+    max_new_tokens: int = Field(default=150, description="Maximum number of tokens to generate")
 
 class BioGPTTool(BaseTool):
     name: str = "BioGPT Biomedical Q&A"
     description: str = "Answers biomedical questions using BioGPT."
     args_schema: Type[BaseModel] = BioGPTInput
 
-    def _run(self, question: str) -> str:
+    @memoized
+    def _run(self, question: str, max_new_tokens: int = 150) -> str:
         try:
-            tokenizer = AutoTokenizer.from_pretrained("microsoft/BioGPT")
-            model = AutoModelForCausalLM.from_pretrained("microsoft/BioGPT")
-            inputs = tokenizer(question, return_tensors="pt")
-            outputs = model.generate(**inputs, max_length=200)
-            return tokenizer.decode(outputs[0], skip_special_tokens=True)
+            # Shared worker batches concurrent questions from every session
+            from src.tools.generation_worker import get_generation_worker, GENERATION_TIMEOUT_S
+            request = get_generation_worker(BIOGPT_MODEL).submit(question, max_new_tokens)
+            return request.result(timeout=GENERATION_TIMEOUT_S)
         except Exception as e:
             return f"Error using BioGPT: {str(e)}"
 
@@ -149,12 +229,15 @@ class ClinicalBERTTool(BaseTool):
     description: str = "Classifies symptoms and urgency using ClinicalBERT."
     args_schema: Type[BaseModel] = ClinicalBERTInput
 
+    @memoized
     def _run(self, text: str) -> str:
         try:
-            tokenizer = AutoTokenizer.from_pretrained("emilyalsentzer/Bio_ClinicalBERT")
-            model = AutoModelForSequenceClassification.from_pretrained("emilyalsentzer/Bio_ClinicalBERT")
+            import torch
+            from src.tools.model_backends import load_sequence_classifier
+            tokenizer, model, _ = load_sequence_classifier(CLINICAL_BERT_MODEL)
             inputs = tokenizer(text, return_tensors="pt", truncation=True)
-            outputs = model(**inputs)
+            with torch.no_grad():
+                outputs = model(**inputs)
             logits = outputs.logits.detach().numpy()[0]
             predicted = logits.argmax()
             return f"Predicted class: {predicted}, Confidence: {logits[predicted]:.2f}"
@@ -166,5 +249,6 @@ class ClinicalBERTTool(BaseTool):
 extract_lab_text = ExtractLabTextTool()
 parse_medical_image = ParseMedicalImageTool()
 search_pubmed = SearchPubMedTool()
+semantic_pubmed = SemanticPubMedSearchTool()
 bio_gpt = BioGPTTool()
 clinical_bert = ClinicalBERTTool()
\ No newline at end of file
@@ -0,0 +1,350 @@
+"""
+Dense (embedding) retrieval over the abstracts in the offline PubMed index.
+
+    python -m src.tools.dense_index build --nlist 1024
+    python -m src.tools.dense_index search "fever, productive cough and pleuritic chest pain"
+
+Abstracts are embedded with a small CPU sentence-embedding model and stored as
+L2-normalised int8 (or float16) vectors in memory-mapped .npy files, so the
+index costs ~dim bytes per abstract and loads instantly. With --nlist the rows
+are grouped into IVF lists around spherical k-means centroids and a query only
+scans the DENSE_NPROBE closest lists.
+"""
+from pathlib import Path
+import threading
+import argparse
+import importlib.util
+import shutil
+import json
+import time
+import os
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ---------------------- CONFIGURATION ----------------------
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+DENSE_INDEX_DIR = Path(os.getenv("DENSE_INDEX_DIR", "pubmed_vectors"))
+# int8 (1 byte/dim + a per-row scale) or float16
+DENSE_INDEX_DTYPE = os.getenv("DENSE_INDEX_DTYPE", "int8")
+# IVF lists scanned per query; ignored for flat indexes
+DENSE_NPROBE = int(os.getenv("DENSE_NPROBE", "16"))
+
+SCAN_CHUNK_ROWS = 16384
+EMBED_BATCH_SIZE = 256
+KMEANS_SAMPLES_PER_LIST = 64
+KMEANS_ITERATIONS = 10
+
+_model = None
+_model_lock = threading.Lock()
+_index = None
+_index_lock = threading.Lock()
+
+
+def embed_texts(texts: list) -> np.ndarray:
+    """L2-normalised float32 embeddings, one row per text"""
+    global _model
+    with _model_lock:
+        if _model is None:
+            from sentence_transformers import SentenceTransformer
+            _model = SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+    vectors = _model.encode(texts, batch_size=64, normalize_embeddings=True, convert_to_numpy=True)
+    return vectors.astype(np.float32)
+
+
+def _quantize(block: np.ndarray, dtype: str) -> tuple:
+    """(stored rows, per-row scales) - scales are None for float16"""
+    if dtype == "float16":
+        return block.astype(np.float16), None
+    scales = np.abs(block).max(axis=1) / 127
+    scales[scales == 0] = 1
+    return np.round(block / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+# ---------------------- BUILD ----------------------
+
+def _nearest_lists(block: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    return (block @ centroids.T).argmax(axis=1)
+
+
+def _train_ivf(vectors, nlist: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of the vectors; returns normalised centroids"""
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample = np.sort(rng.choice(n, min(n, nlist * KMEANS_SAMPLES_PER_LIST), replace=False))
+    data = np.asarray(vectors[sample], dtype=np.float32)
+    centroids = data[rng.choice(len(data), nlist, replace=False)]
+
+    for _ in range(KMEANS_ITERATIONS):
+        assign = _nearest_lists(data, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        empty = np.bincount(assign, minlength=nlist) == 0
+        # Re-seed empty lists from random points so every list stays in use
+        sums[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+        centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+    return centroids
+
+
+def build_index(pmids, years, vectors, out_dir: Path = None, dtype: str = DENSE_INDEX_DTYPE,
+                nlist: int = 0, model: str = EMBEDDING_MODEL) -> Path:
+    """
+    Write a dense index from normalised float vectors (an array or a memmap).
+
+    The index is built next to out_dir and swapped in at the end, so processes
+    still mapping the old files are not disturbed.
+    """
+    out_dir = Path(out_dir or DENSE_INDEX_DIR)
+    building = out_dir.with_name(out_dir.name + ".building")
+    shutil.rmtree(building, ignore_errors=True)
+    building.mkdir(parents=True)
+
+    n, dim = vectors.shape
+    pmids = np.asarray(pmids, dtype=np.int64)
+    years = np.asarray(years, dtype=np.int16)
+    order = np.arange(n)
+    if nlist:
+        centroids = _train_ivf(vectors, nlist)
+        lists = np.concatenate([
+            _nearest_lists(np.asarray(vectors[start:start + SCAN_CHUNK_ROWS], dtype=np.float32), centroids)
+            for start in range(0, n, SCAN_CHUNK_ROWS)
+        ])
+        order = np.argsort(lists, kind="stable")
+        np.save(building / "centroids.npy", centroids.astype(np.float32))
+        np.save(building / "offsets.npy", np.concatenate([[0], np.cumsum(np.bincount(lists, minlength=nlist))]))
+
+    stored = np.lib.format.open_memmap(building / "vectors.npy", mode="w+",
+                                       dtype=np.int8 if dtype == "int8" else np.float16, shape=(n, dim))
+    scales = np.empty(n, dtype=np.float32)
+    for start in range(0, n, SCAN_CHUNK_ROWS):
+        rows = order[start:start + SCAN_CHUNK_ROWS]
+        block, block_scales = _quantize(np.asarray(vectors[rows], dtype=np.float32), dtype)
+        stored[start:start + len(rows)] = block
+        if block_scales is not None:
+            scales[start:start + len(rows)] = block_scales
+    stored.flush()
+    del stored
+
+    if dtype == "int8":
+        np.save(building / "scales.npy", scales)
+    np.save(building / "pmids.npy", pmids[order])
+    np.save(building / "years.npy", years[order])
+    meta = {"model": model, "dtype": dtype, "dim": dim, "count": n, "nlist": nlist}
+    (building / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+    old = out_dir.with_name(out_dir.name + ".old")
+    if out_dir.exists():
+        out_dir.rename(old)
+    building.rename(out_dir)
+    shutil.rmtree(old, ignore_errors=True)
+    return out_dir
+
+
+def build_from_pubmed_index(index_path: Path = None, out_dir: Path = None, dtype: str = DENSE_INDEX_DTYPE,
+                            nlist: int = 0) -> dict:
+    """
+    Embed every abstract in the offline PubMed index and build the dense index.
+
+    Vectors already in the current dense index (same embedding model) are
+    reused, so after ingesting an update file only new citations are embedded.
+    """
+    import sqlite3
+    from src.tools.pubmed_index import PUBMED_INDEX_PATH
+
+    out_dir = Path(out_dir or DENSE_INDEX_DIR)
+    existing = DenseIndex.load(out_dir)
+    if existing is not None and existing.meta["model"] != EMBEDDING_MODEL:
+        existing = None
+
+    conn = sqlite3.connect(str(index_path or PUBMED_INDEX_PATH))
+    try:
+        count = conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+        rows = conn.execute("SELECT pmid, pub_year, title, abstract FROM articles ORDER BY pmid")
+        pmids = np.empty(count, dtype=np.int64)
+        years = np.zeros(count, dtype=np.int16)
+        raw = None
+        raw_path = out_dir.with_name(out_dir.name + ".raw.npy")
+        embedded = reused = 0
+
+        while True:
+            batch = rows.fetchmany(EMBED_BATCH_SIZE)
+            if not batch:
+                break
+            start = embedded + reused
+            batch_pmids = np.array([row[0] for row in batch], dtype=np.int64)
+            pmids[start:start + len(batch)] = batch_pmids
+            years[start:start + len(batch)] = [row[1] or 0 for row in batch]
+
+            known = existing.rows_for(batch_pmids) if existing is not None else np.full(len(batch), -1)
+            missing = np.flatnonzero(known < 0)
+            parts = []
+            if len(missing):
+                parts.append((missing, embed_texts([f"{batch[i][2]}. {batch[i][3] or ''}" for i in missing])))
+            if len(missing) < len(batch):
+                parts.append((np.flatnonzero(known >= 0), existing.vectors(known[known >= 0])))
+            block = np.empty((len(batch), parts[0][1].shape[1]), dtype=np.float32)
+            for positions, vectors in parts:
+                block[positions] = vectors
+
+            if raw is None:
+                # Staged as float16 on disk so 1M+ abstracts never sit in RAM at once
+                raw = np.lib.format.open_memmap(raw_path, mode="w+", dtype=np.float16, shape=(count, block.shape[1]))
+            raw[start:start + len(batch)] = block
+            embedded += len(missing)
+            reused += len(batch) - len(missing)
+    finally:
+        conn.close()
+
+    if raw is None:
+        return {"count": 0, "embedded": 0, "reused": 0}
+    existing = None
+    build_index(pmids, years, raw, out_dir, dtype=dtype, nlist=nlist)
+    del raw
+    raw_path.unlink()
+    _reset_cache()
+    return {"count": count, "embedded": embedded, "reused": reused}
+
+
+# ---------------------- SEARCH ----------------------
+
+class DenseIndex:
+    """Memory-mapped dense index; rows are stored in IVF-list order when nlist > 0"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+        self._stored = np.load(self.path / "vectors.npy", mmap_mode="r")
+        self.scales = np.load(self.path / "scales.npy") if self.meta["dtype"] == "int8" else None
+        self.pmids = np.load(self.path / "pmids.npy")
+        self.years = np.load(self.path / "years.npy")
+        self.centroids = np.load(self.path / "centroids.npy") if self.meta["nlist"] else None
+        self.offsets = np.load(self.path / "offsets.npy") if self.meta["nlist"] else None
+        self._by_pmid = np.argsort(self.pmids)
+        self._sorted_pmids = self.pmids[self._by_pmid]
+
+    @classmethod
+    def load(cls, path: Path = None):
+        path = Path(path or DENSE_INDEX_DIR)
+        return cls(path) if (path / "meta.json").exists() else None
+
+    def __len__(self) -> int:
+        return self.meta["count"]
+
+    def rows_for(self, pmids) -> np.ndarray:
+        """Row of each pmid, -1 where it isn't indexed"""
+        pmids = np.asarray(pmids, dtype=np.int64)
+        positions = np.clip(np.searchsorted(self._sorted_pmids, pmids), 0, len(self._sorted_pmids) - 1)
+        rows = self._by_pmid[positions]
+        return np.where(self.pmids[rows] == pmids, rows, -1)
+
+    def vectors(self, rows) -> np.ndarray:
+        block = np.asarray(self._stored[rows], dtype=np.float32)
+        return block * self.scales[rows, None] if self.scales is not None else block
+
+    def _scores(self, query: np.ndarray, start: int, stop: int, year: int = None) -> np.ndarray:
+        scores = np.asarray(self._stored[start:stop], dtype=np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales[start:stop]
+        if year is not None:
+            scores[self.years[start:stop] != year] = -np.inf
+        return scores
+
+    def _ranges(self, query: np.ndarray, nprobe: int) -> list:
+        if self.centroids is None or nprobe >= len(self.centroids):
+            return [(0, len(self))]
+        probe = np.argpartition(-(self.centroids @ query), nprobe)[:nprobe]
+        return [(int(self.offsets[i]), int(self.offsets[i + 1])) for i in probe]
+
+    def search(self, query: np.ndarray, k: int = 5, nprobe: int = DENSE_NPROBE, year: int = None) -> list:
+        """[(pmid, cosine similarity)] of the k nearest abstracts"""
+        best_rows, best_scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        for start, stop in self._ranges(query, nprobe):
+            for chunk in range(start, stop, SCAN_CHUNK_ROWS):
+                end = min(chunk + SCAN_CHUNK_ROWS, stop)
+                scores = self._scores(query, chunk, end, year)
+                top = np.argpartition(-scores, k)[:k] if len(scores) > k else np.arange(len(scores))
+                best_rows = np.concatenate([best_rows, top + chunk])
+                best_scores = np.concatenate([best_scores, scores[top]])
+                keep = np.argsort(-best_scores)[:k]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+        return [(int(self.pmids[row]), float(score))
+                for row, score in zip(best_rows, best_scores) if np.isfinite(score)]
+
+    def rerank(self, query: np.ndarray, pmids) -> list:
+        """[(pmid, similarity)] for the indexed pmids, most similar first"""
+        rows = self.rows_for(pmids)
+        rows = rows[rows >= 0]
+        scores = self.vectors(rows) @ query
+        order = np.argsort(-scores)
+        return [(int(self.pmids[rows[i]]), float(scores[i])) for i in order]
+
+
+def _reset_cache():
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def get_dense_index():
+    """Process-wide dense index, or None when it hasn't been built or no embedding model is installed"""
+    global _index
+    with _index_lock:
+        if _index is None and importlib.util.find_spec("sentence_transformers") is not None:
+            _index = DenseIndex.load()
+        return _index
+
+
+def semantic_search(text: str, k: int = 5, year: int = None) -> list:
+    index = get_dense_index()
+    if index is None:
+        return []
+    return index.search(embed_texts([text])[0], k=k, year=year)
+
+
+def rerank_articles(text: str, articles: list) -> list:
+    """Order article dicts (with 'pmid') by similarity to text; unindexed ones keep their order at the end"""
+    index = get_dense_index()
+    if index is None or not articles:
+        return articles
+    ranked = [str(pmid) for pmid, _ in index.rerank(embed_texts([text])[0], [int(a["pmid"]) for a in articles])]
+    by_pmid = {str(a["pmid"]): a for a in articles}
+    ranked_set = set(ranked)
+    return [by_pmid[pmid] for pmid in ranked] + [a for a in articles if str(a["pmid"]) not in ranked_set]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dense retrieval index over cached PubMed abstracts")
+    parser.add_argument("--dir", type=Path, default=DENSE_INDEX_DIR, help="Dense index directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Embed the offline PubMed index")
+    build.add_argument("--pubmed-index", type=Path, help="SQLite index (default PUBMED_INDEX_PATH)")
+    build.add_argument("--dtype", choices=["int8", "float16"], default=DENSE_INDEX_DTYPE)
+    build.add_argument("--nlist", type=int, default=0, help="IVF lists (0 = flat; ~sqrt(N) * 4 for large corpora)")
+    search = commands.add_parser("search", help="Query the index")
+    search.add_argument("text")
+    search.add_argument("-k", type=int, default=5)
+    search.add_argument("--year", type=int)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        result = build_from_pubmed_index(args.pubmed_index, args.dir, args.dtype, args.nlist)
+        print(f"✅ {result['count']} abstracts ({result['embedded']} embedded, {result['reused']} reused) "
+              f"in {time.perf_counter() - start:.1f}s")
+    else:
+        index = DenseIndex.load(args.dir)
+        if index is None:
+            print(f"❌ No dense index at {args.dir}")
+            return
+        query = embed_texts([args.text])[0]
+        start = time.perf_counter()
+        hits = index.search(query, k=args.k, year=args.year)
+        print(f"{len(hits)} results in {(time.perf_counter() - start) * 1000:.1f} ms\n")
+        for pmid, score in hits:
+            print(f"{pmid}  {score:.3f}")
+
+
+if __name__ == "__main__":
+    main()
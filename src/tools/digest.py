@@ -0,0 +1,236 @@
+"""
+Map-reduce digests of oversized tool output.
+
+A 60-page lab packet is too long to hand an agent verbatim: it blows the prompt
+budget and every ReAct step re-reads it. Text over DIGEST_THRESHOLD_TOKENS is
+split into token-bounded chunks on line boundaries, the chunks are summarized in
+parallel on the fast tier, and the summaries are reduced (recursively, if
+needed) into one digest. Abnormal results are copied from the original text
+verbatim rather than left to the model, so no flagged value is paraphrased or
+dropped. Digests are cached by content hash.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import threading
+import hashlib
+import sqlite3
+import time
+import re
+import os
+from dotenv import load_dotenv
+from src.tasks.prompt_budget import count_tokens
+
+load_dotenv()
+
+DIGEST_THRESHOLD_TOKENS = int(os.getenv("DIGEST_THRESHOLD_TOKENS", "3000"))
+DIGEST_CHUNK_TOKENS = int(os.getenv("DIGEST_CHUNK_TOKENS", "2000"))
+DIGEST_WORKERS = int(os.getenv("DIGEST_WORKERS", "4"))
+DIGEST_CACHE_PATH = Path(os.getenv("DIGEST_CACHE_PATH", "digest_cache.db"))
+# Bump when the prompts or the digest layout change so old digests stop matching
+DIGEST_VERSION = 2
+
+# Flag-column tokens (case-sensitive: "L" is a flag, "Low Density" and "1.5 L" of urine are not)
+FLAG_TOKENS = {"H", "L", "HH", "LL", "HI", "LO", "HIGH", "LOW", "*", "↑", "↓"}
+NUMBER = re.compile(r"[<>≤≥]?-?\d+(?:\.\d+)?")
+# A flag written onto the value: "6.1*", "↑6.1"
+FLAGGED_NUMBER = re.compile(r"[*↑↓]+[<>≤≥]?-?\d+(?:\.\d+)?|[<>≤≥]?-?\d+(?:\.\d+)?[*↑↓]+")
+# Interpretation words, unless the line reports a negative result ("Non reactive", "Negative")
+ABNORMAL_WORDS = re.compile(r"\b(abnormal|critical|panic|positive|reactive|out of range)\b", re.IGNORECASE)
+NEGATIVE_RESULT = re.compile(r"\b(non[- ]?reactive|negative|not detected)\b", re.IGNORECASE)
+# "<value> ... <low>-<high>" on one line, for reports that only print the reference range
+VALUE_AND_RANGE = re.compile(
+    r"(?<![\w.])(-?\d+(?:\.\d+)?)(?![\w.]).*?(-?\d+(?:\.\d+)?)\s*[-–]\s*(-?\d+(?:\.\d+)?)\s*(?:\S+\s*)?$"
+)
+
+# Summaries are capped in length so a digest stays about the same size however long the report
+MAP_PROMPT = (
+    "You are condensing part {part} of {parts} of a patient's lab report for a physician. "
+    "In at most 15 lines, list the panels and tests it covers with their results and units, "
+    "the collection dates and any specimen notes. Do not interpret the results.\n\n{text}"
+)
+REDUCE_PROMPT = (
+    "Merge these partial summaries of one lab report into a single summary of at most 25 lines. "
+    "Keep the panels, the latest result of each test with its unit and the collection dates; "
+    "remove duplicates. Do not interpret the results.\n\n{text}"
+)
+
+
+def _has_flag_column(line: str) -> bool:
+    """A standalone flag token next to a value; never the line's first token, where footnote markers go"""
+    tokens = line.split()
+    for i, token in enumerate(tokens[1:], 1):
+        if FLAGGED_NUMBER.fullmatch(token):
+            return True
+        if token not in FLAG_TOKENS:
+            continue
+        after_value = NUMBER.fullmatch(tokens[i - 1]) is not None
+        before_value = i + 1 < len(tokens) and NUMBER.fullmatch(tokens[i + 1]) is not None
+        # "Urine volume 1.5 L": a trailing L after a value is the unit litres
+        if token == "L" and after_value and i == len(tokens) - 1:
+            continue
+        if after_value or before_value:
+            return True
+    return False
+
+
+def is_abnormal(line: str) -> bool:
+    """Whether a report line carries a flag or a value outside the range printed next to it"""
+    if _has_flag_column(line):
+        return True
+    if ABNORMAL_WORDS.search(line) and not NEGATIVE_RESULT.search(line) and any(ch.isdigit() for ch in line):
+        return True
+    match = VALUE_AND_RANGE.search(line)
+    if match:
+        value, low, high = (float(group) for group in match.groups())
+        return low < high and not low <= value <= high
+    return False
+
+
+def abnormal_lines(text: str) -> list:
+    """Abnormal result lines in report order, each kept once and verbatim"""
+    seen = set()
+    lines = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if line and line not in seen and is_abnormal(line):
+            seen.add(line)
+            lines.append(line)
+    return lines
+
+
+def split_chunks(text: str, max_tokens: int = DIGEST_CHUNK_TOKENS) -> list:
+    """Split on line boundaries into chunks of at most max_tokens (a single longer line is cut by characters)"""
+    chunks, current, size = [], [], 0
+    for line in text.splitlines():
+        tokens = count_tokens(line) + 1
+        if tokens > max_tokens:
+            # ~4 chars/token, with room for tokenizers that pack fewer
+            width = max_tokens * 3
+            pieces = [line[i:i + width] for i in range(0, len(line), width)]
+        else:
+            pieces = [line]
+        for piece in pieces:
+            tokens = count_tokens(piece) + 1
+            if current and size + tokens > max_tokens:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+# ---------------------- CACHE ----------------------
+
+class DigestCache:
+    def __init__(self, path: Path = DIGEST_CACHE_PATH):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS digests (key TEXT PRIMARY KEY, digest TEXT NOT NULL, created_at REAL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key: str):
+        row = self._conn().execute("SELECT digest FROM digests WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, digest: str):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO digests (key, digest, created_at) VALUES (?, ?, ?)", (key, digest, time.time())
+        )
+
+
+_cache = None
+_llm = None
+_init_lock = threading.Lock()
+
+
+def get_digest_cache() -> DigestCache:
+    global _cache
+    with _init_lock:
+        if _cache is None:
+            _cache = DigestCache()
+        return _cache
+
+
+def get_digest_llm():
+    """The LLM that writes chunk summaries (the 'digest' entry in AGENT_TIERS)"""
+    global _llm
+    with _init_lock:
+        if _llm is None:
+            from src.agents.model_tiers import agent_llm
+            _llm = agent_llm("digest")
+        return _llm
+
+
+# ---------------------- MAP-REDUCE ----------------------
+
+def _llm_label(llm) -> str:
+    tiers = getattr(llm, "tiers", None)
+    if tiers:
+        return llm.mode + ":" + ",".join(f"{tier}={tier_llm.model}" for tier, tier_llm in sorted(tiers.items()))
+    return str(getattr(llm, "model", llm))
+
+
+def _summarize(prompt: str) -> str:
+    return str(get_digest_llm().call([{"role": "user", "content": prompt}])).strip()
+
+
+def _reduce(summaries: list) -> str:
+    """Merge chunk summaries, in groups that fit one call, until a single summary is left"""
+    while len(summaries) > 1:
+        groups = split_chunks("\n\n".join(summaries), DIGEST_CHUNK_TOKENS)
+        if len(groups) >= len(summaries):
+            # Summaries too long to merge pairwise; keep them side by side
+            return "\n\n".join(summaries)
+        with ThreadPoolExecutor(max_workers=DIGEST_WORKERS) as pool:
+            summaries = list(pool.map(lambda group: _summarize(REDUCE_PROMPT.format(text=group)), groups))
+    return summaries[0]
+
+
+def digest_text(text: str, source: str = "report") -> str:
+    """Compact digest of a long text: abnormal lines verbatim, then a map-reduce summary"""
+    material = f"{DIGEST_VERSION}:{DIGEST_CHUNK_TOKENS}:{_llm_label(get_digest_llm())}:{text}"
+    key = hashlib.sha256(material.encode("utf-8")).hexdigest()
+    cache = get_digest_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    chunks = split_chunks(text)
+    with ThreadPoolExecutor(max_workers=DIGEST_WORKERS) as pool:
+        summaries = list(pool.map(
+            lambda item: _summarize(MAP_PROMPT.format(part=item[0], parts=len(chunks), text=item[1])),
+            enumerate(chunks, 1)
+        ))
+    summary = _reduce(summaries)
+
+    flagged = abnormal_lines(text)
+    digest = (
+        f"[Digest of a {count_tokens(text)}-token {source} in {len(chunks)} parts]\n\n"
+        f"ABNORMAL RESULTS (verbatim from the {source}):\n"
+        + ("\n".join(flagged) if flagged else "None flagged")
+        + f"\n\nSUMMARY:\n{summary}"
+    )
+    cache.put(key, digest)
+    return digest
+
+
+def condense(text: str, source: str = "report") -> str:
+    """Return text unchanged when it fits the budget, otherwise its digest (the full text if digesting fails)"""
+    if not text or count_tokens(text) <= DIGEST_THRESHOLD_TOKENS:
+        return text
+    try:
+        return digest_text(text, source)
+    except Exception as e:
+        print(f"⚠️ Could not digest {source}: {e}")
+        return text
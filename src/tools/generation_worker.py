@@ -0,0 +1,225 @@
+from collections import deque
+import threading
+import queue
+import time
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GENERATION_MAX_BATCH = int(os.getenv("GENERATION_MAX_BATCH", "8"))
+# How long the worker waits for more requests to arrive before starting a batch
+GENERATION_BATCH_WAIT_MS = int(os.getenv("GENERATION_BATCH_WAIT_MS", "15"))
+GENERATION_TIMEOUT_S = float(os.getenv("GENERATION_TIMEOUT_S", "300"))
+
+_STREAM_END = object()
+
+
+class GenerationRequest:
+    """A queued prompt; iterate it to stream text as it is generated, or call result()"""
+
+    def __init__(self, prompt: str, max_new_tokens: int):
+        self.prompt = prompt
+        self.max_new_tokens = max_new_tokens
+        self.prompt_ids = []
+        self.generated_ids = []
+        self.text = ""
+        self.error = None
+        self._streamed = ""
+        self.submitted_at = time.perf_counter()
+        self._chunks = queue.Queue()
+        self._done = threading.Event()
+
+    def __iter__(self):
+        while True:
+            chunk = self._chunks.get()
+            if chunk is _STREAM_END:
+                break
+            yield chunk
+        if self.error:
+            raise self.error
+
+    def result(self, timeout: float = None) -> str:
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Generation did not finish within {timeout}s")
+        if self.error:
+            raise self.error
+        return self.text
+
+    def _emit(self, text: str, final: bool = False):
+        # Hold back the trailing partial word: decoding a word-piece can rewrite it
+        stable = text if final else text[:text.rfind(" ") + 1]
+        if stable.startswith(self._streamed) and len(stable) > len(self._streamed):
+            self._chunks.put(stable[len(self._streamed):])
+            self._streamed = stable
+        self.text = text
+
+    def _finish(self, error: Exception = None):
+        self.error = error
+        self._chunks.put(_STREAM_END)
+        self._done.set()
+
+
+class GenerationWorker:
+    """
+    Single background thread that serves causal-LM generation for every session.
+
+    Queued prompts are grouped into batches (left-padded), prefilled once and then
+    decoded token by token reusing the KV cache. Each request stops at its own
+    max_new_tokens or at EOS, and finished rows are dropped from the batch and the
+    cache so the remaining ones decode faster. New requests join at the next batch.
+    """
+
+    def __init__(self, model_name: str, max_batch_size: int = GENERATION_MAX_BATCH,
+                 batch_wait_ms: int = GENERATION_BATCH_WAIT_MS):
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.batch_wait_s = batch_wait_ms / 1000
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._loop, name="generation-worker", daemon=True)
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "requests_completed": 0,
+            "requests_failed": 0,
+            "batches": 0,
+            "tokens_generated": 0,
+            "active_batch_size": 0,
+            "tokens_per_sec": 0.0
+        }
+        self._thread.start()
+
+    def submit(self, prompt: str, max_new_tokens: int = 150) -> GenerationRequest:
+        request = GenerationRequest(prompt, max_new_tokens)
+        with self._cond:
+            self._pending.append(request)
+            self._cond.notify()
+        return request
+
+    def get_metrics(self) -> dict:
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        with self._cond:
+            metrics["queue_depth"] = len(self._pending)
+        return metrics
+
+    # ---------------------- WORKER LOOP ----------------------
+
+    def _next_batch(self) -> list:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            # Give concurrent callers a moment to land in the same batch
+            deadline = time.perf_counter() + self.batch_wait_s
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [self._pending.popleft() for _ in range(min(self.max_batch_size, len(self._pending)))]
+
+    def _loop(self):
+        from src.tools.model_backends import load_causal_lm
+
+        tokenizer = model = None
+        while True:
+            batch = self._next_batch()
+            try:
+                if model is None:
+                    tokenizer, model, _ = load_causal_lm(self.model_name)
+                    tokenizer.padding_side = "left"
+                self._generate(tokenizer, model, batch)
+            except Exception as e:
+                with self._metrics_lock:
+                    self._metrics["requests_failed"] += sum(1 for r in batch if not r._done.is_set())
+                for request in batch:
+                    if not request._done.is_set():
+                        request._finish(e)
+
+    def _generate(self, tokenizer, model, batch: list):
+        import torch
+
+        start = time.perf_counter()
+        encoded = tokenizer([r.prompt for r in batch], return_tensors="pt", padding=True)
+        input_ids, attention_mask = encoded["input_ids"], encoded["attention_mask"]
+        for request, ids, mask in zip(batch, input_ids.tolist(), attention_mask.tolist()):
+            request.prompt_ids = [token for token, keep in zip(ids, mask) if keep]
+
+        eos_id = tokenizer.eos_token_id
+        active = list(batch)
+        past = None
+        tokens = 0
+        self._set_metric("active_batch_size", len(active))
+
+        with torch.no_grad():
+            while active:
+                outputs = model(input_ids=input_ids, attention_mask=attention_mask,
+                                past_key_values=past, use_cache=True)
+                past = outputs.past_key_values
+                next_tokens = outputs.logits[:, -1, :].argmax(dim=-1)
+
+                keep = []
+                for row, (request, token) in enumerate(zip(active, next_tokens.tolist())):
+                    finished = token == eos_id
+                    if not finished:
+                        request.generated_ids.append(token)
+                        tokens += 1
+                        request._emit(tokenizer.decode(request.prompt_ids + request.generated_ids,
+                                                       skip_special_tokens=True))
+                    if finished or len(request.generated_ids) >= request.max_new_tokens:
+                        request._emit(tokenizer.decode(request.prompt_ids + request.generated_ids,
+                                                       skip_special_tokens=True), final=True)
+                        request._finish()
+                        with self._metrics_lock:
+                            self._metrics["requests_completed"] += 1
+                    else:
+                        keep.append(row)
+
+                if not keep:
+                    break
+                if len(keep) < len(active):
+                    index = torch.tensor(keep)
+                    past = _select_rows(past, index)
+                    next_tokens = next_tokens[index]
+                    attention_mask = attention_mask[index]
+                    active = [active[row] for row in keep]
+                    self._set_metric("active_batch_size", len(active))
+
+                input_ids = next_tokens.unsqueeze(-1)
+                attention_mask = torch.cat(
+                    [attention_mask, attention_mask.new_ones((attention_mask.shape[0], 1))], dim=-1
+                )
+
+        elapsed = time.perf_counter() - start
+        with self._metrics_lock:
+            self._metrics["batches"] += 1
+            self._metrics["tokens_generated"] += tokens
+            self._metrics["active_batch_size"] = 0
+            # Exponential moving average so one tiny batch doesn't swing the reading
+            rate = tokens / elapsed if elapsed else 0.0
+            previous = self._metrics["tokens_per_sec"]
+            self._metrics["tokens_per_sec"] = rate if not previous else 0.7 * previous + 0.3 * rate
+
+    def _set_metric(self, name: str, value):
+        with self._metrics_lock:
+            self._metrics[name] = value
+
+
+def _select_rows(past, index):
+    """Keep only the given batch rows of a KV cache (transformers Cache object or legacy tuples)"""
+    if hasattr(past, "batch_select_indices"):
+        past.batch_select_indices(index)
+        return past
+    return tuple(tuple(tensor[index] for tensor in layer) for layer in past)
+
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def get_generation_worker(model_name: str) -> GenerationWorker:
+    """Process-wide worker per model, started on first use"""
+    with _workers_lock:
+        if model_name not in _workers:
+            _workers[model_name] = GenerationWorker(model_name)
+        return _workers[model_name]
@@ -0,0 +1,167 @@
+"""
+Display-ready versions of medical images for vision models and previews.
+
+Raw pixels are unusable as model input: CT values are in Hounsfield units once
+the DICOM rescale slope/intercept is applied, and most of their 12-16 bit range
+is irrelevant to the study. preprocess_image() applies the rescale and the
+study's window/level (a percentile window when none is stored), normalizes to
+uint8 and writes a pyramid of downscaled copies (256/512/1024 px on the longest
+side by default) to IMAGE_CACHE_DIR. vision_image() then serves the smallest
+level that is enough for the requested detail, so the encoding, upload and
+image-token cost match what the model can actually use.
+"""
+from pathlib import Path
+import threading
+import hashlib
+import base64
+import json
+import os
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+IMAGE_CACHE_DIR = Path(os.getenv("IMAGE_CACHE_DIR", "image_cache"))
+PYRAMID_SIZES = tuple(sorted(int(size) for size in os.getenv("IMAGE_PYRAMID_SIZES", "256,512,1024").split(",")))
+# png keeps the windowed pixels exact; jpeg is ~5x smaller for photos and previews
+PYRAMID_FORMAT = os.getenv("IMAGE_PYRAMID_FORMAT", "png").lower()
+JPEG_QUALITY = 90
+# Longest side each vision detail level can use (a 'low' detail image is one 512 px tile)
+VISION_DETAIL_SIDES = {"low": 512, "high": 1024}
+# Bump when the windowing or resampling changes so old pyramids are rebuilt
+PREP_VERSION = 1
+
+_build_locks = {}
+_build_locks_lock = threading.Lock()
+
+
+def _first(value):
+    # Window center/width may be multi-valued; the first pair is the default view
+    if value is None:
+        return None
+    try:
+        return float(value[0]) if hasattr(value, "__len__") and not isinstance(value, str) else float(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def window_to_uint8(pixels: np.ndarray, center: float = None, width: float = None) -> np.ndarray:
+    """
+    Map pixel values to 0-255 with the DICOM linear VOI function. Without a stored
+    window, the 0.5th-99.5th percentile range is used so outliers don't flatten the image.
+    """
+    pixels = np.asarray(pixels, dtype=np.float32)
+    if center is None or width is None or width < 1:
+        sample = pixels[::max(1, pixels.shape[0] // 512), ::max(1, pixels.shape[1] // 512)]
+        low, high = np.percentile(sample, (0.5, 99.5))
+        center, width = (low + high) / 2, max(high - low, 1.0) + 1
+    scaled = (pixels - (center - 0.5)) / (width - 1) + 0.5
+    np.clip(scaled, 0.0, 1.0, out=scaled)
+    return (scaled * 255).astype(np.uint8)
+
+
+def load_pixels(path: Path) -> tuple:
+    """(uint8 image array, window used) for a DICOM, NIfTI or standard image; volumes give their middle slice"""
+    path = Path(path)
+    name = path.name.lower()
+    if name.endswith(".dcm"):
+        import pydicom
+        ds = pydicom.dcmread(str(path))
+        pixels = ds.pixel_array
+        if int(getattr(ds, "SamplesPerPixel", 1)) == 3:
+            frame = pixels[len(pixels) // 2] if pixels.ndim == 4 else pixels
+            return np.ascontiguousarray(frame, dtype=np.uint8), None
+        if pixels.ndim == 3:
+            pixels = pixels[len(pixels) // 2]  # middle frame of a multi-frame object
+        slope = float(getattr(ds, "RescaleSlope", 1) or 1)
+        intercept = float(getattr(ds, "RescaleIntercept", 0) or 0)
+        pixels = pixels.astype(np.float32) * slope + intercept
+        center, width = _first(ds.get("WindowCenter")), _first(ds.get("WindowWidth"))
+        image = window_to_uint8(pixels, center, width)
+        if getattr(ds, "PhotometricInterpretation", "") == "MONOCHROME1":
+            image = 255 - image  # stored inverted (bright = low values)
+        return image, [center, width] if center is not None and width is not None else None
+    if name.endswith((".nii", ".nii.gz")):
+        import nibabel as nib
+        volume = nib.load(str(path)).dataobj
+        # Slice lazily so only the middle plane is read from disk
+        pixels = np.asarray(volume[(slice(None), slice(None)) + tuple(size // 2 for size in volume.shape[2:])])
+        return window_to_uint8(pixels), None
+    from PIL import Image
+    with Image.open(path) as image:
+        if image.mode in ("I;16", "I;16B", "I", "F"):
+            return window_to_uint8(np.asarray(image)), None
+        return np.asarray(image.convert("RGB" if image.mode in ("RGB", "RGBA", "P", "CMYK") else "L")), None
+
+
+def _cache_dir(path: Path) -> Path:
+    stat = path.stat()
+    stamp = f"{PREP_VERSION}:{path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}:{PYRAMID_SIZES}:{PYRAMID_FORMAT}"
+    return IMAGE_CACHE_DIR / hashlib.sha256(stamp.encode("utf-8")).hexdigest()[:32]
+
+
+def _build_lock(key: str) -> threading.Lock:
+    with _build_locks_lock:
+        return _build_locks.setdefault(key, threading.Lock())
+
+
+def preprocess_image(path) -> dict:
+    """
+    Window, normalize and downscale an image once; returns its manifest:
+    source shape, window used and {size: file} for every pyramid level.
+    Images smaller than a level are never upscaled; that level keeps the image's own size.
+    """
+    from PIL import Image
+
+    path = Path(path)
+    out_dir = _cache_dir(path)
+    manifest_path = out_dir / "manifest.json"
+    with _build_lock(out_dir.name):
+        if manifest_path.exists():
+            return json.loads(manifest_path.read_text(encoding="utf-8"))
+
+        pixels, window = load_pixels(path)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        suffix, options = (".jpg", {"quality": JPEG_QUALITY}) if PYRAMID_FORMAT == "jpeg" else (".png", {})
+        image = Image.fromarray(pixels)
+        levels = {}
+        # Largest level first; each smaller one is resampled from the one above it
+        for size in sorted(PYRAMID_SIZES, reverse=True):
+            if max(image.size) > size:
+                image = image.copy()
+                image.thumbnail((size, size), Image.LANCZOS)
+            target = out_dir / f"{size}{suffix}"
+            image.save(target, **options)
+            levels[str(size)] = str(target)
+
+        manifest = {
+            "source": str(path),
+            "shape": list(pixels.shape),
+            "window": window,
+            "levels": dict(sorted(levels.items(), key=lambda item: int(item[0])))
+        }
+        tmp = manifest_path.with_name("manifest.json.tmp")
+        tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        os.replace(tmp, manifest_path)
+        return manifest
+
+
+def pyramid_level(path, min_side: int) -> str:
+    """The smallest cached level whose longest side is at least min_side (else the largest)"""
+    levels = preprocess_image(path)["levels"]
+    for size, level in sorted(levels.items(), key=lambda item: int(item[0])):
+        if int(size) >= min_side:
+            return level
+    return levels[str(max(int(size) for size in levels))]
+
+
+def vision_image(path, detail: str = "low") -> str:
+    """Preprocessed image file sized for a vision model's 'low' or 'high' detail"""
+    return pyramid_level(path, VISION_DETAIL_SIDES[detail])
+
+
+def image_data_url(path, detail: str = "low") -> str:
+    """vision_image() as a data URL, for an image_url part of a multimodal message"""
+    level = Path(vision_image(path, detail))
+    mime = "image/jpeg" if level.suffix == ".jpg" else "image/png"
+    return f"data:{mime};base64,{base64.b64encode(level.read_bytes()).decode('ascii')}"
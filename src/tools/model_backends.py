@@ -0,0 +1,207 @@
+from pathlib import Path
+import threading
+import json
+import os
+import re
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ---------------------- CONFIGURATION ----------------------
+
+# auto | onnx | int8 | mmap | fp32 - "auto" tries the fastest backend first and falls back;
+# mmap shares one copy of the fp32 weights between every process on the host
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "auto").lower()
+MODEL_CACHE_DIR = Path(os.getenv("MODEL_CACHE_DIR", "model_cache"))
+# Max absolute difference in output probabilities allowed vs. the fp32 model
+MODEL_DRIFT_TOLERANCE = float(os.getenv("MODEL_DRIFT_TOLERANCE", "0.05"))
+
+BACKEND_PREFERENCE = ["onnx", "int8", "mmap", "fp32"]
+
+DRIFT_SAMPLES = [
+    "Patient reports crushing chest pain radiating to the left arm with sweating.",
+    "Mild headache and runny nose for two days, no fever.",
+    "Fever of 39.5C with productive cough and shortness of breath.",
+    "Sudden weakness on the right side of the face and slurred speech.",
+    "Itchy rash on both forearms after starting a new detergent.",
+    "What is the first-line treatment for community-acquired pneumonia?"
+]
+
+_loaded = {}
+_load_lock = threading.Lock()
+
+
+def _safe_name(model_name: str) -> str:
+    return re.sub(r"[^\w.-]", "__", model_name)
+
+
+def _model_classes(kind: str):
+    from transformers import AutoModelForCausalLM, AutoModelForSequenceClassification
+    return AutoModelForCausalLM if kind == "causal-lm" else AutoModelForSequenceClassification
+
+
+# ---------------------- BACKENDS ----------------------
+
+def _snapshot_dir(kind: str, model_name: str) -> Path:
+    """
+    Save the fp32 model (and tokenizer) locally once and derive every backend from it.
+
+    Pinning a snapshot also fixes the randomly initialised classification head
+    that AutoModelForSequenceClassification adds to base checkpoints, so fp32,
+    int8 and ONNX all start from the same weights.
+    """
+    from transformers import AutoTokenizer
+
+    path = MODEL_CACHE_DIR / "fp32" / _safe_name(model_name)
+    if not (path / "config.json").exists():
+        model = _model_classes(kind).from_pretrained(model_name)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model.save_pretrained(path)
+        tokenizer.save_pretrained(path)
+    return path
+
+
+def _load_fp32(kind: str, snapshot: Path):
+    model = _model_classes(kind).from_pretrained(snapshot)
+    model.eval()
+    return model
+
+
+def _load_mmap(kind: str, snapshot: Path):
+    """The fp32 model on memory-mapped safetensors: processes share the weights' pages instead of each copying them"""
+    from src.tools.shared_weights import load_shared_model
+    return load_shared_model(_model_classes(kind), snapshot)
+
+
+def _load_int8(kind: str, snapshot: Path):
+    """PyTorch dynamic int8 quantization of every Linear layer (re-quantized on load, it takes ~1s)"""
+    import torch
+
+    model = _load_fp32(kind, snapshot)
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _load_onnx(kind: str, snapshot: Path):
+    """ONNX Runtime with dynamic int8 weights; export + quantization are cached under MODEL_CACHE_DIR/onnx"""
+    from optimum.onnxruntime import ORTModelForCausalLM, ORTModelForSequenceClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    ort_class = ORTModelForCausalLM if kind == "causal-lm" else ORTModelForSequenceClassification
+    export_dir = MODEL_CACHE_DIR / "onnx" / snapshot.name
+
+    if not (export_dir / "model_quantized.onnx").exists():
+        exported = ort_class.from_pretrained(snapshot, export=True)
+        exported.save_pretrained(export_dir)
+        quantizer = ORTQuantizer.from_pretrained(export_dir, file_name="model.onnx")
+        config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=export_dir, quantization_config=config)
+
+    return ort_class.from_pretrained(export_dir, file_name="model_quantized.onnx")
+
+
+_BACKEND_LOADERS = {
+    "onnx": _load_onnx,
+    "int8": _load_int8,
+    "mmap": _load_mmap,
+    "fp32": _load_fp32
+}
+
+
+# ---------------------- ACCURACY DRIFT CHECK ----------------------
+
+def _output_probabilities(kind: str, tokenizer, model):
+    """Softmax over class logits (classifier) or next-token logits (causal LM) for the drift samples"""
+    import torch
+
+    rows = []
+    with torch.no_grad():
+        for text in DRIFT_SAMPLES:
+            inputs = tokenizer(text, return_tensors="pt", truncation=True)
+            logits = model(**inputs).logits
+            last = logits[0, -1] if kind == "causal-lm" else logits[0]
+            rows.append(torch.softmax(torch.as_tensor(last, dtype=torch.float32), dim=-1))
+    return torch.stack(rows)
+
+
+def check_drift(kind: str, tokenizer, reference, candidate) -> dict:
+    """Compare a candidate backend's outputs against the fp32 reference"""
+    expected = _output_probabilities(kind, tokenizer, reference)
+    actual = _output_probabilities(kind, tokenizer, candidate)
+    return {
+        "max_abs_diff": float((expected - actual).abs().max()),
+        "top1_agreement": float((expected.argmax(-1) == actual.argmax(-1)).float().mean())
+    }
+
+
+def _verified(kind: str, backend: str, snapshot: Path, tokenizer, model) -> bool:
+    """Run the drift check once per backend/model and remember the verdict on disk"""
+    if backend in ("fp32", "mmap"):
+        # mmap serves the fp32 snapshot's own bytes
+        return True
+
+    verdict_path = MODEL_CACHE_DIR / backend / snapshot.name / "drift.json"
+    if verdict_path.exists():
+        verdict = json.loads(verdict_path.read_text(encoding="utf-8"))
+    else:
+        verdict = check_drift(kind, tokenizer, _load_fp32(kind, snapshot), model)
+        verdict["passed"] = (verdict["max_abs_diff"] <= MODEL_DRIFT_TOLERANCE
+                             and verdict["top1_agreement"] == 1.0)
+        verdict_path.parent.mkdir(parents=True, exist_ok=True)
+        verdict_path.write_text(json.dumps(verdict, indent=2), encoding="utf-8")
+
+    if not verdict["passed"]:
+        print(f"⚠️ {backend} backend for {snapshot.name} drifts from fp32 "
+              f"(max diff {verdict['max_abs_diff']:.4f}, top-1 agreement {verdict['top1_agreement']:.0%}) - skipping")
+    return verdict["passed"]
+
+
+# ---------------------- LOADING ----------------------
+
+def load_model(kind: str, model_name: str) -> tuple:
+    """
+    Load a model once per process on the fastest available backend.
+
+    Args:
+        kind: 'sequence-classification' or 'causal-lm'
+        model_name: Hugging Face model id
+
+    Returns:
+        tuple: (tokenizer, model, backend name)
+    """
+    key = (kind, model_name)
+    with _load_lock:
+        if key in _loaded:
+            return _loaded[key]
+
+        from transformers import AutoTokenizer
+
+        snapshot = _snapshot_dir(kind, model_name)
+        tokenizer = AutoTokenizer.from_pretrained(snapshot)
+        backends = BACKEND_PREFERENCE if MODEL_BACKEND == "auto" else [MODEL_BACKEND]
+
+        for backend in backends:
+            try:
+                model = _BACKEND_LOADERS[backend](kind, snapshot)
+            except Exception as e:
+                print(f"⚠️ {backend} backend unavailable for {model_name}: {e}")
+                continue
+            if _verified(kind, backend, snapshot, tokenizer, model):
+                break
+        else:
+            backend = "fp32"
+            model = _load_fp32(kind, snapshot)
+
+        print(f"✅ Loaded {model_name} with {backend} backend")
+        if backend == "mmap":
+            from src.tools.shared_weights import report_memory
+            print(report_memory(MODEL_CACHE_DIR))
+        _loaded[key] = (tokenizer, model, backend)
+        return _loaded[key]
+
+
+def load_sequence_classifier(model_name: str) -> tuple:
+    return load_model("sequence-classification", model_name)
+
+
+def load_causal_lm(model_name: str) -> tuple:
+    return load_model("causal-lm", model_name)
@@ -0,0 +1,134 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import random
+import time
+import os
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ---------------------- CONFIGURATION ----------------------
+
+NCBI_EUTILS_URL = os.getenv("NCBI_EUTILS_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils")
+NCBI_API_KEY = os.getenv("NCBI_API_KEY")
+# NCBI allows 3 requests/s per IP, 10 with an API key
+NCBI_RATE_LIMIT = float(os.getenv("NCBI_RATE_LIMIT", "10" if NCBI_API_KEY else "3"))
+NCBI_MAX_RETRIES = int(os.getenv("NCBI_MAX_RETRIES", "4"))
+NCBI_POOL_SIZE = int(os.getenv("NCBI_POOL_SIZE", "10"))
+NCBI_TIMEOUT_S = float(os.getenv("NCBI_TIMEOUT_S", "10"))
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+BACKOFF_BASE_S = 0.5
+BACKOFF_MAX_S = 8.0
+# PMIDs per esummary request; larger lookups are split and fetched concurrently
+SUMMARY_BATCH_SIZE = 20
+
+
+class TokenBucket:
+    """Blocking token bucket; acquire() waits until a request may be sent"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# One bucket per process: NCBI counts requests per IP/API key, not per client
+_limiter = TokenBucket(NCBI_RATE_LIMIT)
+
+
+class NCBIClient:
+    """
+    E-utilities client with a shared keep-alive connection pool, the process-wide
+    rate limiter and jittered exponential backoff on 429/5xx and connection errors.
+    """
+
+    def __init__(self, base_url: str = NCBI_EUTILS_URL, api_key: str = NCBI_API_KEY,
+                 limiter: TokenBucket = None, max_retries: int = NCBI_MAX_RETRIES,
+                 pool_size: int = NCBI_POOL_SIZE, timeout: float = NCBI_TIMEOUT_S):
+        self.base_url = base_url.rstrip("/")
+        self.limiter = limiter or _limiter
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.params = {"tool": "agentic-doctor", "email": os.getenv("PUBMED_EMAIL", "your_email@example.com")}
+        if api_key:
+            self.params["api_key"] = api_key
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="ncbi")
+
+    def _backoff(self, attempt: int, response=None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        # Full jitter so concurrent retries don't hit NCBI in lockstep
+        return random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt))
+
+    def get(self, endpoint: str, **params) -> dict:
+        """GET an E-utilities endpoint (e.g. 'esearch.fcgi') and return the parsed JSON"""
+        url = f"{self.base_url}/{endpoint}"
+        params = {**self.params, **params, "retmode": "json"}
+
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                time.sleep(self._backoff(attempt, response))
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    def esearch(self, term: str, retmax: int = 20, db: str = "pubmed") -> list:
+        """PMIDs matching a search term"""
+        result = self.get("esearch.fcgi", db=db, term=term, retmax=retmax)
+        return result["esearchresult"]["idlist"]
+
+    def esummary(self, ids: list, db: str = "pubmed") -> list:
+        """Document summaries for the given ids, in the same order"""
+        batches = [ids[i:i + SUMMARY_BATCH_SIZE] for i in range(0, len(ids), SUMMARY_BATCH_SIZE)]
+        results = self._executor.map(
+            lambda batch: self.get("esummary.fcgi", db=db, id=",".join(batch))["result"], batches
+        )
+        summaries = {}
+        for result in results:
+            summaries.update({uid: result[uid] for uid in result.get("uids", [])})
+        return [summaries[pmid] for pmid in ids if pmid in summaries]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_ncbi_client() -> NCBIClient:
+    """Process-wide client so every tool call shares the connection pool"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = NCBIClient()
+        return _client
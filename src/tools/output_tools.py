@@ -1,11 +1,9 @@
 from crewai.tools import BaseTool
 from typing import Type
 from pydantic import BaseModel, Field
-from fpdf import FPDF
-import matplotlib.pyplot as plt
-import numpy as np
 from pathlib import Path
 from datetime import datetime
+from src.tools.tool_memo import memoized
 
 # Global case log for collaboration
 case_log = {}
@@ -25,8 +23,10 @@ class GeneratePDFTool(BaseTool):
     )
     args_schema: Type[BaseModel] = GeneratePDFInput
 
+    @memoized
     def _run(self, findings: str, citations: str = "") -> str:
         try:
+            from fpdf import FPDF
             pdf = FPDF()
             pdf.add_page()
             
@@ -76,52 +76,49 @@ class GeneratePDFTool(BaseTool):
 class GenerateXAIHeatmapInput(BaseModel):
     """Input schema for GenerateXAIHeatmapTool."""
     image_path: str = Field(..., description="Path to the medical image")
+    patch_size: int = Field(default=0, description="Occlusion patch size in pixels (0 = configured default)")
+    stride: int = Field(default=0, description="Step between patches in pixels (0 = configured default)")
 
 
 class GenerateXAIHeatmapTool(BaseTool):
     name: str = "Generate XAI Heatmap"
     description: str = (
-        "Overlays a synthetic heatmap on the medical image for explainability. "
-        "This is a placeholder implementation - replace with actual XAI model in production."
+        "Shows which regions of a medical image drive the image classifier's prediction "
+        "(occlusion saliency): each region is masked in turn and the drop in confidence is mapped. "
+        "Smaller patches give finer maps but take longer."
     )
     args_schema: Type[BaseModel] = GenerateXAIHeatmapInput
 
-    def _run(self, image_path: str) -> str:
+    @memoized
+    def _run(self, image_path: str, patch_size: int = 0, stride: int = 0) -> str:
         try:
-            import cv2
-            
-            # Read the image
-            image_data = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-            if image_data is None:
+            from src.tools.saliency import SALIENCY_MODEL, SALIENCY_PATCH, SALIENCY_STRIDE, explain_image
+
+            if not Path(image_path).exists():
                 return f"Error: Could not read image at {image_path}"
-            
-            # Create synthetic heatmap (replace with actual XAI model)
-            heatmap = np.random.rand(*image_data.shape) * 0.5
-            
-            # Create visualization
-            plt.figure(figsize=(10, 5))
-            
-            plt.subplot(1, 2, 1)
-            plt.imshow(image_data, cmap='gray')
-            plt.title('Original Image')
-            plt.axis('off')
-            
-            plt.subplot(1, 2, 2)
-            plt.imshow(image_data, cmap='gray')
-            plt.imshow(heatmap, cmap='jet', alpha=0.4)
-            plt.title('XAI Heatmap Overlay')
-            plt.axis('off')
-            
-            # Ensure reports directory exists
             Path("reports").mkdir(exist_ok=True)
-            
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            output_path = f"reports/xai_heatmap_{timestamp}.png"
-            plt.savefig(output_path, bbox_inches='tight', dpi=150)
-            plt.close()
-            
-            return f"XAI heatmap generated successfully at: {output_path}"
-            
+            result = explain_image(
+                image_path, f"reports/xai_heatmap_{timestamp}.png",
+                patch=patch_size or SALIENCY_PATCH, stride=stride or SALIENCY_STRIDE
+            )
+            row, col = result["peak"]
+            region = (
+                f"Most influential region centred at {row:.0%} down, {col:.0%} across the image "
+                f"({result['evaluations']} occlusions)."
+            )
+            if not result["clinical"]:
+                # A general-purpose model's class label ("jellyfish") must not reach a diagnosis
+                return (
+                    f"XAI heatmap generated successfully at: {result['path']}\n{region}\n"
+                    f"Note: the classifier ({SALIENCY_MODEL}) is not a clinical model. The region shows what "
+                    f"drives its prediction only; it is not a diagnostic finding and no class label is reported."
+                )
+            return (
+                f"XAI heatmap generated successfully at: {result['path']}\n"
+                f"Predicted class: {result['label']} (score {result['score']:.2f}). {region}"
+            )
+
         except Exception as e:
             return f"Error generating XAI heatmap: {str(e)}"
 
@@ -0,0 +1,283 @@
+"""
+Offline PubMed index built from the NCBI baseline/update XML files.
+
+    python -m src.tools.pubmed_index ingest pubmed25n0001.xml.gz pubmed25n0002.xml.gz ...
+    python -m src.tools.pubmed_index search "community acquired pneumonia" --year 2025
+
+Files are streamed with iterparse into SQLite with an FTS5 full-text index over
+title and abstract. Ingestion is incremental: files already ingested are
+skipped, and update files replace revised citations and apply DeleteCitation.
+SearchPubMedTool queries this index first and only goes to NCBI on a miss.
+"""
+from pathlib import Path
+import xml.etree.ElementTree as ET
+import threading
+import argparse
+import sqlite3
+import gzip
+import time
+import re
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PUBMED_INDEX_PATH = Path(os.getenv("PUBMED_INDEX_PATH", "pubmed_index.db"))
+INGEST_BATCH_SIZE = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    pmid INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    abstract TEXT,
+    authors TEXT,
+    journal TEXT,
+    pub_year INTEGER,
+    pub_date TEXT
+);
+CREATE INDEX IF NOT EXISTS articles_year ON articles(pub_year);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    title, abstract, content='articles', content_rowid='pmid'
+);
+CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts(rowid, title, abstract) VALUES (new.pmid, new.title, new.abstract);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_ad AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_fts(articles_fts, rowid, title, abstract) VALUES ('delete', old.pmid, old.title, old.abstract);
+END;
+CREATE TABLE IF NOT EXISTS ingested_files (
+    name TEXT PRIMARY KEY,
+    size INTEGER,
+    articles INTEGER,
+    deleted INTEGER,
+    ingested_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+_local = threading.local()
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(path))
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _reader(path: Path = None) -> sqlite3.Connection:
+    """Per-thread read connection (sqlite connections can't be shared across threads)"""
+    path = path or PUBMED_INDEX_PATH
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    if path not in conns:
+        conns[path] = _connect(path)
+    return conns[path]
+
+
+# ---------------------- XML PARSING ----------------------
+
+def _text(element) -> str:
+    # Titles and abstracts carry inline markup (<i>, <sup>, ...)
+    return "".join(element.itertext()).strip() if element is not None else ""
+
+
+def _pub_date(article) -> tuple:
+    """(year, display date) from PubDate, falling back to MedlineDate like '2024 Dec-2025 Jan'"""
+    pub_date = article.find("Journal/JournalIssue/PubDate")
+    if pub_date is None:
+        return None, ""
+    year = pub_date.findtext("Year")
+    if year:
+        parts = [year, pub_date.findtext("Month"), pub_date.findtext("Day")]
+        return int(year), " ".join(p for p in parts if p)
+    medline = pub_date.findtext("MedlineDate", "")
+    match = re.search(r"\d{4}", medline)
+    return (int(match.group()) if match else None), medline
+
+
+def _parse_citation(element) -> tuple:
+    citation = element.find("MedlineCitation")
+    article = citation.find("Article")
+    authors = []
+    for author in article.findall("AuthorList/Author"):
+        name = " ".join(p for p in (author.findtext("LastName"), author.findtext("Initials")) if p)
+        authors.append(name or author.findtext("CollectiveName", ""))
+    abstract = "\n".join(_text(part) for part in article.findall("Abstract/AbstractText"))
+    year, date = _pub_date(article)
+    return (
+        int(citation.findtext("PMID")),
+        _text(article.find("ArticleTitle")),
+        abstract,
+        ", ".join(a for a in authors if a),
+        article.findtext("Journal/Title", ""),
+        year,
+        date
+    )
+
+
+def iter_pubmed_xml(path: Path):
+    """
+    Stream ('article', row) and ('delete', pmid) events from a baseline/update file.
+
+    Elements are cleared as soon as they are handled, so memory stays flat
+    regardless of file size.
+    """
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rb") as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        for event, element in context:
+            if event != "end":
+                continue
+            if element.tag == "PubmedArticle":
+                yield "article", _parse_citation(element)
+                root.clear()
+            elif element.tag == "DeleteCitation":
+                for pmid in element.findall("PMID"):
+                    yield "delete", int(pmid.text)
+                root.clear()
+
+
+# ---------------------- INGESTION ----------------------
+
+def ingest_file(path, index_path: Path = None) -> dict:
+    """Add one baseline/update file to the index; files already ingested are skipped"""
+    path = Path(path)
+    conn = _connect(index_path or PUBMED_INDEX_PATH)
+    try:
+        size = path.stat().st_size
+        done = conn.execute("SELECT size FROM ingested_files WHERE name = ?", (path.name,)).fetchone()
+        if done and done["size"] == size:
+            return {"file": path.name, "skipped": True, "articles": 0, "deleted": 0}
+
+        articles = deleted = 0
+        rows = {}
+
+        def flush():
+            # Delete + insert (not REPLACE) so the FTS delete trigger sees the old text
+            conn.executemany("DELETE FROM articles WHERE pmid = ?", [(pmid,) for pmid in rows])
+            conn.executemany("INSERT INTO articles VALUES (?, ?, ?, ?, ?, ?, ?)", rows.values())
+            rows.clear()
+
+        with conn:
+            for kind, value in iter_pubmed_xml(path):
+                if kind == "article":
+                    # Later versions of a citation in the same file win
+                    rows[value[0]] = value
+                    articles += 1
+                    if len(rows) >= INGEST_BATCH_SIZE:
+                        flush()
+                else:
+                    # A deletion only applies to versions seen before it in the stream
+                    flush()
+                    conn.execute("DELETE FROM articles WHERE pmid = ?", (value,))
+                    deleted += 1
+            flush()
+            conn.execute(
+                "INSERT OR REPLACE INTO ingested_files(name, size, articles, deleted) VALUES (?, ?, ?, ?)",
+                (path.name, size, articles, deleted)
+            )
+        return {"file": path.name, "skipped": False, "articles": articles, "deleted": deleted}
+    finally:
+        conn.close()
+
+
+# ---------------------- SEARCH ----------------------
+
+def _article(row) -> dict:
+    return {
+        "pmid": str(row["pmid"]),
+        "title": row["title"],
+        "authors": row["authors"].split(", ") if row["authors"] else [],
+        "journal": row["journal"],
+        "pub_date": row["pub_date"]
+    }
+
+
+def _match_query(topic: str) -> str:
+    # Quote every word so user text can't inject FTS5 syntax; words are ANDed
+    words = re.findall(r"\w+", topic)
+    return " ".join(f'"{word}"' for word in words)
+
+
+def search_index(topic: str, year: int = None, limit: int = 5, index_path: Path = None) -> list:
+    """
+    Newest articles matching every word of a topic, optionally limited to one
+    publication year like the live '{year}[PDAT]' filter.
+
+    Results are ordered by PMID descending, the same "most recent" order esearch
+    uses by default. Unlike bm25 ranking, whose cost grows with the number of
+    matches, this stops after `limit` hits on the FTS rowid scan.
+
+    Returns an empty list when there is no index or nothing matches.
+    """
+    path = index_path or PUBMED_INDEX_PATH
+    query = _match_query(topic)
+    if not query or not path.exists():
+        return []
+
+    sql = ("SELECT a.pmid, a.title, a.authors, a.journal, a.pub_date FROM articles_fts "
+           "JOIN articles a ON a.pmid = articles_fts.rowid WHERE articles_fts MATCH ?")
+    params = [query]
+    if year is not None:
+        sql += " AND a.pub_year = ?"
+        params.append(year)
+    sql += " ORDER BY articles_fts.rowid DESC LIMIT ?"
+    params.append(limit)
+
+    try:
+        rows = _reader(path).execute(sql, params).fetchall()
+    except sqlite3.Error as e:
+        print(f"⚠️ PubMed index query failed: {e}")
+        return []
+    return [_article(row) for row in rows]
+
+
+def fetch_articles(pmids: list, index_path: Path = None) -> list:
+    """Articles for the given PMIDs in the same order; PMIDs not in the index are dropped"""
+    path = index_path or PUBMED_INDEX_PATH
+    if not pmids or not path.exists():
+        return []
+    placeholders = ", ".join("?" for _ in pmids)
+    rows = _reader(path).execute(
+        f"SELECT pmid, title, authors, journal, pub_date FROM articles WHERE pmid IN ({placeholders})",
+        [int(pmid) for pmid in pmids]
+    ).fetchall()
+    by_pmid = {row["pmid"]: _article(row) for row in rows}
+    return [by_pmid[int(pmid)] for pmid in pmids if int(pmid) in by_pmid]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline PubMed index")
+    parser.add_argument("--index", type=Path, default=PUBMED_INDEX_PATH, help="SQLite index path")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="Ingest PubMed baseline/update XML files (.xml or .xml.gz)")
+    ingest.add_argument("files", nargs="+", type=Path)
+    search = commands.add_parser("search", help="Query the index")
+    search.add_argument("topic")
+    search.add_argument("--year", type=int)
+    search.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        # Update files are numbered after the baseline, so name order is apply order
+        for path in sorted(args.files, key=lambda p: p.name):
+            start = time.perf_counter()
+            result = ingest_file(path, args.index)
+            if result["skipped"]:
+                print(f"⏭️ {path.name} already ingested")
+            else:
+                print(f"✅ {path.name}: {result['articles']} articles, {result['deleted']} deletions "
+                      f"in {time.perf_counter() - start:.1f}s")
+    else:
+        start = time.perf_counter()
+        articles = search_index(args.topic, args.year, args.limit, args.index)
+        print(f"{len(articles)} results in {(time.perf_counter() - start) * 1000:.1f} ms\n")
+        for article in articles:
+            print(f"{article['pmid']}  {article['pub_date']:<12} {article['title']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Occlusion saliency for a pluggable CPU image classifier.
+
+Each patch of the image is covered with the image's mean and the drop in the
+classifier's score for its predicted class is credited to the covered pixels.
+All occluded copies are built with one broadcast mask per batch and scored in
+batched forward passes, and the per-pixel sums are a single tensordot, so the
+cost is (positions / batch size) model calls. Patch size and stride trade
+resolution for speed. In coarse-to-fine mode a cheap coarse pass finds the
+regions that matter and only those are refined with the fine patch.
+
+Classifiers take a (N, H, W) float32 batch in [0, 1] and return (N, classes)
+scores. register_classifier() adds one by name; any other SALIENCY_MODEL is
+loaded as a Hugging Face image-classification model on CPU. Only classifiers
+registered as clinical, or listed in SALIENCY_CLINICAL_MODELS, have their class
+label reported: the default ImageNet model's labels mean nothing for a scan.
+"""
+from pathlib import Path
+import threading
+import os
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SALIENCY_MODEL = os.getenv("SALIENCY_MODEL", "microsoft/resnet-18")
+SALIENCY_PATCH = int(os.getenv("SALIENCY_PATCH", "32"))
+SALIENCY_STRIDE = int(os.getenv("SALIENCY_STRIDE", "16"))
+# "coarse-to-fine" or "full"
+SALIENCY_MODE = os.getenv("SALIENCY_MODE", "coarse-to-fine").lower()
+SALIENCY_BATCH = int(os.getenv("SALIENCY_BATCH", "64"))
+# Comma-separated Hugging Face models vetted as medical image classifiers
+SALIENCY_CLINICAL_MODELS = {name.strip() for name in os.getenv("SALIENCY_CLINICAL_MODELS", "").split(",") if name.strip()}
+# Share of coarse cells refined in coarse-to-fine mode
+REFINE_FRACTION = 0.25
+
+_factories = {}
+_clinical = set()
+_classifiers = {}
+_classifiers_lock = threading.Lock()
+
+
+# ---------------------- CLASSIFIERS ----------------------
+
+class HFImageClassifier:
+    """A transformers image-classification model on CPU, fed grayscale batches"""
+
+    def __init__(self, model_name: str):
+        import torch
+        from transformers import AutoImageProcessor, AutoModelForImageClassification
+
+        processor = AutoImageProcessor.from_pretrained(model_name)
+        self.model = AutoModelForImageClassification.from_pretrained(model_name).eval()
+        size = getattr(processor, "crop_size", None) or processor.size
+        self.input_size = int(size.get("height") or size.get("shortest_edge") or 224)
+        self.mean = torch.tensor(processor.image_mean).view(1, 3, 1, 1)
+        self.std = torch.tensor(processor.image_std).view(1, 3, 1, 1)
+        self.labels = [self.model.config.id2label[i] for i in range(len(self.model.config.id2label))]
+        self._torch = torch
+
+    def __call__(self, batch: np.ndarray) -> np.ndarray:
+        torch = self._torch
+        pixels = torch.from_numpy(np.ascontiguousarray(batch, dtype=np.float32)).unsqueeze(1).expand(-1, 3, -1, -1)
+        with torch.inference_mode():
+            logits = self.model(pixel_values=(pixels - self.mean) / self.std).logits
+        return torch.softmax(logits, dim=-1).numpy()
+
+
+def register_classifier(name: str, factory, clinical: bool = False):
+    """Make factory() (returning a classifier) available as SALIENCY_MODEL=name; clinical=True reports its labels"""
+    with _classifiers_lock:
+        _factories[name] = factory
+        _classifiers.pop(name, None)
+        if clinical:
+            _clinical.add(name)
+        else:
+            _clinical.discard(name)
+
+
+def is_clinical(name: str = None) -> bool:
+    """Whether a classifier's predictions may be shown as clinical labels"""
+    name = name or SALIENCY_MODEL
+    with _classifiers_lock:
+        return name in _clinical or name in SALIENCY_CLINICAL_MODELS
+
+
+def get_classifier(name: str = None):
+    """Load a classifier once per process"""
+    name = name or SALIENCY_MODEL
+    with _classifiers_lock:
+        if name not in _classifiers:
+            factory = _factories.get(name, lambda: HFImageClassifier(name))
+            _classifiers[name] = factory()
+        return _classifiers[name]
+
+
+# ---------------------- OCCLUSION ----------------------
+
+def _positions(size: int, patch: int, stride: int) -> np.ndarray:
+    # Start offsets covering the whole axis, the last patch flush with the edge
+    starts = np.arange(0, max(size - patch, 0) + 1, stride)
+    if starts[-1] + patch < size:
+        starts = np.append(starts, size - patch)
+    return starts
+
+
+def _occlude(image: np.ndarray, classify, ys: np.ndarray, xs: np.ndarray, patch: int, target: int,
+             base_score: float, batch_size: int) -> tuple:
+    """Summed score drops and coverage counts per pixel for patches at (ys[i], xs[i])"""
+    height, width = image.shape
+    fill = image.mean()
+    rows_index, cols_index = np.arange(height), np.arange(width)
+    heat = np.zeros((height, width), np.float64)
+    counts = np.zeros((height, width), np.float64)
+    for start in range(0, len(ys), batch_size):
+        y, x = ys[start:start + batch_size, None], xs[start:start + batch_size, None]
+        rows = (rows_index >= y) & (rows_index < y + patch)
+        cols = (cols_index >= x) & (cols_index < x + patch)
+        masks = rows[:, :, None] & cols[:, None, :]
+        scores = classify(np.where(masks, fill, image[None]).astype(np.float32))[:, target]
+        drops = base_score - scores
+        heat += np.tensordot(drops, masks, axes=1)
+        counts += masks.sum(axis=0)
+    return heat, counts
+
+
+def occlusion_saliency(image: np.ndarray, classify, patch: int = SALIENCY_PATCH, stride: int = SALIENCY_STRIDE,
+                       mode: str = SALIENCY_MODE, target: int = None, batch_size: int = SALIENCY_BATCH) -> tuple:
+    """
+    Saliency map for a (H, W) image in [0, 1]: how much covering each pixel lowers the
+    score of the target class (by default the predicted one).
+
+    Returns (heatmap, info); info has the target class, its score and the number of
+    occluded images the classifier scored.
+    """
+    image = np.asarray(image, dtype=np.float32)
+    base = classify(image[None])[0]
+    target = int(np.argmax(base)) if target is None else target
+    height, width = image.shape
+    evaluations = 0
+
+    if mode == "coarse-to-fine":
+        coarse = min(patch * 2, height, width)
+        ys, xs = (grid.ravel() for grid in np.meshgrid(_positions(height, coarse, coarse),
+                                                        _positions(width, coarse, coarse), indexing="ij"))
+        heat, counts = _occlude(image, classify, ys, xs, coarse, target, base[target], batch_size)
+        evaluations += len(ys)
+        coarse_map = heat / np.maximum(counts, 1)
+
+        # Refine the fine patches whose centre lies in the most salient coarse cells
+        cell_scores = coarse_map[np.minimum(ys + coarse // 2, height - 1), np.minimum(xs + coarse // 2, width - 1)]
+        keep = cell_scores >= np.quantile(cell_scores, 1 - REFINE_FRACTION)
+        selected = np.zeros((height, width), bool)
+        for y, x in zip(ys[keep], xs[keep]):
+            selected[y:y + coarse, x:x + coarse] = True
+        fy, fx = (grid.ravel() for grid in np.meshgrid(_positions(height, patch, stride),
+                                                        _positions(width, patch, stride), indexing="ij"))
+        inside = selected[np.minimum(fy + patch // 2, height - 1), np.minimum(fx + patch // 2, width - 1)]
+        heat, counts = _occlude(image, classify, fy[inside], fx[inside], patch, target, base[target], batch_size)
+        evaluations += int(inside.sum())
+        fine_map = heat / np.maximum(counts, 1)
+        refined = counts > 0
+        # Larger patches drop the score more; bring the unrefined cells onto the fine scale
+        coarse_mean = coarse_map[refined].mean() if refined.any() else 0
+        scale = fine_map[refined].mean() / coarse_mean if coarse_mean > 0 else 1.0
+        heatmap = np.where(refined, fine_map, coarse_map * scale)
+    else:
+        ys, xs = (grid.ravel() for grid in np.meshgrid(_positions(height, patch, stride),
+                                                        _positions(width, patch, stride), indexing="ij"))
+        heat, counts = _occlude(image, classify, ys, xs, patch, target, base[target], batch_size)
+        evaluations += len(ys)
+        heatmap = heat / np.maximum(counts, 1)
+
+    return heatmap.astype(np.float32), {"target": target, "score": float(base[target]), "evaluations": evaluations}
+
+
+# ---------------------- RENDERING ----------------------
+
+def _jet(values: np.ndarray) -> np.ndarray:
+    """Blue-to-red colour map for values in [0, 1], as uint8 RGB"""
+    x = values[..., None] * 4 - np.array([3.0, 2.0, 1.0])
+    return (np.clip(1.5 - np.abs(x), 0, 1) * 255).astype(np.uint8)
+
+
+def explain_image(image_path, out_path, classifier=None, patch: int = SALIENCY_PATCH,
+                  stride: int = SALIENCY_STRIDE, mode: str = SALIENCY_MODE, clinical: bool = None) -> dict:
+    """
+    Occlusion saliency for an image file, rendered as the image next to the heatmap overlay.
+    Works on the cached preprocessed pyramid level closest to the classifier's input size.
+    clinical defaults to is_clinical() for the configured model, and False for a classifier passed in.
+    """
+    from PIL import Image
+    from src.tools.image_prep import pyramid_level
+
+    classify = classifier or get_classifier()
+    size = getattr(classify, "input_size", 224)
+    with Image.open(pyramid_level(image_path, size)) as level:
+        display = level.convert("L")
+    model_input = np.asarray(display.resize((size, size), Image.BILINEAR), dtype=np.float32) / 255
+
+    heatmap, info = occlusion_saliency(model_input, classify, patch, stride, mode)
+    positive = np.clip(heatmap, 0, None)
+    normalized = positive / (positive.max() or 1)
+    y, x = np.unravel_index(np.argmax(normalized), normalized.shape)
+
+    overlay = np.asarray(Image.fromarray(_jet(normalized)).resize(display.size, Image.BILINEAR), dtype=np.float32)
+    gray = np.asarray(display.convert("RGB"), dtype=np.float32)
+    blended = (gray * 0.6 + overlay * 0.4).astype(np.uint8)
+    canvas = Image.new("RGB", (display.width * 2, display.height))
+    canvas.paste(display.convert("RGB"), (0, 0))
+    canvas.paste(Image.fromarray(blended), (display.width, 0))
+    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+    canvas.save(out_path)
+
+    labels = getattr(classify, "labels", None)
+    return {
+        **info,
+        "label": labels[info["target"]] if labels else str(info["target"]),
+        "clinical": (classifier is None and is_clinical()) if clinical is None else clinical,
+        # Peak location as a fraction of the image, so it reads the same at any resolution
+        "peak": (round((y + 0.5) / size, 2), round((x + 0.5) / size, 2)),
+        "path": str(out_path)
+    }
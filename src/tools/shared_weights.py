@@ -0,0 +1,194 @@
+"""
+Model weights shared by every process on a host.
+
+    python -m src.tools.shared_weights          # memory of every process mapping the model cache
+    python -m src.tools.shared_weights 4121 4122
+
+from_pretrained() reads the weights into each process's own heap, so N app or
+worker processes hold N copies of ClinicalBERT and BioGPT. load_shared_model()
+instead memory-maps the snapshot's .safetensors files and builds the model
+around zero-copy views of them. The pages come from the OS page cache, which
+every process mapping the same file shares: one physical copy per host. The
+mapping is copy-on-write, so inference (which never writes weights) keeps the
+pages shared, and a stray write only ever copies the page it touches.
+
+memory_usage() splits a process's resident memory into private and shared
+parts (from /proc/<pid>/smaps) and counts how much of the model files it has
+resident; load_model() prints it when a model is loaded with the mmap backend.
+"""
+from pathlib import Path
+import contextlib
+import threading
+import struct
+import mmap
+import json
+import sys
+import re
+import os
+import numpy as np
+
+# safetensors dtype -> numpy dtype; BF16 has no numpy type and is viewed as raw 16-bit words
+SAFETENSORS_DTYPES = {
+    "F64": np.float64, "F32": np.float32, "F16": np.float16, "BF16": np.uint16,
+    "I64": np.int64, "I32": np.int32, "I16": np.int16, "I8": np.int8, "U8": np.uint8, "BOOL": np.bool_
+}
+
+MAPPING_HEADER = re.compile(r"^[0-9a-f]+-[0-9a-f]+ ")
+
+_mappings = []  # open mmaps stay referenced for the life of the process
+_mappings_lock = threading.Lock()
+
+
+# ---------------------- MAPPING ----------------------
+
+def map_safetensors(path) -> dict:
+    """
+    {tensor name: (numpy view into the mapped file, safetensors dtype)} for a .safetensors file.
+    Nothing is read until a view is used, and the views share the page cache with other processes.
+    """
+    path = Path(path)
+    with open(path, 'rb') as f:
+        (header_size,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_size))
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    with _mappings_lock:
+        _mappings.append(mapped)
+
+    data_start = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = np.dtype(SAFETENSORS_DTYPES[info["dtype"]])
+        begin, end = info["data_offsets"]
+        view = np.frombuffer(mapped, dtype=dtype, count=(end - begin) // dtype.itemsize, offset=data_start + begin)
+        tensors[name] = (view.reshape(info["shape"]), info["dtype"])
+    return tensors
+
+
+def load_shared_model(model_class, snapshot: Path):
+    """
+    A transformers model whose parameters are views of the snapshot's safetensors files.
+    The module is built without initializing weights, then every parameter is swapped for its mapped tensor.
+    """
+    import torch
+    from transformers import AutoConfig
+
+    files = sorted(Path(snapshot).glob("*.safetensors"))
+    if not files:
+        raise FileNotFoundError(f"No .safetensors weights in {snapshot}")
+
+    state = {}
+    for file in files:
+        for name, (view, dtype) in map_safetensors(file).items():
+            tensor = torch.from_numpy(view)
+            state[name] = tensor.view(torch.bfloat16) if dtype == "BF16" else tensor
+
+    try:
+        from transformers.modeling_utils import no_init_weights
+    except ImportError:
+        no_init_weights = contextlib.nullcontext
+    config = AutoConfig.from_pretrained(snapshot)
+    with no_init_weights():
+        model = model_class.from_config(config)
+
+    # Checkpoint names may omit the base-model prefix (e.g. 'bert.'); match the module's own names
+    expected = model.state_dict().keys()
+    prefix = getattr(model, "base_model_prefix", "")
+    if prefix and not any(name in expected for name in state) and any(f"{prefix}.{name}" in expected for name in state):
+        state = {f"{prefix}.{name}": tensor for name, tensor in state.items()}
+
+    missing, _ = model.load_state_dict(state, strict=False, assign=True)
+    # Tied weights (e.g. the LM head) aren't stored separately; point them at the mapped embedding
+    model.tie_weights()
+    mapped = {tensor.data_ptr() for tensor in state.values()}
+    parameters = dict(model.named_parameters())
+    untied = [name for name in missing if name in parameters and parameters[name].data_ptr() not in mapped]
+    if untied:
+        raise ValueError(f"Weights missing from {snapshot}: {', '.join(untied[:5])}")
+    model.eval()
+    return model
+
+
+# ---------------------- MEMORY REPORT ----------------------
+
+def memory_usage(pid="self", files_under: Path = None) -> dict:
+    """
+    Resident memory of a process in MB, split into private and shared pages, plus
+    (with files_under) how much of the files under that directory it has resident and shared.
+    Linux only: reads /proc/<pid>/smaps.
+    """
+    files_under = str(Path(files_under).resolve()) if files_under else None
+    totals = dict.fromkeys(("rss", "pss", "shared", "private", "files_rss", "files_shared"), 0)
+    in_files = False
+    with open(f"/proc/{pid}/smaps", 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            if MAPPING_HEADER.match(line):
+                # "<start>-<end> perms offset dev inode [path]" opens each mapping's block
+                parts = line.split(None, 5)
+                in_files = bool(files_under) and len(parts) == 6 and parts[5].strip().startswith(files_under)
+                continue
+            field, _, value = line.partition(":")
+            if not value.strip().endswith("kB"):
+                continue
+            kb = int(value.split()[0])
+            if field == "Rss":
+                totals["rss"] += kb
+                if in_files:
+                    totals["files_rss"] += kb
+            elif field == "Pss":
+                totals["pss"] += kb
+            elif field in ("Shared_Clean", "Shared_Dirty"):
+                totals["shared"] += kb
+                if in_files:
+                    totals["files_shared"] += kb
+            elif field in ("Private_Clean", "Private_Dirty"):
+                totals["private"] += kb
+    return {key: round(kb / 1024, 1) for key, kb in totals.items()}
+
+
+def format_usage(label, usage: dict) -> str:
+    return (f"{label}: RSS {usage['rss']:.0f} MB = private {usage['private']:.0f} MB + shared {usage['shared']:.0f} MB "
+            f"(PSS {usage['pss']:.0f} MB); model files resident {usage['files_rss']:.0f} MB, "
+            f"shared {usage['files_shared']:.0f} MB")
+
+
+def report_memory(files_under: Path) -> str:
+    """One line on this process's private vs shared memory, or why it can't be measured"""
+    try:
+        return format_usage(f"🧠 Process {os.getpid()}", memory_usage("self", files_under))
+    except OSError as e:
+        return f"🧠 Memory report unavailable on this platform: {e}"
+
+
+def processes_mapping(directory: Path) -> list:
+    """PIDs of the processes that have a file under directory mapped"""
+    directory = str(Path(directory).resolve())
+    pids = []
+    for proc in Path("/proc").iterdir():
+        if not proc.name.isdigit():
+            continue
+        try:
+            if directory in (proc / "maps").read_text(encoding='utf-8', errors='replace'):
+                pids.append(int(proc.name))
+        except OSError:
+            continue
+    return sorted(pids)
+
+
+def main():
+    from src.tools.model_backends import MODEL_CACHE_DIR
+
+    pids = [int(arg) for arg in sys.argv[1:]] or processes_mapping(MODEL_CACHE_DIR)
+    if not pids:
+        print(f"No process has model weights from {MODEL_CACHE_DIR} mapped")
+        return
+    for pid in pids:
+        try:
+            print(format_usage(f"PID {pid}", memory_usage(pid, MODEL_CACHE_DIR)))
+        except OSError as e:
+            print(f"PID {pid}: {e}")
+
+
+if __name__ == "__main__":
+    main()
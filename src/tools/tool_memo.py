@@ -0,0 +1,102 @@
+"""
+Run-scoped memoization of tool calls.
+
+Inside a tool_memo() block, a tool called again with the same arguments gets
+the first call's result instead of executing again, and a duplicate call made
+while the first is still running waits for it rather than starting a second
+execution. image_agent and vision_agent, for instance, both parse the same
+image in one pipeline run. Outside a block tools run as usual.
+
+The memo lives in a ContextVar, so calls made from a thread started inside the
+block share it only when the thread runs in a copy of the block's context.
+"""
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+import functools
+import threading
+import inspect
+import json
+
+
+class ToolMemo:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # (tool name, normalized args) -> Future of the result
+        self.executions = 0
+        self.saved = 0
+
+    def call(self, key: tuple, execute):
+        with self._lock:
+            future = self._calls.get(key)
+            owner = future is None
+            if owner:
+                future = self._calls[key] = Future()
+                self.executions += 1
+            else:
+                self.saved += 1
+        if owner:
+            try:
+                result = execute()
+            except BaseException as e:
+                self._forget(key, future)
+                future.set_exception(e)
+                raise
+            # Failures are returned as "Error ..." strings; let a retry really retry
+            if isinstance(result, str) and result.startswith("Error"):
+                self._forget(key, future)
+            future.set_result(result)
+            return result
+        return future.result()
+
+    def _forget(self, key: tuple, future: Future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+
+_memo = ContextVar("tool_memo", default=None)
+
+
+@contextmanager
+def tool_memo():
+    """Share tool results between identical calls made inside this block"""
+    memo = ToolMemo()
+    token = _memo.set(memo)
+    try:
+        yield memo
+    finally:
+        _memo.reset(token)
+
+
+def _normalize(value):
+    # The same file can be passed as a relative path, an absolute one or with ./ segments
+    if isinstance(value, str):
+        value = value.strip()
+        if value and len(value) < 4096:
+            try:
+                path = Path(value)
+                if path.exists():
+                    return str(path.resolve())
+            except (OSError, ValueError):
+                pass
+    return value
+
+
+def memoized(run):
+    """Decorate a tool's _run so identical calls within a tool_memo() block execute once"""
+    signature = inspect.signature(run)
+
+    @functools.wraps(run)
+    def wrapper(self, *args, **kwargs):
+        memo = _memo.get()
+        if memo is None:
+            return run(self, *args, **kwargs)
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        normalized = {name: _normalize(value) for name, value in bound.arguments.items() if name != "self"}
+        key = (self.name, json.dumps(normalized, sort_keys=True, default=str))
+        return memo.call(key, lambda: run(self, *args, **kwargs))
+
+    return wrapper